@@ -0,0 +1,275 @@
+import io
+import json
+import base64
+import hashlib
+import platform
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import matplotlib
+matplotlib.use('Agg') # 設定後端，避免視窗跳出
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.ticker as ticker
+
+# --- 圖表繪製服務 ---
+# 只接收已經彙總好的數字 (分箱、各城市數量、各關鍵字數量)，在獨立的行程池裡用 Figure 物件繪圖，
+# 不碰 pyplot 的全域狀態；相同輸入的圖表以雜湊記憶，整個行程內只會畫一次。
+# 行程池只在 main.py 啟動時 (warm_up) 開啟；其他入口 (測試、工具腳本) 匯入時在目前執行緒繪圖。
+
+# 設定中文字型與負號顯示 (每個繪圖行程載入本模組時都會套用)
+if platform.system() == "Windows":
+    matplotlib.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
+elif platform.system() == "Darwin":
+    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS']
+else:
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei']
+matplotlib.rcParams['axes.unicode_minus'] = False
+
+# [配色方案]
+BG_COLOR = '#161616'
+TEXT_COLOR = '#E0E0E0'
+BAR_COLOR = '#C6A96B'    # 金色
+
+PIE_COLORS = [
+    '#C6A96B',  # 金色，主色
+    '#F2D38C',  # 淺金/米色
+    '#A67C52',  # 棕金色
+    '#D9B382',  # 柔和金棕
+    '#8C7B6B',  # 深咖啡
+    '#E8CFA8',  # 奶油色
+    '#BFA97A',  # 暖沙色
+]
+
+RENDER_WORKERS = 2
+MEMO_MAX_ENTRIES = 256
+
+def fig_to_base64(fig):
+    img = io.BytesIO()
+    # [關鍵] pad_inches=0.05 設得非常小，盡量減少黑邊
+    FigureCanvasAgg(fig)
+    fig.savefig(img, format='png', bbox_inches='tight', facecolor=BG_COLOR, edgecolor='none', pad_inches=0.05)
+    return base64.b64encode(img.getvalue()).decode()
+
+def draw_salary_hist(keyword, hist_counts, hist_bins):
+    fig1 = Figure(figsize=(10, 5))
+    ax1 = fig1.subplots()
+    fig1.patch.set_facecolor(BG_COLOR)
+    ax1.set_facecolor(BG_COLOR)
+
+    n, bins, patches = ax1.hist(hist_bins[:-1], bins=hist_bins, weights=hist_counts, color=BAR_COLOR, edgecolor=BG_COLOR, alpha=0.9)
+
+    #薪資分布區間長條圖_標題
+    ax1.set_title(f"{keyword} 薪資分佈", color=TEXT_COLOR, fontsize=16, pad=15)
+    ax1.set_ylabel("職缺數", color=TEXT_COLOR, fontsize=12)
+
+    def salary_formatter(x, pos):
+        if x >= 10000: return f'{int(x):,}'
+        return str(int(x))
+
+    ax1.xaxis.set_major_formatter(ticker.FuncFormatter(salary_formatter))
+    ax1.tick_params(axis='x', colors=TEXT_COLOR, labelsize=12)
+    ax1.tick_params(axis='y', colors=TEXT_COLOR, labelsize=12)
+
+    for spine in ax1.spines.values():
+        spine.set_edgecolor('#444')
+    ax1.grid(axis='y', linestyle='--', alpha=0.2, color='white')
+
+    for i in range(len(patches)):
+        if n[i] > 0:
+            ax1.text(patches[i].get_x() + patches[i].get_width() / 2, n[i], str(int(n[i])),
+                     ha='center', va='bottom', color=TEXT_COLOR, fontsize=11)
+
+    fig1.subplots_adjust(left=0.08, right=0.98, top=0.9, bottom=0.1)
+    return fig_to_base64(fig1)
+
+def draw_location_pie(keyword, labels, values):
+    fig2 = Figure(figsize=(6, 5))
+    ax2 = fig2.subplots()
+    fig2.patch.set_facecolor(BG_COLOR)
+
+    wedges, texts, autotexts = ax2.pie(
+        values,
+        labels=labels,
+        autopct='%1.0f%%',          # 小數點去掉
+        colors=PIE_COLORS[:len(values)],
+        startangle=90,
+        pctdistance=0.7,
+        labeldistance=1.05,         # 標籤更靠近切片
+        wedgeprops={'edgecolor': BG_COLOR, 'linewidth': 1},  # 增加切片邊界
+        textprops={'color': TEXT_COLOR, 'fontsize': 16, 'weight': 'bold'} #地區職缺圓餅圖 數字旁邊的圖標
+    )
+
+    # 自動調整文字顏色對比
+    for autotext in autotexts:
+        autotext.set_color(BG_COLOR)
+        autotext.set_weight('bold')
+        autotext.set_fontsize(15) #市場分析_地區職缺_圓餅圖數字大小
+
+    #市場分析_地區職缺圓餅圖_標題
+    ax2.set_title(f"{keyword} 地區佔比", color=TEXT_COLOR, fontsize=20, pad=40)
+
+    #市場分析_地區職缺圓餅圖_圖例
+    ax2.legend(wedges, labels,
+            loc="lower center",
+            bbox_to_anchor=(0.5, -0.45),  #圖例和圓餅圖的間距
+            ncol=4,
+            frameon=False,
+            labelcolor=TEXT_COLOR,
+            fontsize=16)
+
+    ax2.axis('equal')
+    fig2.subplots_adjust(left=0.02, right=0.98, top=0.92, bottom=0.1)
+    return fig_to_base64(fig2)
+
+def draw_compare_bar(labels, counts_104, counts_1111):
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    fig.patch.set_facecolor(BG_COLOR)
+    ax.set_facecolor(BG_COLOR)
+
+    x = list(range(len(labels)))
+    width = 0.35
+
+    rects1 = ax.bar([i - width/2 for i in x], counts_104, width, label='104', color='#F08B51', alpha=0.9)
+    rects2 = ax.bar([i + width/2 for i in x], counts_1111, width, label='1111', color='#1C638C', alpha=0.9)
+
+    ax.set_ylabel('職缺數', color=TEXT_COLOR)
+    ax.set_title('各職缺平台數量比較', color=TEXT_COLOR, fontsize=16, pad=20)
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, color=TEXT_COLOR, fontsize=14)
+    ax.tick_params(axis='y', colors=TEXT_COLOR)
+
+    for spine in ax.spines.values():
+        spine.set_edgecolor('#444')
+
+    legend = ax.legend(facecolor=BG_COLOR, edgecolor='#444')
+    for text in legend.get_texts():
+        text.set_color(TEXT_COLOR)
+
+    def autolabel(rects):
+        for rect in rects:
+            height = rect.get_height()
+            ax.annotate(f'{int(height):,}', xy=(rect.get_x() + rect.get_width() / 2, height),
+                        xytext=(0, 3), textcoords="offset points",
+                        ha='center', va='bottom', color=TEXT_COLOR, fontsize=11, fontweight='bold')
+    autolabel(rects1)
+    autolabel(rects2)
+    return fig_to_base64(fig)
+
+# 圖表種類 → 繪圖函式 (參數必須是可 JSON 化的彙總數字，才能當作記憶的鍵)
+CHART_KINDS = {
+    'salary_hist': draw_salary_hist,
+    'location_pie': draw_location_pie,
+    'compare_bar': draw_compare_bar,
+}
+
+def render_in_worker(kind, args):
+    return CHART_KINDS[kind](*args)
+
+_pool = None
+_pool_enabled = False      # warm_up() 之後才使用行程池 (只有 main.py 的 __main__ 啟動流程會呼叫)
+_pool_lock = threading.Lock()
+_memo = OrderedDict()      # key -> base64 PNG
+_inflight = {}             # key -> Future，相同圖表同時被要求時共用同一次繪製
+_memo_lock = threading.Lock()
+
+def get_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn：子行程只載入本模組，不會複製 Flask 主行程的執行緒與鎖
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _ping():
+    return True
+
+def use_pool():
+    # spawn 子行程會重新執行主程式：入口沒有 if __name__ == '__main__' 保護時 (測試、工具腳本) 子行程會重跑整支腳本，
+    # 因此只有 main.py 呼叫過 warm_up() 才用行程池；本身已是子行程時也不再開
+    return _pool_enabled and multiprocessing.parent_process() is None
+
+def warm_up():
+    # 啟動時先把繪圖行程開好 (載入 matplotlib 需要數秒)，第一個請求就不必等
+    # 只能在 if __name__ == '__main__' 的啟動流程呼叫 (見 main.py)；沒呼叫時一律在目前執行緒繪圖
+    global _pool_enabled
+    _pool_enabled = True
+    try:
+        pool = get_render_pool()
+        for _ in range(RENDER_WORKERS):
+            pool.submit(_ping)
+    except Exception as e:
+        print(f"Chart Pool Warning: {e}")
+
+def chart_key(kind, args):
+    raw = json.dumps([kind, args], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _remember(key, image):
+    # 呼叫端需持有 _memo_lock
+    _memo[key] = image
+    while len(_memo) > MEMO_MAX_ENTRIES:
+        _memo.popitem(last=False)
+
+def _finish(key, future):
+    with _memo_lock:
+        _inflight.pop(key, None)
+        if future.exception() is None:
+            _remember(key, future.result())
+
+def submit_chart(kind, *args):
+    # 回傳 Future；已經畫過的圖直接回傳完成的 Future
+    key = chart_key(kind, args)
+    local = False
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            done = Future()
+            done.set_result(_memo[key])
+            return done
+        if key in _inflight:
+            return _inflight[key]
+        future = None
+        if use_pool():
+            try:
+                future = get_render_pool().submit(render_in_worker, kind, args)
+            except Exception as e:
+                print(f"Chart Pool Warning: {e}")
+        if future is None:
+            # 不用行程池或行程池無法使用時 (例如已損壞) 在目前執行緒繪製 (鎖外)；Figure API 不共用全域狀態，執行緒內也安全
+            future = Future()
+            local = True
+        _inflight[key] = future
+    future.add_done_callback(lambda f: _finish(key, f))
+    if local:
+        try: future.set_result(render_in_worker(kind, args))
+        except Exception as err: future.set_exception(err)
+    return future
+
+def _reset_pool(e):
+    # 繪圖行程異常結束：丟掉舊的行程池 (下次重建)
+    global _pool
+    print(f"Chart Pool Warning: {e}")
+    with _pool_lock:
+        _pool = None
+
+def render_charts(requests):
+    # requests: {名稱: (種類, 參數)}；全部先送出再一起等，多張圖可以同時在不同行程繪製
+    futures = {name: (submit_chart(kind, *args), kind, args) for name, (kind, args) in requests.items()}
+    charts = {}
+    for name, (future, kind, args) in futures.items():
+        try:
+            charts[name] = future.result()
+        except BrokenProcessPool as e:
+            _reset_pool(e)
+            charts[name] = render_in_worker(kind, list(args))
+            with _memo_lock:
+                _remember(chart_key(kind, args), charts[name])
+    return charts
+
+def render_chart(kind, *args):
+    return render_charts({'chart': (kind, args)})['chart']
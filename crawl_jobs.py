@@ -0,0 +1,144 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 背景爬取工作佇列 ---
+# POST 建立工作後立刻回傳 job_id，實際爬取交給有上限的背景執行緒池；
+# 前端輪詢進度、可隨時取消 (離開共用的爬取，沒有其他等待者時爬蟲就會中止)，完成後再取結果。
+# Flask 請求執行緒不再被長時間的爬取佔住，用戶端斷線也不影響工作。
+
+MAX_CONCURRENT_CRAWLS = 2    # 同時執行的爬取數 (每個爬取本身還會並發打兩個平台)
+MAX_PENDING_CRAWLS = 20      # 排隊 + 執行中的上限，超過就拒絕新工作
+MAX_FINISHED_JOBS = 100      # 保留多少筆已結束的工作供查詢
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_CANCELLED = 'cancelled'
+STATUS_ERROR = 'error'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_CANCELLED, STATUS_ERROR)
+
+class CrawlJob():
+    def __init__(self, keyword, max_num):
+        self.job_id = uuid.uuid4().hex
+        self.keyword = keyword
+        self.max_num = max_num
+        self.status = STATUS_QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = {}         # 平台 -> 爬蟲回報的最新進度
+        self.result_id = None
+        self.message = ''
+        self.cancelled = False
+        self.future = None
+        self.lock = threading.Lock()
+
+    def update_progress(self, progress):
+        with self.lock:
+            self.progress = progress
+
+    def cancel(self):
+        # 執行中的工作由 runner 輪詢 cancelled 後自行結束
+        with self.lock:
+            if self.status in FINISHED_STATUSES: return False
+            self.cancelled = True
+        # 還在排隊的工作直接從執行緒池移除
+        if self.future is not None and self.future.cancel():
+            self._finish(STATUS_CANCELLED, '已取消')
+        return True
+
+    def _finish(self, status, message=''):
+        with self.lock:
+            self.status = status
+            self.message = message
+            self.finished = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            now = self.finished or time.time()
+            return {
+                'job_id': self.job_id,
+                'keyword': self.keyword,
+                'max_num': self.max_num,
+                'status': self.status,
+                'message': self.message,
+                'progress': dict(self.progress),
+                'result_id': self.result_id,
+                'created': self.created,
+                'elapsed': round(now - (self.started or now), 1),
+            }
+
+class CrawlJobManager():
+    def __init__(self, max_workers=MAX_CONCURRENT_CRAWLS, max_pending=MAX_PENDING_CRAWLS, max_finished=MAX_FINISHED_JOBS):
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()  # job_id -> CrawlJob (依建立順序)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crawl-job')
+
+    def _pending_count(self):
+        return sum(1 for j in self.jobs.values() if j.status not in FINISHED_STATUSES)
+
+    def _prune(self):
+        # 呼叫端需持有 self.lock；只淘汰已結束的舊工作
+        finished = [k for k, j in self.jobs.items() if j.status in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def submit(self, keyword, max_num, runner):
+        # runner(job) 負責實際爬取並設定 job.result_id；佇列已滿時回傳 None
+        job = CrawlJob(keyword, max_num)
+        with self.lock:
+            if self._pending_count() >= self.max_pending: return None
+            self._prune()
+            self.jobs[job.job_id] = job
+            job.future = self.executor.submit(self._run, job, runner)
+        return job
+
+    def _run(self, job, runner):
+        with job.lock:
+            cancelled = job.cancelled
+            if not cancelled:
+                job.status = STATUS_RUNNING
+                job.started = time.time()
+        if cancelled:
+            job._finish(STATUS_CANCELLED, '已取消')
+            return
+        try:
+            message = runner(job) or ''
+            if job.cancelled:
+                job._finish(STATUS_CANCELLED, '已取消')
+            else:
+                job._finish(STATUS_DONE, message)
+        except Exception as e:
+            print(f"Crawl Job Error: {job.keyword} {e}")
+            job._finish(STATUS_ERROR, str(e))
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [j.snapshot() for j in reversed(jobs)]
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for j in self.jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+        return counts
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_crawl_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CrawlJobManager()
+        return _manager
@@ -0,0 +1,166 @@
+import re
+import zlib
+import unicodedata
+import numpy as np
+
+# --- 跨平台近似重複職缺偵測 (MinHash + LSH) ---
+# 同一個職缺常同時刊登在 104 與 1111，同平台也會重複刊登。
+# 以正規化後的公司名稱 / 職稱 / 縣市做 2-gram，MinHash 簽章經 LSH 分段 (banding) 找出候選配對，
+# 只有落在同一個桶子的職缺才逐欄比對，不需要兩兩比較 (上萬筆也不會變成平方成長)。
+# 職稱必須 (正規化後) 相同或幾乎相同才算重複：「前端工程師」與「後端工程師」、「資深前端工程師」是不同職缺。
+# 結果以群組編號標記：群組內第一筆 (104 在前) 為代表，其餘為重複。
+
+NUM_PERM = 64              # MinHash 雜湊函數數量
+BANDS = 16                 # LSH 分段數 (每段 NUM_PERM / BANDS 列)，約在 Jaccard 0.5 附近開始成為候選
+TITLE_THRESHOLD = 0.8      # 職稱不完全相同時的 2-gram Jaccard 門檻 (只容許極小的差異)
+COMPANY_THRESHOLD = 0.8    # 公司名稱正規化後不完全相同時的 Jaccard 門檻
+CHUNK_SIZE = 2000          # 一次計算簽章的職缺數，控制暫存陣列大小
+BUCKET_LIMIT = 64          # 桶子超過這個大小就不再兩兩配對
+BUCKET_WINDOW = 16         # 大桶子依簽章排序後，每筆只和後面這麼多筆配對
+
+MERSENNE_PRIME = 4294967311  # 大於 2^32 的質數
+_rng = np.random.RandomState(20240101)   # 固定種子：相同輸入永遠得到相同群組
+HASH_A = _rng.randint(1, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+HASH_B = _rng.randint(0, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+
+COMPANY_SUFFIXES = ['股份有限公司', '有限公司', '分公司', '公司', 'coltd', 'ltd', 'inc', 'corporation', 'corp', 'limited']
+BRACKETS = re.compile(r'[【\[(（<＜].*?[】\])）>＞]')
+NON_WORD = re.compile(r'[\W_]+')
+CITY = re.compile(r'^(.{2,3}?[市縣])')
+
+def normalize_text(text):
+    # 全形轉半形、小寫、臺→台，去掉標點與空白 (\w 包含中文)
+    text = unicodedata.normalize('NFKC', str(text or '')).lower().replace('臺', '台')
+    return NON_WORD.sub('', text)
+
+def normalize_company(name):
+    text = normalize_text(name)
+    for suffix in COMPANY_SUFFIXES:
+        if text.endswith(suffix) and len(text) > len(suffix):
+            text = text[:-len(suffix)]
+    return text
+
+def normalize_title(title):
+    # 【急徵】、(台北) 之類的括號標註不影響是否為同一職缺
+    return normalize_text(BRACKETS.sub('', unicodedata.normalize('NFKC', str(title or ''))))
+
+def normalize_city(location):
+    text = normalize_text(location)
+    m = CITY.match(text)
+    return m.group(1) if m else text[:3]
+
+def bigrams(text):
+    if len(text) < 2: return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def jaccard(a, b):
+    if not a or not b: return 0.0
+    return len(a & b) / len(a | b)
+
+def shingle_hashes(company_grams, title_grams, city):
+    # 各欄位加上前綴再雜湊，避免不同欄位的相同字組互相抵銷
+    shingles = ['c' + g for g in company_grams] + ['t' + g for g in title_grams]
+    if city: shingles.append('l' + city)
+    return [zlib.crc32(s.encode('utf-8')) for s in shingles]
+
+def minhash_signatures(hash_lists):
+    # 回傳 (文件數, NUM_PERM) 的簽章；分塊以 reduceat 一次算完一整塊文件
+    sigs = np.full((len(hash_lists), NUM_PERM), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hash_lists), CHUNK_SIZE):
+        chunk = hash_lists[start:start + CHUNK_SIZE]
+        lengths = np.array([len(h) for h in chunk])
+        nonempty = np.nonzero(lengths)[0]
+        if not nonempty.size: continue
+        flat = np.fromiter((x for i in nonempty for x in chunk[i]), dtype=np.uint64)
+        offsets = np.concatenate(([0], np.cumsum(lengths[nonempty])[:-1]))
+        # (NUM_PERM, 總字組數)：a * x + b mod p，a < 2^31、x < 2^32，不會超過 uint64
+        permuted = (HASH_A[:, None] * flat[None, :] + HASH_B[:, None]) % MERSENNE_PRIME
+        sigs[start + nonempty] = np.minimum.reduceat(permuted, offsets, axis=1).T
+    return sigs
+
+def lsh_candidates(sigs, valid):
+    # 每段簽章相同的文件放進同一個桶子，同桶的文件成為候選
+    # 分桶用 np.unique 一次完成，Python 迴圈只跑有兩筆以上的桶子
+    rows = NUM_PERM // BANDS
+    index = np.nonzero(valid)[0]
+    pairs = set()
+    for band in range(BANDS):
+        part = np.ascontiguousarray(sigs[index, band * rows:(band + 1) * rows])
+        keys = part.view(np.dtype((np.void, rows * part.itemsize))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        shared = counts[bucket] > 1
+        if not shared.any(): continue
+        members, bucket = index[shared], bucket[shared]
+        order = np.argsort(bucket, kind='stable')
+        members, bucket = members[order], bucket[order]
+        bounds = np.flatnonzero(np.diff(bucket)) + 1
+        for group in np.split(members, bounds):
+            if len(group) <= BUCKET_LIMIT:
+                window = len(group)
+            else:
+                # 很多職缺共用同一個桶子 (例如同公司大量刊登) 時兩兩配對會變成平方成長：
+                # 依完整簽章排序讓相似的職缺相鄰，只配對前後 BUCKET_WINDOW 筆
+                group = group[np.lexsort(sigs[group].T[::-1])]
+                window = BUCKET_WINDOW
+            group = group.tolist()
+            for x in range(len(group)):
+                for y in range(x + 1, min(x + 1 + window, len(group))):
+                    a, b = group[x], group[y]
+                    pairs.add((a, b) if a < b else (b, a))
+    return pairs
+
+def find_duplicates(names, companies, locations, urls=None):
+    # 回傳每筆職缺的群組編號 (= 群組內第一筆的索引)；沒有重複的職缺編號就是自己的索引
+    # urls (可省略)：職缺網址相同就直接視為同一筆，不再比對欄位
+    companies = [normalize_company(c) for c in companies]
+    titles = [normalize_title(t) for t in names]
+    cities = [normalize_city(l) for l in locations]
+    n = len(titles)
+
+    company_grams = [bigrams(c) for c in companies]
+    title_grams = [bigrams(t) for t in titles]
+    hash_lists = [shingle_hashes(company_grams[i], title_grams[i], cities[i]) for i in range(n)]
+    valid = np.array([bool(titles[i]) and bool(companies[i]) for i in range(n)], dtype=bool)
+    sigs = minhash_signatures(hash_lists)
+
+    parent = list(range(n))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        # 索引小的當代表 (104 排在 1111 前面)
+        if ra != rb: parent[max(ra, rb)] = min(ra, rb)
+
+    if urls is not None:
+        first_by_url = {}
+        for i, url in enumerate(urls):
+            # 歷史資料的空網址可能是 None 或 NaN
+            if not isinstance(url, str) or not url: continue
+            union(first_by_url.setdefault(url, i), i)
+
+    for a, b in lsh_candidates(sigs, valid):
+        # 候選配對再逐欄確認：同縣市 (有資料時)、同公司、職稱夠像
+        if cities[a] and cities[b] and cities[a] != cities[b]: continue
+        if companies[a] != companies[b]:
+            if jaccard(company_grams[a], company_grams[b]) < COMPANY_THRESHOLD: continue
+        if titles[a] != titles[b] and jaccard(title_grams[a], title_grams[b]) < TITLE_THRESHOLD: continue
+        union(a, b)
+
+    return [int(find(i)) for i in range(n)]
+
+def tag_duplicates(jobs):
+    # 在每筆職缺加上 dup_cluster / is_duplicate，回傳重複筆數
+    clusters = find_duplicates(
+        [j.get('name') for j in jobs], [j.get('company_name') for j in jobs], [j.get('location') for j in jobs],
+        [j.get('job_url') for j in jobs],
+    )
+    duplicates = 0
+    for i, job in enumerate(jobs):
+        job['dup_cluster'] = clusters[i]
+        job['is_duplicate'] = clusters[i] != i
+        duplicates += job['is_duplicate']
+    return duplicates
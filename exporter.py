@@ -0,0 +1,93 @@
+import io
+import os
+import csv
+import math
+import sqlite3
+import tempfile
+import unicodedata
+from itertools import islice
+from urllib.parse import quote
+
+# --- 串流匯出 (CSV / SQLite) ---
+# 匯出不再先把整份檔案放進記憶體：CSV 每次只產生一小段列，SQLite 以 executemany 逐批寫入暫存檔，
+# 送出後 (或用戶端中途斷線時) 立即刪除暫存檔。資料列來源可以是 DataFrame 或歷史資料庫的游標。
+
+EXPORT_CHUNK_ROWS = 1000      # CSV 每段的列數 / SQLite 每次 executemany 的列數
+FILE_CHUNK_BYTES = 64 * 1024  # 送出 SQLite 檔案時每次讀取的大小
+INTEGER_COLUMNS = ('salary_min', 'salary_max', 'salary_monthly')
+
+def clean_value(value):
+    # NaN → 空值、NumPy 純量 → Python 原生型別 (sqlite3 無法直接寫入 numpy.int64)
+    if value is None: return None
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value): return None
+    return value
+
+def iter_df_rows(df):
+    # DataFrame 逐列轉成 tuple (欄位順序即 df 的欄位順序)
+    for row in df.itertuples(index=False, name=None):
+        yield tuple(clean_value(v) for v in row)
+
+def iter_csv(columns, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    # 第一段帶 UTF-8 BOM (Excel 才會正確判斷編碼)，之後每段只編碼該段的列
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk: break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(['' if v is None else v for v in row] for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+def build_sqlite(columns, rows, table='jobs', chunk_rows=EXPORT_CHUNK_ROWS):
+    # 寫入暫存檔並回傳路徑；呼叫端負責刪除 (iter_file 送完會自動刪除)
+    # 不用 Connection.serialize()：它會把整個資料庫複製成一份 bytes 放在記憶體，暫存檔則是從磁碟分段讀出送給用戶端
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            # 匯出檔是一次性的，不需要日誌與 fsync
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            col_defs = ', '.join(f'"{c}" {"INTEGER" if c in INTEGER_COLUMNS else "TEXT"}' for c in columns)
+            conn.execute(f'CREATE TABLE "{table}" ({col_defs})')
+            sql = f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in columns)})'
+            conn.execute('BEGIN')
+            rows = iter(rows)
+            while True:
+                chunk = list(islice(rows, chunk_rows))
+                if not chunk: break
+                conn.executemany(sql, chunk)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def iter_file(path, chunk_bytes=FILE_CHUNK_BYTES):
+    # 讀完 (或產生器被關閉，例如用戶端斷線) 就刪除暫存檔
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(chunk_bytes)
+                if not data: break
+                yield data
+    finally:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Export Cleanup Warning: {e}")
+
+def attachment_headers(filename):
+    # 中文檔名用 RFC 5987 的 filename*，舊瀏覽器退回 ASCII 檔名
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'export'
+    return {'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"}
@@ -0,0 +1,526 @@
+import json
+import queue
+import base64
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from salary_model import SALARY_FIELDS, parse_salary_text
+from watermark import Watermark
+
+# --- 歷史紀錄資料庫存取層 (history_jobs.db) ---
+# 所有歷史路由共用同一個連線池，連線開啟時統一設定 WAL 與效能相關 PRAGMA，
+# 寫入使用 BEGIN IMMEDIATE 先取得寫鎖，搭配 busy_timeout 排隊，避免同時儲存時出現 "database is locked"。
+
+DB_PATH = 'history_jobs.db'
+POOL_SIZE = 8
+
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',     # WAL 模式下 NORMAL 已足夠安全，寫入不必每次 fsync
+    'PRAGMA foreign_keys=ON',        # 讓 ON DELETE CASCADE 真正生效
+    'PRAGMA busy_timeout=30000',     # 其他連線持有寫鎖時最多等 30 秒
+    'PRAGMA cache_size=-20000',      # 約 20MB 頁面快取
+    'PRAGMA mmap_size=268435456',    # 256MB 記憶體映射讀取
+    'PRAGMA temp_store=MEMORY',
+]
+
+# 職缺倉儲：jobs 為去重後的職缺維度表，batch_jobs 記錄每個批次包含哪些職缺
+JOB_COLUMNS = ['platform', 'name', 'company_name', 'location', 'salary', 'job_url', 'update_date'] + SALARY_FIELDS
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS history_batches (
+        batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        keyword TEXT,
+        save_time TEXT,
+        total_count INTEGER,
+        avg_salary INTEGER,
+        count_104 INTEGER,
+        count_1111 INTEGER,
+        chart_salary_hash TEXT,
+        chart_location_hash TEXT
+    )
+    ''',
+    # 圖表以內容雜湊存一份 (相同圖表只存一次)，批次只記錄雜湊
+    '''
+    CREATE TABLE IF NOT EXISTS chart_blobs (
+        hash TEXT PRIMARY KEY,
+        png BLOB NOT NULL,
+        size INTEGER,
+        created TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        platform TEXT NOT NULL,
+        job_key TEXT NOT NULL,
+        name TEXT,
+        company_name TEXT,
+        location TEXT,
+        salary TEXT,
+        job_url TEXT,
+        update_date TEXT,
+        salary_type TEXT,
+        salary_min INTEGER,
+        salary_max INTEGER,
+        salary_monthly INTEGER,
+        first_seen TEXT,
+        UNIQUE(platform, job_key)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS batch_jobs (
+        batch_id INTEGER NOT NULL,
+        job_id INTEGER NOT NULL,
+        position INTEGER,
+        PRIMARY KEY(batch_id, job_id),
+        FOREIGN KEY(batch_id) REFERENCES history_batches(batch_id) ON DELETE CASCADE,
+        FOREIGN KEY(job_id) REFERENCES jobs(job_id)
+    ) WITHOUT ROWID
+    ''',
+    # 增量爬取水位線：每個關鍵字 / 平台一列，seen_ids 為 JSON 陣列
+    '''
+    CREATE TABLE IF NOT EXISTS crawl_watermarks (
+        keyword TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        latest_stamp TEXT,
+        seen_ids TEXT,
+        updated TEXT,
+        PRIMARY KEY(keyword, platform)
+    )
+    ''',
+]
+
+INDEXES = [
+    # 刪除批次後清理孤兒職缺時需要用 job_id 反查 (batch_id 方向已由主鍵涵蓋)
+    'CREATE INDEX IF NOT EXISTS idx_batch_jobs_job ON batch_jobs(job_id)',
+    # 依關鍵字查詢歷史批次
+    'CREATE INDEX IF NOT EXISTS idx_history_batches_keyword ON history_batches(keyword, batch_id)',
+]
+
+# 全文搜尋：jobs 的外部內容 FTS5 索引 (trigram，中文職稱 / 公司名稱可以用任意子字串查詢)
+# 由觸發器與 jobs 同步，儲存 / 刪除批次時在同一個交易內更新；SQLite 太舊 (< 3.34 沒有 trigram) 時停用搜尋
+FTS_COLUMNS = ['name', 'company_name', 'location']
+FTS_MIN_TERM = 3    # trigram 至少 3 個字才能走索引，較短的詞改用 LIKE
+FTS_BATCH_PAGE_SIZE = 20   # 搜尋結果附帶的「命中批次」每頁筆數 (新到舊)
+
+FTS_SCHEMA = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+        {', '.join(FTS_COLUMNS)}, content='jobs', content_rowid='job_id', tokenize='trigram'
+    )
+'''
+_fts_cols = ', '.join(FTS_COLUMNS)
+_fts_new = ', '.join('new.' + c for c in FTS_COLUMNS)
+_fts_old = ', '.join('old.' + c for c in FTS_COLUMNS)
+FTS_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO jobs_fts(rowid, {_fts_cols}) VALUES (new.job_id, {_fts_new});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+        INSERT INTO jobs_fts(jobs_fts, rowid, {_fts_cols}) VALUES ('delete', old.job_id, {_fts_old});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE OF {_fts_cols} ON jobs BEGIN
+        INSERT INTO jobs_fts(jobs_fts, rowid, {_fts_cols}) VALUES ('delete', old.job_id, {_fts_old});
+        INSERT INTO jobs_fts(rowid, {_fts_cols}) VALUES (new.job_id, {_fts_new});
+    END
+    ''',
+]
+
+# --- 預先寫好的查詢 ---
+SQL_INSERT_BATCH = '''
+    INSERT INTO history_batches (keyword, save_time, total_count, avg_salary, count_104, count_1111, chart_salary_hash, chart_location_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_INSERT_CHART = 'INSERT OR IGNORE INTO chart_blobs (hash, png, size) VALUES (?, ?, ?)'
+SQL_GET_CHART = 'SELECT png FROM chart_blobs WHERE hash = ?'
+SQL_BATCH_CHARTS = 'SELECT chart_salary_hash, chart_location_hash FROM history_batches WHERE batch_id = ?'
+SQL_DELETE_ORPHAN_CHART = '''
+    DELETE FROM chart_blobs WHERE hash = ?
+    AND NOT EXISTS (SELECT 1 FROM history_batches WHERE chart_salary_hash = chart_blobs.hash OR chart_location_hash = chart_blobs.hash)
+'''
+SQL_UPSERT_JOB = '''
+    INSERT INTO jobs (platform, job_key, name, company_name, location, salary, job_url, update_date,
+                      salary_type, salary_min, salary_max, salary_monthly, first_seen)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(platform, job_key) DO UPDATE SET
+        name = excluded.name,
+        company_name = excluded.company_name,
+        location = excluded.location,
+        salary = excluded.salary,
+        job_url = excluded.job_url,
+        update_date = excluded.update_date,
+        salary_type = excluded.salary_type,
+        salary_min = excluded.salary_min,
+        salary_max = excluded.salary_max,
+        salary_monthly = excluded.salary_monthly
+    WHERE jobs.update_date IS NOT excluded.update_date
+       OR jobs.salary IS NOT excluded.salary
+       OR jobs.name IS NOT excluded.name
+       OR jobs.location IS NOT excluded.location
+'''
+SQL_LINK_JOB = '''
+    INSERT OR IGNORE INTO batch_jobs (batch_id, job_id, position)
+    SELECT ?, job_id, ? FROM jobs WHERE platform = ? AND job_key = ?
+'''
+SQL_LIST_BATCHES = '''
+    SELECT batch_id, keyword, save_time, total_count, avg_salary, count_104, count_1111
+    FROM history_batches
+    ORDER BY batch_id DESC
+'''
+SQL_GET_BATCH = 'SELECT * FROM history_batches WHERE batch_id = ?'
+SQL_BATCH_JOBS = f'''
+    SELECT {', '.join('j.' + col for col in JOB_COLUMNS)}
+    FROM batch_jobs b JOIN jobs j ON j.job_id = b.job_id
+    WHERE b.batch_id = ?
+    ORDER BY b.position
+'''
+SQL_BATCH_JOB_IDS = 'SELECT job_id FROM batch_jobs WHERE batch_id = ?'
+SQL_DELETE_BATCH = 'DELETE FROM history_batches WHERE batch_id = ?'
+SQL_LATEST_BATCH = 'SELECT batch_id FROM history_batches WHERE keyword = ? ORDER BY batch_id DESC LIMIT 1'
+SQL_GET_WATERMARK = 'SELECT latest_stamp, seen_ids FROM crawl_watermarks WHERE keyword = ? AND platform = ?'
+SQL_SAVE_WATERMARK = '''
+    INSERT INTO crawl_watermarks (keyword, platform, latest_stamp, seen_ids, updated) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(keyword, platform) DO UPDATE SET
+        latest_stamp = excluded.latest_stamp, seen_ids = excluded.seen_ids, updated = excluded.updated
+'''
+SQL_LIST_WATERMARKS = 'SELECT keyword, platform, latest_stamp, updated FROM crawl_watermarks ORDER BY keyword, platform'
+SQL_DELETE_ORPHAN_JOB = '''
+    DELETE FROM jobs WHERE job_id = ?
+    AND NOT EXISTS (SELECT 1 FROM batch_jobs WHERE batch_jobs.job_id = jobs.job_id)
+'''
+
+class ConnectionPool():
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE):
+        self.db_path = db_path
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        # isolation_level=None：交易由 write() 明確控制，讀取不會意外開啟長交易
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def read(self):
+        with self.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def write(self):
+        # BEGIN IMMEDIATE 一開始就取得寫鎖，多個寫入者在 busy_timeout 內排隊，而不是中途才失敗
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+def job_key(job):
+    # 去重鍵：優先使用職缺網址，沒有網址時退回公司 + 職稱 + 地點
+    url = (job.get('job_url') or '').strip()
+    if url: return url
+    return f"{job.get('company_name') or ''}|{job.get('name') or ''}|{job.get('location') or ''}"
+
+def job_row(job, first_seen):
+    # 搜尋結果已帶有結構化薪資；缺少時才補解析
+    f = job if job.get('salary_type') else parse_salary_text(job.get('salary'))
+    return (
+        job.get('platform'), job_key(job),
+        job.get('name'), job.get('company_name'), job.get('location'), job.get('salary'),
+        job.get('job_url'), job.get('update_date'),
+        f.get('salary_type'), f.get('salary_min'), f.get('salary_max'), f.get('salary_monthly'),
+        first_seen
+    )
+
+def upsert_jobs(conn, batch_id, jobs, first_seen):
+    # 1. 新職缺插入；已存在的職缺只有內容變動時才改寫，未變動的列完全不動
+    conn.executemany(SQL_UPSERT_JOB, [job_row(j, first_seen) for j in jobs])
+    # 2. 批次關聯只存 (batch_id, job_id, 順序)，同一批次內重複的職缺只記一次
+    conn.executemany(SQL_LINK_JOB, [(batch_id, i, j.get('platform'), job_key(j)) for i, j in enumerate(jobs)])
+
+def migrate_history_details(conn):
+    # 舊版每個批次都複製一份完整明細 (history_details)，搬進 jobs + batch_jobs 後移除舊表
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_details'").fetchone()
+    if not exists: return
+
+    # 只搬仍存在主表的批次 (舊版外鍵沒有啟用，可能殘留孤兒明細)
+    rows = conn.execute('''
+        SELECT * FROM history_details
+        WHERE batch_id IN (SELECT batch_id FROM history_batches)
+        ORDER BY batch_id, id
+    ''').fetchall()
+
+    batches = {}
+    for row in rows:
+        batches.setdefault(row['batch_id'], []).append({k: row[k] for k in row.keys()})
+    save_times = {r['batch_id']: r['save_time'] for r in conn.execute('SELECT batch_id, save_time FROM history_batches')}
+
+    # 依批次先後寫入，較新的批次內容會覆蓋較舊的
+    for batch_id, jobs in batches.items():
+        upsert_jobs(conn, batch_id, jobs, save_times.get(batch_id))
+
+    conn.execute('DROP TABLE history_details')
+    print(f"History DB migrated: {len(rows)} detail rows → {conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]} unique jobs")
+
+def store_chart(conn, chart_base64):
+    # base64 PNG → 以 sha256 為鍵存進 chart_blobs，回傳雜湊 (沒有圖時回傳 None)
+    if not chart_base64: return None
+    png = base64.b64decode(chart_base64)
+    chart_hash = hashlib.sha256(png).hexdigest()
+    conn.execute(SQL_INSERT_CHART, (chart_hash, png, len(png)))
+    return chart_hash
+
+def migrate_chart_columns(conn):
+    # 舊版把 base64 圖表直接存在 history_batches 的 TEXT 欄位，搬進 chart_blobs 後清空
+    cols = {row[1] for row in conn.execute('PRAGMA table_info(history_batches)')}
+    for col in ('chart_salary_hash', 'chart_location_hash'):
+        if col not in cols:
+            conn.execute(f'ALTER TABLE history_batches ADD COLUMN {col} TEXT')
+    if 'chart_salary' not in cols: return 0
+
+    rows = conn.execute('''
+        SELECT batch_id, chart_salary, chart_location FROM history_batches
+        WHERE chart_salary IS NOT NULL OR chart_location IS NOT NULL
+    ''').fetchall()
+    for row in rows:
+        conn.execute('''
+            UPDATE history_batches
+            SET chart_salary_hash = ?, chart_location_hash = ?, chart_salary = NULL, chart_location = NULL
+            WHERE batch_id = ?
+        ''', (store_chart(conn, row['chart_salary']), store_chart(conn, row['chart_location']), row['batch_id']))
+    if rows: print(f"History DB migrated: {len(rows)} batches moved charts to chart_blobs")
+    return len(rows)
+
+_fts_available = False
+
+def init_fts(conn):
+    # 第一次建立索引時把既有職缺全部補進去；不支援 FTS5 / trigram 時回傳 False
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs_fts'").fetchone()
+    try:
+        conn.execute(FTS_SCHEMA)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search disabled (SQLite {sqlite3.sqlite_version}): {e}")
+        return False
+    for sql in FTS_TRIGGERS:
+        conn.execute(sql)
+    if not exists:
+        conn.execute("INSERT INTO jobs_fts(jobs_fts) VALUES ('rebuild')")
+    return True
+
+def init_history_db():
+    global _fts_available
+    with get_pool().write() as conn:
+        for sql in SCHEMA + INDEXES:
+            conn.execute(sql)
+        # 索引與觸發器先建立，之後的資料搬移也會同步進全文索引
+        _fts_available = init_fts(conn)
+        migrate_history_details(conn)
+        moved = migrate_chart_columns(conn)
+    if moved:
+        # 搬完圖表後回收舊欄位佔用的空間 (VACUUM 不能在交易內執行)
+        with get_pool().connection() as conn:
+            conn.execute('VACUUM')
+
+def _save_watermarks(conn, keyword, watermarks, save_time):
+    conn.executemany(SQL_SAVE_WATERMARK, [
+        (keyword, platform, mark.latest, json.dumps(sorted(mark.seen_ids), ensure_ascii=False), save_time)
+        for platform, mark in watermarks.items()
+    ])
+
+def insert_batch(keyword, save_time, jobs, avg_salary, count_104, count_1111, chart_salary, chart_location, watermarks=None):
+    # chart_salary / chart_location 為 base64 PNG，存成 chart_blobs 後主表只記雜湊
+    # watermarks ({平台: Watermark}) 與批次在同一個交易內寫入，批次沒存成功水位線也不會前進
+    with get_pool().write() as conn:
+        salary_hash = store_chart(conn, chart_salary)
+        location_hash = store_chart(conn, chart_location)
+        cur = conn.execute(SQL_INSERT_BATCH, (keyword, save_time, len(jobs), avg_salary, count_104, count_1111, salary_hash, location_hash))
+        batch_id = cur.lastrowid
+        upsert_jobs(conn, batch_id, jobs, save_time)
+        if watermarks: _save_watermarks(conn, keyword, watermarks, save_time)
+    return batch_id
+
+def latest_batch_id(keyword):
+    with get_pool().read() as conn:
+        row = conn.execute(SQL_LATEST_BATCH, (keyword,)).fetchone()
+    return row[0] if row else None
+
+def get_watermark(keyword, platform):
+    # 沒有紀錄時回傳 None (代表還沒有基準，需要先完整爬一次)
+    with get_pool().read() as conn:
+        row = conn.execute(SQL_GET_WATERMARK, (keyword, platform)).fetchone()
+    if not row: return None
+    return Watermark(row['latest_stamp'], json.loads(row['seen_ids'] or '[]'))
+
+def save_watermarks(keyword, watermarks, save_time):
+    with get_pool().write() as conn:
+        _save_watermarks(conn, keyword, watermarks, save_time)
+
+def list_watermarks():
+    with get_pool().read() as conn:
+        return conn.execute(SQL_LIST_WATERMARKS).fetchall()
+
+def list_batches():
+    with get_pool().read() as conn:
+        return conn.execute(SQL_LIST_BATCHES).fetchall()
+
+def load_batch(batch_id):
+    # 回傳 (主表列, 職缺列表)；找不到時主表列為 None
+    with get_pool().read() as conn:
+        batch_row = conn.execute(SQL_GET_BATCH, (batch_id,)).fetchone()
+        if not batch_row:
+            return None, []
+        rows = conn.execute(SQL_BATCH_JOBS, (batch_id,)).fetchall()
+    return batch_row, [{col: row[col] for col in JOB_COLUMNS} for row in rows]
+
+def get_batch(batch_id):
+    with get_pool().read() as conn:
+        return conn.execute(SQL_GET_BATCH, (batch_id,)).fetchone()
+
+def iter_batch_rows(batch_id, columns, min_salary=0, chunk_size=1000):
+    # 匯出用：依儲存順序逐批讀出指定欄位的 tuple，不一次載入整個批次
+    unknown = [c for c in columns if c not in JOB_COLUMNS]
+    if unknown: raise ValueError(f"未知欄位: {unknown}")
+    sql = f'''
+        SELECT {', '.join('j.' + col for col in columns)}
+        FROM batch_jobs b JOIN jobs j ON j.job_id = b.job_id
+        WHERE b.batch_id = ? AND COALESCE(j.salary_monthly, 0) >= ?
+        ORDER BY b.position
+    '''
+    with get_pool().read() as conn:
+        cursor = conn.execute(sql, (batch_id, min_salary or 0))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            for row in rows:
+                yield tuple(row)
+
+def fts_available():
+    return _fts_available
+
+def _match_expression(terms, field):
+    # 每個詞用雙引號包成片語 (使用者輸入的 " 要重複一次跳脫)，多個詞為 AND；field 限定欄位
+    phrases = ['"' + t.replace('"', '""') + '"' for t in terms]
+    expr = ' AND '.join(phrases)
+    return f'{field} : ({expr})' if field else expr
+
+def _like_condition(terms, field):
+    # 有少於 3 個字的詞時 trigram 無法 MATCH，改成在索引表上做 LIKE (較慢但結果一致)
+    columns = [field] if field else FTS_COLUMNS
+    clauses, params = [], []
+    for t in terms:
+        pattern = '%' + t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append('(' + ' OR '.join(f"f.{c} LIKE ? ESCAPE '\\'" for c in columns) + ')')
+        params.extend([pattern] * len(columns))
+    return ' AND '.join(clauses), params
+
+def search_jobs(query, field=None, platform=None, keyword=None, page=1, page_size=20, batch_page=1, batch_page_size=FTS_BATCH_PAGE_SIZE):
+    # 跨所有批次搜尋職缺：依相關度 (bm25) 排序分頁，每筆附上出現過的批次；另外彙整每個批次的命中數 (同樣分頁)
+    terms = query.split()
+    if not terms: return {'total': 0, 'jobs': [], 'batches': [], 'batches_more': False}
+    if field is not None and field not in FTS_COLUMNS:
+        raise ValueError(f"不支援的搜尋欄位: {field}")
+
+    if all(len(t) >= FTS_MIN_TERM for t in terms):
+        where, params, order = 'jobs_fts MATCH ?', [_match_expression(terms, field)], 'f.rank, j.job_id DESC'
+    else:
+        where, params = _like_condition(terms, field)
+        order = 'j.job_id DESC'
+
+    # 平台 / 批次關鍵字篩選
+    if platform:
+        where += ' AND j.platform = ?'
+        params.append(platform)
+    batch_filter = ''
+    if keyword:
+        batch_filter = ' AND h.keyword = ?'
+        where += ' AND EXISTS (SELECT 1 FROM batch_jobs b JOIN history_batches h ON h.batch_id = b.batch_id WHERE b.job_id = j.job_id' + batch_filter + ')'
+        params.append(keyword)
+
+    base = f'FROM jobs_fts f JOIN jobs j ON j.job_id = f.rowid WHERE {where}'
+    offset = (max(1, page) - 1) * page_size
+    with get_pool().read() as conn:
+        total = conn.execute(f'SELECT COUNT(*) {base}', params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT j.job_id, {', '.join('j.' + col for col in JOB_COLUMNS)} {base} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [page_size, offset]
+        ).fetchall()
+        jobs = [{col: row[col] for col in ['job_id'] + JOB_COLUMNS} for row in rows]
+
+        # 這一頁職缺出現過的批次 (新到舊)
+        if jobs:
+            placeholders = ', '.join('?' for _ in jobs)
+            job_batches = {}
+            for r in conn.execute(f'''
+                SELECT b.job_id, h.batch_id, h.keyword, h.save_time
+                FROM batch_jobs b JOIN history_batches h ON h.batch_id = b.batch_id
+                WHERE b.job_id IN ({placeholders}) ORDER BY h.batch_id DESC
+            ''', [j['job_id'] for j in jobs]):
+                job_batches.setdefault(r['job_id'], []).append({'batch_id': r['batch_id'], 'keyword': r['keyword'], 'save_time': r['save_time']})
+            for job in jobs:
+                job['batches'] = job_batches.get(job['job_id'], [])
+
+        # 哪些批次有命中 (例如「哪幾次爬取出現過某公司」)；多取一筆判斷是否還有下一頁
+        batch_offset = (max(1, batch_page) - 1) * batch_page_size
+        batches = [dict(r) for r in conn.execute(f'''
+            SELECT h.batch_id, h.keyword, h.save_time, COUNT(*) AS hits
+            FROM jobs_fts f JOIN jobs j ON j.job_id = f.rowid
+            JOIN batch_jobs b ON b.job_id = j.job_id
+            JOIN history_batches h ON h.batch_id = b.batch_id
+            WHERE {where}{batch_filter}
+            GROUP BY h.batch_id ORDER BY h.batch_id DESC LIMIT ? OFFSET ?
+        ''', params + ([keyword] if keyword else []) + [batch_page_size + 1, batch_offset])]
+
+    return {'total': total, 'jobs': jobs, 'batches': batches[:batch_page_size], 'batches_more': len(batches) > batch_page_size}
+
+def get_chart(chart_hash):
+    with get_pool().read() as conn:
+        row = conn.execute(SQL_GET_CHART, (chart_hash,)).fetchone()
+    return bytes(row['png']) if row else None
+
+def delete_batch(batch_id):
+    with get_pool().write() as conn:
+        # 先記下這個批次用到的職缺與圖表；刪除主表時關聯會經由 ON DELETE CASCADE 一併刪除，再清掉沒有其他批次引用的職缺與圖表
+        job_ids = [r[0] for r in conn.execute(SQL_BATCH_JOB_IDS, (batch_id,))]
+        chart_row = conn.execute(SQL_BATCH_CHARTS, (batch_id,)).fetchone()
+        conn.execute(SQL_DELETE_BATCH, (batch_id,))
+        conn.executemany(SQL_DELETE_ORPHAN_JOB, [(i,) for i in job_ids])
+        if chart_row:
+            conn.executemany(SQL_DELETE_ORPHAN_CHART, [(h,) for h in chart_row if h])
@@ -0,0 +1,223 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 爬蟲頁面回應快取 ---
+# 兩層：記憶體 LRU (最近使用的頁面) + SQLite 磁碟層 (重啟後仍保留)，皆有 TTL。
+# 快取鍵 = 平台 + URL + 正規化後的參數 (含頁碼)，排除 1111 每次都會變的 '_' 時間戳。
+
+CACHE_DB_PATH = 'http_cache.db'
+DEFAULT_TTL = 600            # 秒
+MEMORY_MAX_ENTRIES = 500     # 每筆約一頁 (20 筆職缺)
+EXCLUDED_PARAMS = ('_',)
+
+def make_cache_key(platform, url, params):
+    items = sorted((str(k), str(v).strip()) for k, v in params.items() if k not in EXCLUDED_PARAMS)
+    raw = json.dumps([platform, url, items], ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class ResponseCache():
+    def __init__(self, db_path=CACHE_DB_PATH, ttl=DEFAULT_TTL, max_entries=MEMORY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory = OrderedDict()   # key -> (expires_at, value)
+        self.lock = threading.Lock()      # 記憶體層與統計
+        self.db_lock = threading.Lock()   # 磁碟層 (SQLite 連線)；讀寫磁碟時不持有 self.lock，其他執行緒的記憶體命中不必等 commit
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS page_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    platform TEXT,
+                    expires_at REAL,
+                    payload TEXT
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_page_cache_expires ON page_cache(expires_at)')
+            self.conn.commit()
+        except Exception as e:
+            # 磁碟層失敗時仍可只用記憶體層
+            print(f"Cache DB Warning: {e}")
+            self.conn = None
+
+    def _copy(self, value):
+        # 爬蟲會在職缺 dict 上加欄位 (例如 search_range)，進出快取都複製一份避免互相污染
+        total, jobs = value
+        return total, [dict(j) for j in jobs]
+
+    def _remember(self, key, expires_at, value):
+        # 已有較新的項目 (磁碟讀取期間另一個執行緒剛 set 過) 時不以較舊的磁碟資料覆蓋
+        entry = self.memory.get(key)
+        if entry and entry[0] > expires_at: return
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, platform, url, params):
+        key = make_cache_key(platform, url, params)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                if entry[0] > now:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return self._copy(entry[1])
+                del self.memory[key]
+
+        row = None
+        if self.conn is not None:
+            try:
+                with self.db_lock:
+                    row = self.conn.execute(
+                        'SELECT expires_at, payload FROM page_cache WHERE cache_key = ?', (key,)
+                    ).fetchone()
+            except Exception as e:
+                print(f"Cache Read Warning: {e}")
+
+        if row and row[0] > now:
+            total, jobs = json.loads(row[1])
+            value = (total, jobs)
+            with self.lock:
+                self._remember(key, row[0], value)
+                self.disk_hits += 1
+            return self._copy(value)
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, platform, url, params, total, jobs):
+        key = make_cache_key(platform, url, params)
+        expires_at = time.time() + self.ttl
+        value = self._copy((total, jobs))
+        with self.lock:
+            self._remember(key, expires_at, value)
+            self.stores += 1
+            stores = self.stores
+        if self.conn is None: return
+
+        # 序列化與 commit 都在記憶體層的鎖外進行
+        payload = json.dumps([total, jobs], ensure_ascii=False)
+        try:
+            with self.db_lock:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO page_cache (cache_key, platform, expires_at, payload) VALUES (?, ?, ?, ?)',
+                    (key, platform, expires_at, payload)
+                )
+                # 每寫入 200 筆順便清一次過期資料
+                if stores % 200 == 0:
+                    self.conn.execute('DELETE FROM page_cache WHERE expires_at < ?', (time.time(),))
+                self.conn.commit()
+        except Exception as e:
+            print(f"Cache Write Warning: {e}")
+
+    def stats(self):
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0,
+                'memory_entries': len(self.memory),
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+# --- 職缺總數快取 (/api/compare_jobs 用) ---
+# TTL 內直接回傳；過期但仍在 stale 視窗內時先回傳舊值，同時在背景重新抓取 (stale-while-revalidate)。
+COUNT_TTL = 600          # 秒，視為新鮮
+COUNT_STALE_TTL = 3600   # 秒，過期後仍可先回傳舊值的時間
+
+class CountCache():
+    def __init__(self, ttl=COUNT_TTL, stale_ttl=COUNT_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.entries = {}          # key -> (value, fetched_at)
+        self.refreshing = set()    # 正在背景更新的 key，避免重複排程
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='count-refresh')
+
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _store(self, key, value):
+        # loader 回傳 None 代表請求失敗，不寫入快取
+        if value is None: return
+        with self.lock:
+            self.entries[key] = (value, time.time())
+
+    def _refresh(self, key, loader):
+        try:
+            self._store(key, loader())
+        except Exception as e:
+            print(f"Count Refresh Warning: {key} {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def get(self, key, loader):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                age = now - entry[1]
+                if age < self.ttl:
+                    self.fresh_hits += 1
+                    return entry[0]
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        self.refreshes += 1
+                        self.executor.submit(self._refresh, key, loader)
+                    return entry[0]
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'fresh_hits': self.fresh_hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+            }
+
+_count_cache = None
+
+def get_count_cache():
+    global _count_cache
+    with _cache_lock:
+        if _count_cache is None:
+            _count_cache = CountCache()
+        return _count_cache
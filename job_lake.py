@@ -0,0 +1,137 @@
+import os
+import math
+import uuid
+import tempfile
+import threading
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from itertools import islice
+
+# --- 欄式匯出 (Parquet / Arrow IPC) 與分區職缺資料湖 ---
+# 匯出：與 CSV / SQLite 相同的資料列來源，逐批轉成 RecordBatch 寫進暫存檔 (壓縮後比 CSV 小很多)。
+# 資料湖：每次儲存歷史紀錄就以 Hive 分區 (platform / crawl_date / keyword) 附加一個新的 Parquet 檔，既有檔案不會被改寫；
+# 分析時用 pyarrow.dataset 掃描，只讀需要的欄位，分區條件 (平台、日期、關鍵字) 直接略過不相關的目錄。
+# 刪除歷史批次不會回頭刪資料湖的檔案 (只附加)，每筆資料都帶 batch_id 可自行篩選。
+
+LAKE_DIR = 'job_lake'
+BATCH_ROWS = 10000            # 每個 RecordBatch 的列數
+PARQUET_COMPRESSION = 'zstd'
+
+INTEGER_COLUMNS = ('batch_id', 'salary_min', 'salary_max', 'salary_monthly')
+PARTITION_COLUMNS = ['platform', 'crawl_date', 'keyword']
+
+PARTITIONING = ds.partitioning(
+    pa.schema([(col, pa.string()) for col in PARTITION_COLUMNS]), flavor='hive'
+)
+
+def arrow_schema(columns):
+    return pa.schema([(col, pa.int64() if col in INTEGER_COLUMNS else pa.string()) for col in columns])
+
+def to_int(value):
+    # 薪資欄位可能是 int / float (含 NaN) / 空字串
+    if value is None or value == '': return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else int(value)
+
+def to_str(value):
+    if value is None: return None
+    if isinstance(value, float) and math.isnan(value): return None
+    return str(value)
+
+def iter_record_batches(schema, rows, batch_rows=BATCH_ROWS):
+    # rows 為依 schema 欄位順序的 tuple；每次只轉換 batch_rows 列
+    converters = [to_int if field.type == pa.int64() else to_str for field in schema]
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, batch_rows))
+        if not chunk: break
+        arrays = [pa.array([convert(row[i]) for row in chunk], type=field.type)
+                  for i, (field, convert) in enumerate(zip(schema, converters))]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _temp_path(suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+def build_parquet(columns, rows):
+    # 寫入暫存檔並回傳路徑 (交給 exporter.iter_file 送出後刪除)
+    schema = arrow_schema(columns)
+    path = _temp_path('.parquet')
+    try:
+        with pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION) as writer:
+            for batch in iter_record_batches(schema, rows):
+                writer.write_batch(batch)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def build_arrow(columns, rows):
+    # Arrow IPC 檔案格式 (Feather v2)，pandas / polars / DuckDB 可以直接零複製讀取
+    schema = arrow_schema(columns)
+    path = _temp_path('.arrow')
+    try:
+        with pa.OSFile(path, 'wb') as sink, ipc.new_file(sink, schema) as writer:
+            for batch in iter_record_batches(schema, rows):
+                writer.write_batch(batch)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+# --- 資料湖 ---
+_lake_lock = threading.Lock()
+
+def lake_columns(columns):
+    # 資料湖的欄位：批次資訊 + 職缺欄位 (分區欄位放最後)
+    job_columns = [c for c in columns if c not in PARTITION_COLUMNS]
+    return ['batch_id', 'save_time'] + job_columns + PARTITION_COLUMNS
+
+def append_batch(batch_id, keyword, save_time, jobs, columns, lake_dir=LAKE_DIR):
+    # 每個歷史批次寫成新的檔案 (檔名含 batch_id)，既有分區與檔案都不動
+    if not jobs: return 0
+    names = lake_columns(columns)
+    job_columns = names[2:-len(PARTITION_COLUMNS)]
+    schema = arrow_schema(names)
+    crawl_date = str(save_time)[:10]
+    rows = (
+        tuple([batch_id, save_time] + [job.get(c) for c in job_columns] + [job.get('platform'), crawl_date, keyword])
+        for job in jobs
+    )
+    table = pa.Table.from_batches(list(iter_record_batches(schema, rows)), schema=schema)
+    with _lake_lock:
+        ds.write_dataset(
+            table, lake_dir, format='parquet', partitioning=PARTITIONING,
+            basename_template=f'batch-{batch_id}-{uuid.uuid4().hex[:8]}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression=PARQUET_COMPRESSION),
+        )
+    return table.num_rows
+
+def open_lake(lake_dir=LAKE_DIR):
+    # 分析入口：回傳 pyarrow Dataset；to_table(columns=..., filter=...) 會做欄位裁剪與分區 / 統計值下推
+    if not os.path.isdir(lake_dir): return None
+    return ds.dataset(lake_dir, format='parquet', partitioning=PARTITIONING)
+
+def salary_trend(keyword=None, since=None, platform=None, lake_dir=LAKE_DIR):
+    # 依爬取日期彙整有月薪資料的職缺數與平均月薪；只讀兩個欄位，關鍵字 / 日期 / 平台條件只掃描相符的分區
+    dataset = open_lake(lake_dir)
+    if dataset is None: return []
+    condition = ds.field('salary_monthly') > 0
+    if keyword: condition &= ds.field('keyword') == keyword
+    if since: condition &= ds.field('crawl_date') >= since
+    if platform: condition &= ds.field('platform') == platform
+    table = dataset.to_table(columns=['crawl_date', 'salary_monthly'], filter=condition)
+    if table.num_rows == 0: return []
+    grouped = table.group_by('crawl_date').aggregate([('salary_monthly', 'count'), ('salary_monthly', 'mean')])
+    rows = sorted(grouped.to_pylist(), key=lambda r: r['crawl_date'])
+    return [
+        {'crawl_date': r['crawl_date'], 'count': r['salary_monthly_count'], 'avg_salary': int(r['salary_monthly_mean'])}
+        for r in rows
+    ]
@@ -1,24 +1,104 @@
 import time
-import random
-import requests
 import math
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
-from urllib3.util.ssl_ import create_urllib3_context
-
-# --- 定義一個 TLS Adapter 來偽裝指紋 (保留新版邏輯) ---
-class TlsAdapter(HTTPAdapter):
-    def init_poolmanager(self, connections, maxsize, block=False):
-        ctx = create_urllib3_context()
-        ctx.load_default_certs()
-        ctx.set_ciphers('DEFAULT@SECLEVEL=1') 
-        self.poolmanager = PoolManager(
-            num_pools=connections,
-            maxsize=maxsize,
-            block=block,
-            ssl_context=ctx
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from rate_controller import get_rate_controller
+from http_cache import get_response_cache
+from session_pool import get_session
+from watermark import Watermark, crawl_since
+from salary_model import build_salary_fields, parse_salary_text
+from transform_pool import run_batch
+from page_stream import PageStream, STREAM_QUEUE_PAGES
+
+# asyncio 引擎只把「真正的 HTTP 請求」丟到這個共用執行緒池，等待/睡眠都在事件迴圈上進行
+HTTP_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix='spider104-http')
+
+# --- 轉換用對照表 (模組載入時建立一次，不再每筆重建) ---
+S10_MAP = {
+    '10': "面議",
+    '20': "論件計酬",
+    '30': "時薪",
+    '40': "日薪",
+    '50': "月薪",
+    '60': "年薪",
+    '70': "部分工時(月薪)"
+}
+S10_PAY_TYPE = {'10': '面議', '20': '論件計酬', '30': '時薪', '40': '日薪', '50': '月薪', '60': '年薪', '70': '部分工時'}
+
+def transform_job(job_data):
+    # --- 保留新版的 Transform 邏輯 (包含 s10 對照表) ---
+    links = job_data.get('link', {})
+    job_url = f"{links.get('job', '')}" if links.get('job') else ''
+    
+    s_code = str(job_data.get('s10', ''))
+    s_type_str = S10_MAP.get(s_code, '')
+
+    salary_str = job_data.get('salaryDesc', '')
+
+    # 若代碼是 10，直接顯示面議
+    if s_code == '10':
+        salary_str = "面議"
+    else:
+        # 若無描述，組裝數字
+        if not salary_str or salary_str == '待遇面議':
+            high = int(job_data.get('salaryHigh', 0))
+            low = int(job_data.get('salaryLow', 0))
+            if low > 0 or high > 0:
+                if low > 0 and high > 0 and high < 9999999:
+                    salary_str = f"{low} - {high}"
+                elif low > 0:
+                    salary_str = f"{low} 以上"
+                else:
+                    salary_str = "面議"
+            else:
+                salary_str = "面議"
+
+        # 加上前綴 月薪 等
+        if s_type_str and s_type_str not in salary_str:
+            salary_str = f"{s_type_str} {salary_str}"
+
+    # 結構化薪資：直接用 104 提供的 s10 / salaryLow / salaryHigh，不從文字反推
+    if s_code in S10_PAY_TYPE:
+        salary_fields = build_salary_fields(
+            S10_PAY_TYPE[s_code],
+            int(job_data.get('salaryLow', 0) or 0),
+            int(job_data.get('salaryHigh', 0) or 0)
         )
+    else:
+        salary_fields = parse_salary_text(salary_str)
+
+    raw_date = str(job_data.get('appearDate', ''))
+    update_date = raw_date
+    if len(raw_date) == 8:
+        update_date = f"{raw_date[:4]}/{raw_date[4:6]}/{raw_date[6:]}"
+    
+    job = {
+        'platform': '104',
+        'update_date': update_date,
+        'name': job_data.get('jobName', ''),
+        'company_name': job_data.get('custName', ''),
+        'salary': salary_str,
+        'job_url': job_url,
+        'location': f"{job_data.get('jobAddrNoDesc', '')} {job_data.get('jobAddress', '')}"
+    }
+    job.update(salary_fields)
+    return job
+
+def transform_jobs(raw_jobs):
+    # 批次轉換 (模組層級函式，才能交給行程池)；單筆資料有問題就略過，不影響整批
+    jobs = []
+    for job_data in raw_jobs:
+        try:
+            jobs.append(transform_job(job_data))
+        except Exception:
+            pass
+    return jobs
+
+def watermark_key(job_data):
+    # 增量爬取用 (時間戳, id)：appearDate 為 'YYYYMMDD'，id 用職缺網址 (與歷史倉儲的去重鍵一致)
+    links = job_data.get('link') or {}
+    return str(job_data.get('appearDate', '')), str(links.get('job') or job_data.get('jobNo', ''))
 
 class Job104Spider():
     ORANGE = '\033[38;5;208m'
@@ -26,39 +106,46 @@ class Job104Spider():
 
     def __init__(self):
         self.abort_signal = False
+        self.stop_check = None     # 外部的中止條件 (例如共用爬取的等待者都已離開)，搜尋開始時不會被重設
         self.is_blocked = False
-        self.session = requests.Session()
-        adapter = TlsAdapter()
-        self.session.mount('https://', adapter)
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Referer': 'https://www.104.com.tw/jobs/search/', 
-        })
+        self.collected = 0         # 本次搜尋已收到的筆數 (串流模式不保留資料也照算)
+        self.rate_controller = get_rate_controller('104')
+        self.cache = get_response_cache()
+        self.use_cache = True
+        # 整個行程共用的 session，keep-alive 連線跨搜尋重複使用
+        self.session = get_session('104')
 
     def _fetch_page(self, page, base_url, params, headers):
-        if self.abort_signal: return 0, []
+        if self.stopped(): return 0, []
         local_params = params.copy()
         local_params['page'] = page
-        headers['Connection'] = 'close'
         retries = 3
+
+        # 相同參數的頁面在 TTL 內直接從快取回傳，不打 API 也不消耗速率額度
+        if self.use_cache:
+            cached = self.cache.get('104', base_url, local_params)
+            if cached: return cached
         
         while retries > 0:
-            if self.abort_signal: return 0, []
+            if self.stopped(): return 0, []
             try:
-                self.smart_sleep(random.uniform(0.5, 2.5))
+                # 由全平台共用的速率控制器決定何時可以送出請求
+                if not self.rate_controller.acquire(self.stopped): return 0, []
                 r = self.session.get(base_url, params=local_params, headers=headers, timeout=5)
+                self.rate_controller.record(r.status_code)
                 
                 if r.status_code == 200:
                     data = r.json()
                     if 'data' in data:
                         jobs = data['data']
                         total = data.get('metadata', {}).get('pagination', {}).get('total', 0)
+                        if self.use_cache and jobs: self.cache.set('104', base_url, local_params, total, jobs)
                         return total, jobs
                 
                 elif r.status_code == 429:
                     # 429 封鎖提示
-                    print(f"{self.ORANGE}    [104封鎖] 第 {page} 頁被 429 限制，暫停 20 秒... (剩餘重試: {retries-1}){self.RESET}")
-                    self.smart_sleep(20)
+                    # 降速與冷卻由速率控制器處理，下一次 acquire 會自動等待
+                    print(f"{self.ORANGE}    [104封鎖] 第 {page} 頁被 429 限制，降速至 {self.rate_controller.rate:.2f} 次/秒... (剩餘重試: {retries-1}){self.RESET}")
                     retries -= 1
                     if retries == 0:
                         # 致命錯誤提示
@@ -82,10 +169,7 @@ class Job104Spider():
                 self.smart_sleep(3)
         return 0, []
 
-    def search(self, keyword, max_num=10, filter_params=None, sort_type='符合度', is_sort_asc=False):
-        self.abort_signal = False 
-        self.is_blocked = False 
-        
+    def _build_request(self, keyword, filter_params=None, sort_type='符合度', is_sort_asc=False):
         url = 'https://www.104.com.tw/jobs/search/api/jobs'
         params = {
             'ro': '0', 'kwop': '7', 'keyword': keyword,
@@ -100,124 +184,248 @@ class Job104Spider():
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'https://www.104.com.tw/jobs/search/',
         }
+        return url, params, headers
+
+    def count(self, keyword, filter_params=None):
+        # 只讀取總數：送出一次第 1 頁請求，不翻頁、不印搜尋摘要；失敗時回傳 None (呼叫端不會快取)
+        # 比較功能的 spider 整個行程共用，計數不受 (也不影響) 搜尋的 abort_signal
+        url, params, headers = self._build_request(keyword, filter_params)
+        params['page'] = 1
+
+        # 第 1 頁剛好也是搜尋會用到的快取鍵，兩邊可以互相重用
+        if self.use_cache:
+            cached = self.cache.get('104', url, params)
+            if cached: return cached[0]
+
+        self.rate_controller.acquire()
+        try:
+            r = self.session.get(url, params=params, headers=headers, timeout=5)
+        except Exception as e:
+            print(f"{self.ORANGE}    [104] 取得「{keyword}」總數失敗: {e}{self.RESET}")
+            return None
+        self.rate_controller.record(r.status_code)
+        if r.status_code != 200: return None
+
+        data = r.json()
+        if 'data' not in data: return None
+        total = data.get('metadata', {}).get('pagination', {}).get('total', 0)
+        if self.use_cache and data['data']: self.cache.set('104', url, params, total, data['data'])
+        return total
 
+    def _collect(self, all_jobs, jobs, max_num, on_page, progress, keep_jobs=True):
+        # 只把目標筆數以內的新資料交給串流回呼，避免前端收到超過 max_num 的職缺
+        fresh = jobs[:max(0, max_num - self.collected)]
+        self.collected += len(jobs)
+        if keep_jobs: all_jobs.extend(jobs)
+        if on_page and fresh:
+            progress['collected'] = min(self.collected, max_num)
+            on_page(fresh, progress)
+
+    def stream_pages(self, keyword, max_num=10, filter_params=None, sort_type='符合度', is_sort_asc=False, max_pages=STREAM_QUEUE_PAGES, should_stop=None):
+        # 逐頁產出 (原始職缺, 進度)；爬蟲本身不累積結果，記憶體只保留佇列內的幾頁
+        # 消費端離開的中止也走 should_stop：搜尋還沒開始 (abort_signal 尚未重設) 就離開也不會被吃掉
+        consumer_left = []
+        def run(on_page):
+            return self.search_async(keyword, max_num, filter_params, sort_type, is_sort_asc, on_page=on_page, keep_jobs=False,
+                                     should_stop=lambda: bool(consumer_left) or bool(should_stop and should_stop()))
+        def stop():
+            consumer_left.append(True)
+            self.abort_signal = True
+        return PageStream(run, stop, max_pages)
+
+    def iter_search(self, keyword, max_num=10, filter_params=None, sort_type='符合度', is_sort_asc=False, transform=False, max_pages=STREAM_QUEUE_PAGES):
+        # 逐筆產出職缺 (transform=True 時為轉換後的格式)；適合上萬筆的匯入，不必整批放在記憶體
+        for jobs, _ in self.stream_pages(keyword, max_num, filter_params, sort_type, is_sort_asc, max_pages):
+            yield from (self.transform_batch(jobs) if transform else jobs)
+
+    def search(self, keyword, max_num=10, filter_params=None, sort_type='符合度', is_sort_asc=False, on_page=None):
+        # 同步介面：收集 stream_pages 的每一頁，on_page 在呼叫端執行緒上呼叫
+        stream = self.stream_pages(keyword, max_num, filter_params, sort_type, is_sort_asc)
         all_jobs = []
+        for jobs, progress in stream:
+            all_jobs.extend(jobs)
+            if on_page: on_page(jobs, progress)
+        total, _ = stream.result or (0, [])
+        return total, all_jobs
+
+    def search_incremental(self, keyword, watermark=None, max_num=1000, filter_params=None):
+        # 增量模式：回傳 (新職缺, 新水位線)
+        # 沒有水位線時先完整搜尋一次當基準；有的話依日期排序 (order=2) 由新到舊翻頁，整頁都是已知職缺就停
+        if watermark is None:
+            _, jobs = self.search(keyword, max_num, filter_params)
+            return jobs, Watermark().advance(watermark_key(j) for j in jobs)
+
+        self.abort_signal = False
+        self.stop_check = None
+        self.is_blocked = False
+        url, params, headers = self._build_request(keyword, filter_params, sort_type='日期')
+        # 增量要的是最新狀態，不讀寫頁面快取
+        use_cache, self.use_cache = self.use_cache, False
+        try:
+            jobs, new_mark, pages = crawl_since(
+                lambda page: self._fetch_page(page, url, params, headers),
+                watermark_key, watermark, should_stop=self.stopped
+            )
+        finally:
+            self.use_cache = use_cache
+        print(f"{self.ORANGE}[104] 增量更新「{keyword}」: 翻了 {pages} 頁，新增 {len(jobs)} 筆{self.RESET}")
+        return jobs, new_mark
+
+    # ==========================================
+    # asyncio 引擎：單一事件迴圈 + 有上限的並發
+    # ==========================================
+    async def _afetch_page(self, page, base_url, params, headers):
+        if self.stopped(): return 0, []
+        local_params = params.copy()
+        local_params['page'] = page
+        retries = 3
+        loop = asyncio.get_running_loop()
+
+        if self.use_cache:
+            cached = self.cache.get('104', base_url, local_params)
+            if cached: return cached
+
+        while retries > 0:
+            if self.stopped(): return 0, []
+            try:
+                await self.rate_controller.aacquire()
+                if self.stopped(): return 0, []
+                r = await loop.run_in_executor(
+                    HTTP_EXECUTOR,
+                    partial(self.session.get, base_url, params=local_params, headers=headers, timeout=5)
+                )
+                self.rate_controller.record(r.status_code)
+
+                if r.status_code == 200:
+                    data = r.json()
+                    if 'data' in data:
+                        jobs = data['data']
+                        total = data.get('metadata', {}).get('pagination', {}).get('total', 0)
+                        if self.use_cache and jobs: self.cache.set('104', base_url, local_params, total, jobs)
+                        return total, jobs
+
+                elif r.status_code == 429:
+                    print(f"{self.ORANGE}    [104封鎖] 第 {page} 頁被 429 限制，降速至 {self.rate_controller.rate:.2f} 次/秒... (剩餘重試: {retries-1}){self.RESET}")
+                    retries -= 1
+                    if retries == 0:
+                        print(f"{self.ORANGE}    [104致命錯誤] 第 {page} 頁多次重試失敗，IP 可能已被重度封鎖。{self.RESET}")
+                        print(f"{self.ORANGE}    [104] 正在啟動緊急煞車，停止後續所有請求...{self.RESET}")
+                        self.is_blocked = True
+                        self.abort_signal = True
+                        return 0, []
+                    continue
+
+                else:
+                    print(f"{self.ORANGE}    [104警示] 第 {page} 頁回應碼: {r.status_code}{self.RESET}")
+                    retries -= 1
+                    await asyncio.sleep(3)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"{self.ORANGE}    [錯誤] 第 {page} 頁連線失敗: {e}{self.RESET}")
+                retries -= 1
+                await asyncio.sleep(3)
+        return 0, []
+
+    def search_async(self, keyword, max_num=10, filter_params=None, sort_type='符合度', is_sort_asc=False, on_page=None, keep_jobs=True, should_stop=None):
+        # 在目前執行緒上跑一個事件迴圈來驅動 asyncio 引擎
+        return asyncio.run(self.asearch(keyword, max_num, filter_params, sort_type, is_sort_asc, on_page=on_page, keep_jobs=keep_jobs, should_stop=should_stop))
+
+    async def asearch(self, keyword, max_num=10, filter_params=None, sort_type='符合度', is_sort_asc=False, max_concurrency=12, on_page=None, keep_jobs=True, should_stop=None):
+        # keep_jobs=False 時只透過 on_page 交出資料，不累積在 all_jobs (串流模式)
+        # should_stop：外部中止條件，與 abort_signal 一起檢查 (abort_signal 在這裡會重設，外部條件不會)
+        self.abort_signal = False
+        self.stop_check = should_stop
+        self.is_blocked = False
+        self.collected = 0
+
+        url, params, headers = self._build_request(keyword, filter_params, sort_type, is_sort_asc)
+
+        all_jobs = []
+
+        first_total, first_page_jobs = await self._afetch_page(1, url, params, headers)
 
-        first_total, first_page_jobs = self._fetch_page(1, url, params, headers)
-        
         if self.is_blocked:
             print(f"{self.ORANGE}    [104] 首頁即遭封鎖，停止搜尋。{self.RESET}")
             return 0, []
-            
+
         if not first_page_jobs:
             print(f"{self.ORANGE}    [104] 找不到任何資料{self.RESET}")
             return 0, []
 
-        all_jobs.extend(first_page_jobs)
-        # print(f"{self.ORANGE}    [104] 104 官方顯示總數: {first_total} 筆{self.RESET}")
+        self._collect(all_jobs, first_page_jobs, max_num, on_page, {'pages': 1, 'total': first_total}, keep_jobs)
 
         real_target_num = min(max_num, first_total)
         pages_needed = math.ceil(real_target_num / 20)
-        
-        # [Log 還原] 頁數校正提示
-        if pages_needed > 1:
+
+        if pages_needed > 1 and self.collected < max_num:
             print(f"{self.ORANGE}    [104] 校正後預計抓取: {real_target_num} 筆 (需再抓 {pages_needed - 1} 頁){self.RESET}")
-            
-            with ThreadPoolExecutor(max_workers=12) as executor:
-                future_to_page = {executor.submit(self._fetch_page, page, url, params, headers): page for page in range(2, pages_needed + 1)}
-                
-                for i, future in enumerate(as_completed(future_to_page)):
-                    if self.abort_signal:
+
+            # Semaphore 限制同時在途的請求數，其餘頁面只是排隊中的 coroutine，不佔執行緒
+            sem = asyncio.Semaphore(max_concurrency)
+
+            # 每頁完成就放進 results 佇列 (依完成順序處理)，Task 本身不帶結果：
+            # 收下的頁面處理完就能被回收，串流模式不會因為 Task 清單而把整份結果留在記憶體
+            results = asyncio.Queue()
+
+            async def fetch(page):
+                async with sem:
+                    try:
+                        page_result = await self._afetch_page(page, url, params, headers)
+                    except Exception:
+                        page_result = (0, [])
+                    results.put_nowait(page_result)
+
+            tasks = [asyncio.ensure_future(fetch(page)) for page in range(2, pages_needed + 1)]
+            try:
+                for i in range(len(tasks)):
+                    _, jobs = await results.get()
+                    if jobs:
+                        self._collect(all_jobs, jobs, max_num, on_page, {'pages': i + 2, 'total': first_total}, keep_jobs)
+                        if (i+1) % 50 == 0:
+                            print(f"{self.ORANGE}    [104] 已處理 {i+1} 頁... (目前 {self.collected} 筆){self.RESET}")
+
+                    if self.stopped():
                         break
-                    
-                    # [Log 還原] 資料達標提示
-                    if len(all_jobs) >= max_num:
-                        print(f"{self.ORANGE}[104] 資料量已達標 ({len(all_jobs)} / {max_num})，提早停止搜尋。{self.RESET}")
-                        self.abort_signal = True 
+
+                    if self.collected >= max_num:
+                        print(f"{self.ORANGE}[104] 資料量已達標 ({self.collected} / {max_num})，提早停止搜尋。{self.RESET}")
+                        self.abort_signal = True
                         break
-                    
-                    try:
-                        _, jobs = future.result()
-                        if jobs: 
-                            all_jobs.extend(jobs)
-                            # 進度提示 (每 50 頁顯示一次，可自行調整)
-                            if (i+1) % 50 == 0: 
-                                print(f"{self.ORANGE}    [104] 已處理 {i+1} 頁... (目前 {len(all_jobs)} 筆){self.RESET}")
-                    except: pass
-        
-        # 結尾總結
+            finally:
+                # 達標、封鎖或外部取消時，立即取消所有尚未完成的頁面 (包含正在睡眠退避的)
+                for t in tasks:
+                    if not t.done(): t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
         print(f"{self.ORANGE}" + "-" * 30 + f"{self.RESET}")
         if self.is_blocked:
-            print(f"{self.ORANGE}[104] 搜尋因 IP 封鎖而提前終止。共成功抓取 {len(all_jobs)} 筆。{self.RESET}")
+            print(f"{self.ORANGE}[104] 搜尋因 IP 封鎖而提前終止。共成功抓取 {self.collected} 筆。{self.RESET}")
         else:
-            print(f"{self.ORANGE}[104] 搜尋完成。共成功抓取 {len(all_jobs[:max_num])} 筆。{self.RESET}")
+            print(f"{self.ORANGE}[104] 搜尋完成。共成功抓取 {min(self.collected, max_num)} 筆。{self.RESET}")
         print(f"{self.ORANGE}" + "-" * 30 + f"{self.RESET}")
 
         return first_total, all_jobs[:max_num]
 
-    def search_job_transform(self, job_data):
-        # --- 保留新版的 Transform 邏輯 (包含 s10 對照表) ---
-        links = job_data.get('link', {})
-        job_url = f"{links.get('job', '')}" if links.get('job') else ''
-        
-        s10_map = {
-            '10': "面議",
-            '20': "論件計酬",
-            '30': "時薪",
-            '40': "日薪",
-            '50': "月薪",
-            '60': "年薪",
-            '70': "部分工時(月薪)"
-        }
-        
-        s_code = str(job_data.get('s10', ''))
-        s_type_str = s10_map.get(s_code, '')
+    def stopped(self):
+        # 自己的 abort_signal 或外部中止條件成立；外部條件成立時也設起 abort_signal，讓各處立即看到
+        if not self.abort_signal and self.stop_check and self.stop_check():
+            self.abort_signal = True
+        return self.abort_signal
 
-        salary_str = job_data.get('salaryDesc', '')
-
-        # 若代碼是 10，直接顯示面議
-        if s_code == '10':
-            salary_str = "面議"
-        else:
-            # 若無描述，組裝數字
-            if not salary_str or salary_str == '待遇面議':
-                high = int(job_data.get('salaryHigh', 0))
-                low = int(job_data.get('salaryLow', 0))
-                if low > 0 or high > 0:
-                    if low > 0 and high > 0 and high < 9999999:
-                        salary_str = f"{low} - {high}"
-                    elif low > 0:
-                        salary_str = f"{low} 以上"
-                    else:
-                        salary_str = "面議"
-                else:
-                    salary_str = "面議"
-
-            # 加上前綴 月薪 等
-            if s_type_str and s_type_str not in salary_str:
-                salary_str = f"{s_type_str} {salary_str}"
+    def search_job_transform(self, job_data):
+        return transform_job(job_data)
 
-        raw_date = str(job_data.get('appearDate', ''))
-        update_date = raw_date
-        if len(raw_date) == 8:
-            update_date = f"{raw_date[:4]}/{raw_date[4:6]}/{raw_date[6:]}"
-        
-        job = {
-            'platform': '104',
-            'update_date': update_date,
-            'name': job_data.get('jobName', ''),
-            'company_name': job_data.get('custName', ''),
-            'salary': salary_str,
-            'job_url': job_url,
-            'location': f"{job_data.get('jobAddrNoDesc', '')} {job_data.get('jobAddress', '')}"
-        }
-        return job
+    def transform_batch(self, raw_jobs, use_processes=None):
+        # 整頁 (或整批) 一次轉換；超大批次會自動切塊交給行程池
+        return run_batch(transform_jobs, raw_jobs, use_processes)
 
     def smart_sleep(self, seconds):
         steps = int(seconds * 10) 
         for _ in range(steps):
-            if self.abort_signal: return 
+            if self.stopped(): return 
             time.sleep(0.1)
         remaining = seconds - (steps * 0.1)
-        if remaining > 0 and not self.abort_signal:
+        if remaining > 0 and not self.stopped():
             time.sleep(remaining)
\ No newline at end of file
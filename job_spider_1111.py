@@ -1,29 +1,146 @@
 import time
-import requests
 import math
 import re
 import threading
-import random
+import asyncio
+from functools import partial
 from urllib.parse import quote
-from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, as_completed
-from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from rate_controller import get_rate_controller
+from http_cache import get_response_cache
+from session_pool import get_session
+from watermark import Watermark, crawl_since
+from salary_model import parse_salary_text
+from transform_pool import run_batch
+from page_stream import PageStream, STREAM_QUEUE_PAGES
+
+SEARCH_API_URL = 'https://www.1111.com.tw/api/v1/search/jobs/'
+
+# asyncio 排程器只把阻塞的 HTTP 請求丟進這個共用執行緒池
+HTTP_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix='spider1111-http')
+
+# --- 分區規劃 ---
+# 1111 單一查詢能翻到的筆數有限，總數超過 LEAF_CAP 的分區就要再切：
+# 全域 → 地區 → 薪資類型 → 月薪區間二分 (直到每個葉節點都翻得完，或區間已無法再切)
+PAGE_SIZE = 20
+LEAF_CAP = 2000            # 單一分區可以完整翻完的筆數
+MAX_PAGES = 150            # 無法再切的分區最多翻的頁數
+MIN_SALARY_SPAN = 1000     # 月薪區間最小寬度 (元)
+OPEN_SALARY_SPAN = 150000  # 無上限區間二分時假設的寬度
+MONTHLY_SALARY_LIMIT = 1000000  # 起點超過此值的無上限區間不再切
+
+def split_salary_range(lo, hi):
+    # 回傳二分點 (取整到 MIN_SALARY_SPAN)；區間太窄無法再切時回傳 None
+    if hi is None:
+        if lo >= MONTHLY_SALARY_LIMIT: return None
+        hi = max(lo * 2, lo + OPEN_SALARY_SPAN)
+    if hi - lo < 2 * MIN_SALARY_SPAN: return None
+    return lo + (hi - lo) // 2 // MIN_SALARY_SPAN * MIN_SALARY_SPAN
+
+def salary_range_label(lo, hi):
+    if hi is None and not lo: return "月薪"
+    if hi is None: return f"月薪_{lo / 10000:g}萬上"
+    return f"月薪_{lo / 10000:g}-{hi / 10000:g}萬"
+
+# --- 收進結果時的精簡紀錄 ---
+# 原始 hit 帶有大量轉換用不到的巢狀欄位；_add_jobs 收下時就只留轉換需要的欄位，
+# 大量爬取 (max_num 上萬、多個搜尋同時進行) 時每筆只佔幾個字串，原始 dict 可以直接被回收。
+class Job1111Record():
+    __slots__ = ('job_id', 'title', 'company_name', 'salary', 'update_at', 'location', 'search_range')
+
+    def __init__(self, job_id, title, company_name, salary, update_at, location, search_range):
+        self.job_id = job_id
+        self.title = title
+        self.company_name = company_name
+        self.salary = salary
+        self.update_at = update_at
+        self.location = location
+        self.search_range = search_range
+
+def job_id_key(value):
+    # 去重用的 id：1111 的 jobId 是數字，存 int 比字串省記憶體；非數字時保留原字串
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return str(value or '')
+
+def compact_job(job_data, search_range='一般搜尋'):
+    if isinstance(job_data, Job1111Record): return job_data
+
+    location = ""
+    wc = job_data.get('workCity')
+    if isinstance(wc, list) and len(wc) > 0:
+        location = wc[0].get('name', '')
+    elif isinstance(wc, dict):
+        location = wc.get('name', '')
+
+    return Job1111Record(
+        job_id_key(job_data.get('jobId', '')),
+        job_data.get('title', ''),
+        job_data.get('companyName', ''),
+        job_data.get('salary', '面議'),
+        str(job_data.get('updateAt', '')),
+        location,
+        job_data.get('search_range', search_range),
+    )
+
+# --- 轉換函式放在模組層級，才能交給行程池 ---
+def transform_job(job_data):
+    # 接受精簡紀錄或原始 hit (原始 hit 先轉成精簡紀錄，兩者輸出相同)
+    record = compact_job(job_data)
+    job_id = str(record.job_id)
+    job_url = f"https://www.1111.com.tw/job/{job_id}/" if job_id else ""
+
+    raw_date = record.update_at
+    update_date = raw_date.split(" ")[0] if raw_date else ""
+    
+    salary_str = record.salary
+    
+    job = {
+        'platform': '1111',
+        'search_range': record.search_range, 
+        'update_date': update_date,
+        'name': record.title,
+        'company_name': record.company_name,
+        'salary': salary_str,
+        'job_url': job_url,
+        'location': record.location
+    }
+    # 1111 只提供薪資文字，在轉換時解析一次成結構化欄位
+    job.update(parse_salary_text(salary_str))
+    return job
+
+def watermark_key(job_data):
+    # 增量爬取用 (時間戳, id)：updateAt 為 'YYYY-MM-DD HH:MM'，與搜尋排序 (sortBy=da) 一致
+    if isinstance(job_data, Job1111Record):
+        return job_data.update_at, str(job_data.job_id)
+    return str(job_data.get('updateAt', '')), str(job_data.get('jobId', ''))
+
+def transform_jobs(raw_jobs):
+    # 批次轉換；單筆資料有問題就略過，不影響整批
+    jobs = []
+    for job_data in raw_jobs:
+        try:
+            jobs.append(transform_job(job_data))
+        except Exception:
+            pass
+    return jobs
 
 class Job1111Spider():
     BLUE = '\033[94m'
     RESET = '\033[0m'
 
+    # 任務優先度 (數字小者先執行)
+    TASK_PRIORITY = {'fetch_page': 0, 'check_split': 1}
+
     def __init__(self):
         self.abort_signal = False
-        self.session = requests.Session()
-        # 維持連線池設定
-        adapter = HTTPAdapter(pool_connections=100, pool_maxsize=100, max_retries=3)
-        self.session.mount('https://', adapter)
-        self.session.mount('http://', adapter)
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Referer': 'https://www.1111.com.tw/search/job',
-            'Accept': 'application/json, text/plain, */*'
-        })
+        self.stop_check = None     # 外部的中止條件 (例如共用爬取的等待者都已離開)，搜尋開始時不會被重設
+        self.rate_controller = get_rate_controller('1111')
+        self.cache = get_response_cache()
+        self.use_cache = True
+        # 整個行程共用的 session，keep-alive 連線跨搜尋重複使用
+        self.session = get_session('1111')
         
         self.REGION_CODES = {
             '台北市': '100100', '新北市': '100200', '基隆市': '100300', '宜蘭縣': '100400',
@@ -37,16 +154,14 @@ class Job1111Spider():
         self.SALARY_TASKS = {
             '日薪': {'st': '2'}, '時薪': {'st': '4'}, '年薪': {'st': '8'},
             '承攬': {'st': '16'}, '部分工時': {'st': '32'}, '論件計酬': {'st': '64'},
-            '月薪_3萬下': {'st': '1', 'min': 0, 'max': 30000},
-            '月薪_3-4萬': {'st': '1', 'min': 30000, 'max': 40000},
-            '月薪_4-5萬': {'st': '1', 'min': 40000, 'max': 50000},
-            '月薪_5-6萬': {'st': '1', 'min': 50000, 'max': 60000},
-            '月薪_6-8萬': {'st': '1', 'min': 60000, 'max': 80000},
-            '月薪_8萬上': {'st': '1', 'min': 80000, 'max': None},
+            # 月薪不再用固定區間，依總數遞迴二分 (見 _split_tasks)
+            '月薪': {'st': '1', 'min': 0, 'max': None},
         }
         
-        self.global_jobs = []      
-        self.global_seen_ids = set() 
+        self.global_jobs = []       # Job1111Record (只留轉換需要的欄位)
+        self.global_seen_ids = set() # int jobId
+        self.collected = 0           # 已收下的筆數 (串流模式不保留資料也照算)
+        self.keep_jobs = True        # False 時只透過 on_page 交出資料 (串流模式)
         self.global_lock = threading.Lock() 
         self.target_num = 0       
         self.api_call_count = 0  # 監控 API 呼叫次數
@@ -56,316 +171,505 @@ class Job1111Spider():
         # 新增監控變數
         self.monitor_timer = 0
         self.monitor_last_count = 0
+        self.monitor_blocked = 0     # 本次監控區間內 on_page 被背壓阻塞的秒數 (不算在停損計時內)
+
+        # 分區規劃統計與覆蓋率報告 (每次搜尋重設)
+        self.plan_stats = {}
+        self.coverage = {}
+
+        # 串流用：每一頁 (或分區的每一頁) 收進資料後呼叫 on_page(jobs, progress)
+        self.on_page = None
 
     def _add_jobs(self, jobs, source_label=""):
         if not jobs: return
         
+        added = []
         with self.global_lock:
-            if len(self.global_jobs) >= self.target_num: return
+            if self.collected >= self.target_num: return
 
-            added_count = 0
             for j in jobs:
-                jid = str(j.get('jobId', ''))
-                if jid:
+                # 達標後就不再收，串流出去的筆數才會與最終結果一致
+                if self.collected >= self.target_num: break
+                jid = job_id_key(j.get('jobId', ''))
+                if jid != '':
                     if jid not in self.global_seen_ids:
                         self.global_seen_ids.add(jid)
-                        j['search_range'] = source_label
-                        self.global_jobs.append(j)
-                        added_count += 1
+                        record = compact_job(j, source_label)
+                        record.search_range = source_label
+                        self.collected += 1
+                        if self.keep_jobs: self.global_jobs.append(record)
+                        added.append(record)
                         self.last_success_time = time.time() # 更新成功時間
                     else:
                         self.duplicate_count += 1 # 記錄重複
+
+            progress = {
+                'label': source_label,
+                'collected': self.collected,
+                'duplicates': self.duplicate_count,
+                'api_calls': self.api_call_count,
+            }
+
+        # 回呼放在鎖外執行，避免拖慢其他 worker；整頁都是重複時不送空的頁面
+        if self.on_page and added:
+            started = time.time()
+            self.on_page(added, progress)
+            # 串流消費端跟不上時 on_page 會阻塞 (背壓)，另外記錄阻塞時間，由停損監控扣除
+            self.monitor_blocked += time.time() - started
             
-    def _fetch_raw(self, page, url, payload):
+    def _build_page_params(self, page, payload):
         p = payload.copy()
         p['page'] = page
         p['_'] = int(time.time() * 1000)
-        
-        # 模擬人類行為：隨機微幅延遲 0.2 ~ 0.8 秒
-        time.sleep(random.uniform(0.2, 0.8))
 
         if 'searchUrl' in p:
             if 'page=' in p['searchUrl']:
                 p['searchUrl'] = re.sub(r'page=\d+', f'page={page}', p['searchUrl'])
             else:
                 p['searchUrl'] += f"&page={page}"
+        return p
+
+    def _parse_response(self, r, abort_on_block=True):
+        # abort_on_block=False：單次請求 (count) 遇到 403 只回傳失敗，不中止整個 spider
+        with self.global_lock:
+            self.api_call_count += 1
+        self.rate_controller.record(r.status_code)
+
+        if r.status_code == 200:
+            data = r.json()
+            # 檢查 1111 是否回傳了「空結果」但狀態碼是 200 (常見的軟封鎖)
+            if not data.get('result') and not data.get('data'):
+                return 0, []
+
+            jobs = []
+            total = 0
+            if 'result' in data:
+                jobs = data['result'].get('hits', [])
+                total = data['result'].get('pagination', {}).get('totalCount', 0)
+            elif 'data' in data:
+                jobs = data.get('data', [])
+                total = data.get('pagination', {}).get('totalCount', 0) if 'pagination' in data else data.get('total', len(jobs))
+            return total, jobs
+
+        elif r.status_code == 429: # Too Many Requests
+            # 冷卻與降速交給速率控制器，之後的請求都會自動等待
+            print(f"\n{self.BLUE}[警告] 觸發頻率限制，降速至 {self.rate_controller.rate:.2f} 次/秒...{self.RESET}")
+        elif r.status_code == 403:
+            print(f"\n{self.BLUE}[錯誤] IP 可能被封鎖 (403 Forbidden){self.RESET}")
+            if abort_on_block: self.abort_signal = True
+        return 0, []
+
+    def _cached_page(self, url, p):
+        # 快取鍵會排除 '_' 時間戳，因此同一頁在 TTL 內可以直接重用
+        if not self.use_cache: return None
+        return self.cache.get('1111', url, p)
+
+    def _store_page(self, url, p, status_code, total, jobs):
+        # 只快取真正有資料的 200 回應 (空結果可能是軟封鎖)
+        if self.use_cache and status_code == 200 and jobs:
+            self.cache.set('1111', url, p, total, jobs)
+
+    def _base_payload(self, keyword):
+        safe_keyword = quote(keyword)
+        return {
+            'keyword': keyword, 'page': 1, 'sortBy': 'da', 'sortOrder': 'desc',
+            'isSyncedRecommendJobs': 'false', 'fromOffset': 0,
+            'searchUrl': f"/search/job?ks={safe_keyword}&col=da&sort=desc"
+        }
+
+    def count(self, keyword, filters=None):
+        # 只讀取總數：送出一次第 1 頁請求，不動搜尋狀態、不印搜尋摘要；失敗時回傳 None (呼叫端不會快取)
+        # 比較功能的 spider 整個行程共用：不看也不設定 abort_signal，一次 403 不會讓之後的計數全部失敗
+        payload = self._base_payload(keyword)
+        if filters: payload.update(filters)
+        p = self._build_page_params(1, payload)
+        cached = self._cached_page(SEARCH_API_URL, p)
+        if cached: return cached[0]
+
+        self.rate_controller.acquire()
+        try:
+            r = self.session.get(SEARCH_API_URL, params=p, timeout=15)
+        except Exception as e:
+            print(f"{self.BLUE}[1111] 取得「{keyword}」總數失敗: {e}{self.RESET}")
+            return None
+        total, jobs = self._parse_response(r, abort_on_block=False)
+        if r.status_code != 200: return None
+        self._store_page(SEARCH_API_URL, p, r.status_code, total, jobs)
+        return total
+
+    def _fetch_raw(self, page, url, payload):
+        p = self._build_page_params(page, payload)
+        cached = self._cached_page(url, p)
+        if cached: return cached
+
+        # 由全平台共用的速率控制器決定送出時間 (取代固定的隨機延遲)
+        if not self.rate_controller.acquire(self.stopped): return 0, []
 
         try:
-            # 增加一些常見的 Header 偽裝
             r = self.session.get(url, params=p, timeout=15)
-            
-            with self.global_lock:
-                self.api_call_count += 1
-                
-            if r.status_code == 200:
-                data = r.json()
-                # 檢查 1111 是否回傳了「空結果」但狀態碼是 200 (常見的軟封鎖)
-                if not data.get('result') and not data.get('data'):
-                    return 0, []
-                
-                # ... 原本的 parsing 邏輯 ...
-                jobs = []
-                total = 0
-                if 'result' in data:
-                    jobs = data['result'].get('hits', [])
-                    total = data['result'].get('pagination', {}).get('totalCount', 0)
-                elif 'data' in data:
-                    jobs = data.get('data', [])
-                    total = data.get('pagination', {}).get('totalCount', 0) if 'pagination' in data else data.get('total', len(jobs))
-                return total, jobs
-            
-            elif r.status_code == 429: # Too Many Requests
-                print(f"\n{self.BLUE}[警告] 觸發頻率限制，暫停 5 秒...{self.RESET}")
-                time.sleep(5)
-            elif r.status_code == 403:
-                print(f"\n{self.BLUE}[錯誤] IP 可能被封鎖 (403 Forbidden){self.RESET}")
-                self.abort_signal = True 
+            total, jobs = self._parse_response(r)
+            self._store_page(url, p, r.status_code, total, jobs)
+            return total, jobs
         except Exception as e:
             pass 
         return 0, []
 
-    def _process_task(self, task_type, params, label):
-        if self.abort_signal: return []
-        if len(self.global_jobs) >= self.target_num: return []
+    async def _afetch_raw(self, page, url, payload):
+        p = self._build_page_params(page, payload)
+        cached = self._cached_page(url, p)
+        if cached: return cached
+
+        # 等待 token 期間不佔用任何執行緒
+        await self.rate_controller.aacquire()
+        if self.stopped(): return 0, []
+
+        loop = asyncio.get_running_loop()
+        try:
+            r = await loop.run_in_executor(HTTP_EXECUTOR, partial(self.session.get, url, params=p, timeout=15))
+            total, jobs = self._parse_response(r)
+            self._store_page(url, p, r.status_code, total, jobs)
+            return total, jobs
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            pass
+        return 0, []
+
+    def _salary_payload(self, payload, st, lo=None, hi=None):
+        sub_payload = payload.copy()
+        sub_payload['salaryType'] = st
+        sub_payload['searchUrl'] += f"&st={st}"
+        if st == '1':
+            sub_payload['isExcludeNegotiable'] = 'true'
+            if lo is not None:
+                sub_payload['salaryFrom'] = str(lo)
+                sub_payload['searchUrl'] += f"&sa0={lo}"
+            if hi is not None:
+                sub_payload['salaryTo'] = str(hi)
+                sub_payload['searchUrl'] += f"&sa1={hi}"
+        return sub_payload
+
+    def _monthly_task(self, base, base_label, lo, hi, total=None, sibling=None):
+        # base 是尚未加薪資條件的地區 payload，每個區間都從它重新組出 searchUrl
+        return {
+            'type': 'check_split',
+            'params': {
+                'payload': self._salary_payload(base, '1', lo, hi), 'level': 'monthly',
+                'base': base, 'base_label': base_label, 'range': (lo, hi),
+                'total': total, 'sibling': sibling,
+            },
+            'label': f"{base_label}-{salary_range_label(lo, hi)}"
+        }
+
+    def _can_split(self, level, params):
+        if level in ('root', 'region'): return True
+        if level == 'monthly': return split_salary_range(*params['range']) is not None
+        return False
 
-        url = 'https://www.1111.com.tw/api/v1/search/jobs/'
+    def _split_tasks(self, payload, level, label, params=None, total=0):
         new_tasks = []
+        if level == 'root':
+            for c_name, c_code in self.REGION_CODES.items():
+                sub_payload = payload.copy()
+                sub_payload['city'] = c_code
+                sub_payload['searchUrl'] += f"&city={c_code}"
+                new_tasks.append({
+                    'type': 'check_split',
+                    'params': {'payload': sub_payload, 'level': 'region'},
+                    'label': c_name
+                })
+
+        elif level == 'region':
+            for s_name, s_params in self.SALARY_TASKS.items():
+                st = s_params.get('st')
+                if st == '1':
+                    new_tasks.append(self._monthly_task(payload, label, s_params.get('min'), s_params.get('max')))
+                    continue
+                new_tasks.append({
+                    'type': 'check_split',
+                    'params': {'payload': self._salary_payload(payload, st), 'level': 'leaf'},
+                    'label': f"{label}-{s_name}"
+                })
+
+        elif level == 'monthly':
+            # 只先探測左半；右半的總數 = 父區間 - 左半，等左半回來再推算 (見 _sibling_task)
+            lo, hi = params['range']
+            mid = split_salary_range(lo, hi)
+            sibling = {'range': (mid, hi), 'parent_total': total}
+            new_tasks.append(self._monthly_task(params['base'], params['base_label'], lo, mid, sibling=sibling))
+        return new_tasks
+
+    def _sibling_task(self, params, left_total):
+        sibling = params.get('sibling')
+        if not sibling: return []
+        lo, hi = sibling['range']
+        derived = max(0, sibling['parent_total'] - left_total)
+        return [self._monthly_task(params['base'], params['base_label'], lo, hi, total=derived)]
+
+    def _record_leaf(self, total, page_cap=MAX_PAGES, wanted=None):
+        # page_cap：實際排入的頁數上限；wanted：使用者要求的筆數 (因此少翻的頁數不算截斷)
+        stats = self.plan_stats
+        stats['leaves'] += 1
+        stats['partition_total'] += total
+        stats['reachable'] += min(total, page_cap * PAGE_SIZE)
+        needed = total if wanted is None else min(total, wanted)
+        if needed > page_cap * PAGE_SIZE:
+            stats['truncated_leaves'] += 1
+
+    def _page_tasks(self, payload, total, label, safe_limit=MAX_PAGES):
+        # 翻頁邏輯
+        pages_needed = math.ceil(total / PAGE_SIZE)
+        final_pages = min(pages_needed, safe_limit)
+
+        new_tasks = []
+        for p in range(2, final_pages + 1):
+            new_tasks.append({
+                'type': 'fetch_page',
+                'params': {'payload': payload, 'page': p},
+                'label': label
+            })
+        return new_tasks
+
+    async def _aprocess_task(self, task_type, params, label):
+        if self.stopped(): return []
+        if self.collected >= self.target_num: return []
+
+        url = SEARCH_API_URL
 
         if task_type == 'fetch_page':
             page = params.get('page', 1)
             payload = params.get('payload')
-            total, jobs = self._fetch_raw(page, url, payload)
+            total, jobs = await self._afetch_raw(page, url, payload)
             self._add_jobs(jobs, label)
             return []
 
         elif task_type == 'check_split':
             payload = params.get('payload')
-            current_level = params.get('level', 'root') 
-            
-            total, jobs = self._fetch_raw(1, url, payload)
+            current_level = params.get('level', 'root')
+            splittable = self._can_split(current_level, params)
+
+            # 總數已知 (由上一層推算) 且確定要再切時，不必再探測這一層
+            known_total = params.get('total')
+            if known_total is not None and known_total > LEAF_CAP and splittable:
+                self.plan_stats['skipped_probes'] += 1
+                return self._split_tasks(payload, current_level, label, params, known_total)
+
+            total, jobs = await self._afetch_raw(1, url, payload)
+            self.plan_stats['probes'] += 1
             self._add_jobs(jobs, label)
+            new_tasks = self._sibling_task(params, total)
 
-            # 只有當總數 > 2000 且 還有下一層時才拆分
-            if total > 2000:
-                if current_level == 'root':
-                    for c_name, c_code in self.REGION_CODES.items():
-                        sub_payload = payload.copy()
-                        sub_payload['city'] = c_code
-                        sub_payload['searchUrl'] += f"&city={c_code}"
-                        new_tasks.append({
-                            'type': 'check_split',
-                            'params': {'payload': sub_payload, 'level': 'region'},
-                            'label': c_name
-                        })
-                    return new_tasks
-
-                elif current_level == 'region':
-                    for s_name, s_params in self.SALARY_TASKS.items():
-                        sub_payload = payload.copy()
-                        st = s_params.get('st')
-                        sub_payload['salaryType'] = st
-                        sub_payload['searchUrl'] += f"&st={st}"
-                        
-                        if st == '1':
-                            sub_payload['isExcludeNegotiable'] = 'true'
-                            if s_params.get('min') is not None:
-                                sub_payload['salaryFrom'] = str(s_params['min'])
-                                sub_payload['searchUrl'] += f"&sa0={s_params['min']}"
-                            if s_params.get('max') is not None:
-                                sub_payload['salaryTo'] = str(s_params['max'])
-                                sub_payload['searchUrl'] += f"&sa1={s_params['max']}"
-
-                        new_tasks.append({
-                            'type': 'check_split',
-                            'params': {'payload': sub_payload, 'level': 'salary'},
-                            'label': f"{label}-{s_name}"
-                        })
-                    return new_tasks
-            
-            # 翻頁邏輯
-            pages_needed = math.ceil(total / 20)
-            safe_limit = 150 
-            final_pages = min(pages_needed, safe_limit)
-
-            if final_pages > 1:
-                for p in range(2, final_pages + 1):
-                    new_tasks.append({
-                        'type': 'fetch_page',
-                        'params': {'payload': payload, 'page': p},
-                        'label': label
-                    })
-            return new_tasks
+            # 超過單一分區上限且還能再切就往下拆，否則這裡就是葉節點，直接翻頁
+            if total > LEAF_CAP and splittable:
+                return new_tasks + self._split_tasks(payload, current_level, label, params, total)
+
+            self._record_leaf(total)
+            return new_tasks + self._page_tasks(payload, total, label)
 
         return []
-    
-    def _strategy_simple_paging(self, url, total_count, base_payload):
-        print(f"{self.BLUE}[1111] 進入「簡單翻頁模式」 (API回傳總數： {total_count}){self.RESET}")
 
-        # [關鍵修復] 
-        # 計算實際需要的頁數：取「總頁數」與「目標頁數」的最小值
-        # 如果 target_num=1，這裡算出來 pages_needed 就會是 1，不會去跑 50 頁
-        
-        pages_by_total = math.ceil(total_count / 20)
-        pages_by_target = math.ceil(self.target_num / 20)
-        
-        # 最終頁數取三者最小：(總資料頁數, 目標頁數, 150頁上限)
-        max_pages = min(pages_by_total, pages_by_target, 150)
-        
-        if max_pages == 0: max_pages = 1 # 至少抓一頁
+    async def _run_task_queue(self, initial_tasks, max_concurrency=10, show_progress=True):
+        # 優先佇列：翻頁任務 (直接產出資料) 優先於拆分探測，同優先度依加入順序 (FIFO)
+        queue = asyncio.PriorityQueue()
+        seq = 0
+        for t in initial_tasks:
+            queue.put_nowait((self.TASK_PRIORITY.get(t['type'], 1), seq, t))
+            seq += 1
 
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_page = {
-                executor.submit(self._fetch_raw, page, url, base_payload): page
-                for page in range(1, max_pages + 1)
-            }
+        done_event = asyncio.Event()
 
-            for future in as_completed(future_to_page):
-                page = future_to_page[future]
+        def should_stop():
+            return self.stopped() or self.collected >= self.target_num
+
+        async def worker():
+            nonlocal seq
+            while True:
+                _, _, t = await queue.get()
                 try:
-                    _, jobs = future.result()
-                    if jobs:
-                        self._add_jobs(jobs, "一般搜尋")
-                        print(f"\r{self.BLUE}[1111] 簡單模式: 已收集 {len(self.global_jobs)}/{self.target_num} 筆...{self.RESET}", end="")
-                        
-                        # 如果已經達標，可以提早結束 (雖然 ThreadPool 不易中斷，但至少停止 print)
-                        if len(self.global_jobs) >= self.target_num:
-                            break
-                except Exception as e:
+                    if not should_stop():
+                        new_task_defs = await self._aprocess_task(t['type'], t['params'], t['label'])
+                        for nt in new_task_defs or []:
+                            if should_stop(): break
+                            queue.put_nowait((self.TASK_PRIORITY.get(nt['type'], 1), seq, nt))
+                            seq += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
                     pass
+                finally:
+                    queue.task_done()
+                # 合作式提早結束：任何一個 worker 發現達標就通知主流程
+                if should_stop():
+                    done_event.set()
+
+        async def monitor():
+            # 心跳 Log 與「20 秒無成長就停止」的智慧停損，與任務完成與否無關，不會拖慢結束
+            last_print_time = time.time()
+            while True:
+                await asyncio.sleep(1)
+                current_count = self.collected
+                current_time = time.time()
+
+                # 扣掉被消費端阻塞的時間，真正在抓取卻 20 秒沒有成長才停損
+                if current_time - self.monitor_timer - self.monitor_blocked > 20:
+                    growth = current_count - self.monitor_last_count
+                    if growth == 0 and self.api_call_count > 100:
+                        print(f"\n{self.BLUE}[1111] 資料已達極限，停止抓取。{self.RESET}")
+                        self.abort_signal = True
+                        done_event.set()
+                        return
+                    self.monitor_timer = current_time
+                    self.monitor_blocked = 0
+                    self.monitor_last_count = current_count
+
+                if show_progress and current_time - last_print_time > 3:
+                    percent = (current_count / self.target_num) * 100
+                    print(f"\r{self.BLUE}[1111] 收集: {current_count}/{self.target_num} ({percent:.1f}%) | "
+                        f"重複: {self.duplicate_count} | 請求: {self.api_call_count} | "
+                        f"剩餘: {queue.qsize()} {self.RESET}", end="")
+                    last_print_time = current_time
 
-    def search(self, keyword, max_num=5000):
+        workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+        monitor_task = asyncio.ensure_future(monitor())
+        join_task = asyncio.ensure_future(queue.join())
+        stop_task = asyncio.ensure_future(done_event.wait())
+        try:
+            await asyncio.wait({join_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if self.collected >= self.target_num:
+                self.abort_signal = True
+            # 佇列清空或達標後立刻取消所有 worker，在途中的請求與睡眠都會被中斷
+            pending = workers + [monitor_task, join_task, stop_task]
+            for t in pending:
+                if not t.done(): t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def asearch(self, keyword, max_num=5000, max_concurrency=10, on_page=None, keep_jobs=True, should_stop=None):
+        # should_stop：外部中止條件，與 abort_signal 一起檢查 (abort_signal 在這裡會重設，外部條件不會)
         self.abort_signal = False
+        self.stop_check = should_stop
+        self.on_page = on_page
+        self.keep_jobs = keep_jobs
         self.target_num = max_num
         self.global_jobs = []
         self.global_seen_ids = set()
+        self.collected = 0
         self.api_call_count = 0
         self.duplicate_count = 0
         self.last_success_time = time.time()
+        self.plan_stats = {'probes': 0, 'skipped_probes': 0, 'leaves': 0, 'truncated_leaves': 0, 'partition_total': 0, 'reachable': 0}
+        self.coverage = {}
 
-        url = 'https://www.1111.com.tw/api/v1/search/jobs/'
+        url = SEARCH_API_URL
         
         # 初始化速率監控器
         self.monitor_timer = time.time()
+        self.monitor_blocked = 0
         self.monitor_last_count = 0
         
-        safe_keyword = quote(keyword)
         print(f"{self.BLUE}[1111] 啟動搜尋: {keyword} (目標 {max_num} 筆){self.RESET}")
 
-        base_payload = {
-            'keyword': keyword, 'page': 1, 'sortBy': 'da', 'sortOrder': 'desc',
-            'isSyncedRecommendJobs': 'false', 'fromOffset': 0,
-            'searchUrl': f"/search/job?ks={safe_keyword}&col=da&sort=desc"
-        }
+        base_payload = self._base_payload(keyword)
 
-        total_count, jobs_p1 = self._fetch_raw(1, url, base_payload)
-        if self.target_num <= 1 or len(self.global_jobs) >= self.target_num:
+        total_count, jobs_p1 = await self._afetch_raw(1, url, base_payload)
+        if self.target_num <= 1:
             return total_count, self.global_jobs
 
-        # 稍微降速到 10 workers 以求穩定
-        executor = ThreadPoolExecutor(max_workers=10)
-        futures = set()
-
-        #資料數少的話就用簡單搜尋模式
-        if self.target_num < 4500 or total_count < 4500:
-            self._strategy_simple_paging(url, total_count, base_payload)
+        # 需要的筆數一次翻頁就拿得到 (不超過 MAX_PAGES 頁) 才用簡單搜尋模式，否則交給分區規劃
+        if min(self.target_num, total_count) <= MAX_PAGES * PAGE_SIZE:
+            print(f"{self.BLUE}[1111] 進入「簡單翻頁模式」 (API回傳總數： {total_count}){self.RESET}")
+            # 第 1 頁已經抓過，直接收下，從第 2 頁開始排入佇列
+            self._add_jobs(jobs_p1, "一般搜尋")
+            # 取「總頁數」與「目標頁數」的最小值 (上限 MAX_PAGES 頁)
+            page_cap = min(math.ceil(self.target_num / PAGE_SIZE), MAX_PAGES)
+            self._record_leaf(total_count, page_cap, wanted=self.target_num)
+            tasks = self._page_tasks(base_payload, total_count, "一般搜尋", safe_limit=page_cap)
+            await self._run_task_queue(tasks, max_concurrency=3, show_progress=False)
         else:
-            f = executor.submit(self._process_task, 'check_split', {'payload': base_payload, 'level': 'root'}, '全域')
-            futures.add(f)
-
-            last_print_time = time.time()
-
-            while futures:
-                current_count = len(self.global_jobs)
-                current_time = time.time()
-                
-                # 1. 達標檢查
-                if current_count >= self.target_num:
-                    self.abort_signal = True
-                    break
-
-                # ==========================================
-                # 2. 新增：10秒增加少於10筆 就停止 (智慧停損)
-                # ==========================================
-                # 修改 search 內的監控邏輯
-                # 將 monitor_timer 的判定放寬
-                if current_time - self.monitor_timer > 20: # 從 10 秒放寬到 20 秒
-                    growth = current_count - self.monitor_last_count
-                    # 只有在完全沒有新資料 (growth == 0) 且請求數已經很大時才考慮停止
-                    if growth == 0 and self.api_call_count > 100:
-                        print(f"\n{self.BLUE}[1111] 資料已達極限，停止抓取。{self.RESET}")
-                        self.abort_signal = True
-                        break
-                                
-                    # 重置計時器與計數器
-                    self.monitor_timer = current_time
-                    self.monitor_last_count = current_count
-                # ==========================================
-
-                # 3. 定時 Log (心跳包)
-                if current_time - last_print_time > 3:
-                    percent = (current_count / self.target_num) * 100
-                    print(f"\r{self.BLUE}[1111] 收集: {current_count}/{self.target_num} ({percent:.1f}%) | "
-                        f"重複: {self.duplicate_count} | 請求: {self.api_call_count} | "
-                        f"剩餘: {len(futures)} {self.RESET}", end="")
-                    last_print_time = current_time
-
-                # 等待任務
-                done, not_done = wait(futures, return_when=FIRST_COMPLETED, timeout=1)
-                
-                if not done and not not_done:
-                    break
-
-                for f in done:
-                    try:
-                        new_task_defs = f.result()
-                        if new_task_defs:
-                            for t in new_task_defs:
-                                if not self.abort_signal and len(self.global_jobs) < self.target_num:
-                                    new_f = executor.submit(self._process_task, t['type'], t['params'], t['label'])
-                                    not_done.add(new_f)
-                    except Exception:
-                        pass
-                
-                futures = not_done
-                if not futures: break
-
-            executor.shutdown(wait=True)
+            # 全域第 1 頁已經抓過：資料直接收下，總數也直接沿用，不再重複探測
+            self._add_jobs(jobs_p1, '全域')
+            root_task = {'type': 'check_split', 'params': {'payload': base_payload, 'level': 'root', 'total': total_count}, 'label': '全域'}
+            await self._run_task_queue([root_task], max_concurrency=max_concurrency)
             print() 
 
         # 強制截斷
         final_jobs = self.global_jobs[:max_num]
-        final_count = len(final_jobs)
+        final_count = min(self.collected, max_num)
+
+        # 覆蓋率：API 回報總數 / 各葉節點總數合計 / 翻頁上限內可取得的筆數 / 實際取得的筆數
+        self.coverage = dict(self.plan_stats, api_total=total_count, fetched=final_count, api_calls=self.api_call_count)
 
         print("-" * 30)
         print(f"{self.BLUE}[1111] 搜尋結束。共取得: {final_count} 筆 (過濾了 {self.duplicate_count} 筆重複){self.RESET}")
+        print(f"{self.BLUE}[1111] 覆蓋率: 可取得 {self.plan_stats['reachable']}/{total_count} | 分區 {self.plan_stats['leaves']} 個 "
+              f"(截斷 {self.plan_stats['truncated_leaves']}) | 探測 {self.plan_stats['probes']} 次，省略 {self.plan_stats['skipped_probes']} 次{self.RESET}")
         print("-" * 30)
 
         return final_count, final_jobs
 
+    def search_incremental(self, keyword, watermark=None, max_num=1000):
+        # 增量模式：回傳 (新職缺, 新水位線)；沒有水位線時先完整搜尋一次當基準
+        if watermark is None:
+            _, jobs = self.search(keyword, max_num)
+            return jobs, Watermark().advance(watermark_key(j) for j in jobs)
+
+        self.abort_signal = False
+        self.stop_check = None
+        self.api_call_count = 0
+        payload = self._base_payload(keyword)   # 已是依更新日期由新到舊排序
+        use_cache, self.use_cache = self.use_cache, False
+        try:
+            jobs, new_mark, pages = crawl_since(
+                lambda page: self._fetch_raw(page, SEARCH_API_URL, payload),
+                watermark_key, watermark, should_stop=self.stopped
+            )
+        finally:
+            self.use_cache = use_cache
+        jobs = [compact_job(j, '增量更新') for j in jobs]
+        print(f"{self.BLUE}[1111] 增量更新「{keyword}」: 翻了 {pages} 頁，新增 {len(jobs)} 筆{self.RESET}")
+        return jobs, new_mark
+
+    def search_async(self, keyword, max_num=5000, on_page=None, keep_jobs=True, should_stop=None):
+        # 在目前執行緒上跑一個事件迴圈來驅動 asyncio 排程器
+        return asyncio.run(self.asearch(keyword, max_num, on_page=on_page, keep_jobs=keep_jobs, should_stop=should_stop))
+
+    def stream_pages(self, keyword, max_num=5000, max_pages=STREAM_QUEUE_PAGES, should_stop=None):
+        # 逐頁產出 (Job1111Record 列表, 進度)；爬蟲只保留去重用的 id，不累積結果
+        # 消費端離開的中止也走 should_stop：搜尋還沒開始 (abort_signal 尚未重設) 就離開也不會被吃掉
+        consumer_left = []
+        def run(on_page):
+            return self.search_async(keyword, max_num, on_page=on_page, keep_jobs=False,
+                                     should_stop=lambda: bool(consumer_left) or bool(should_stop and should_stop()))
+        def stop():
+            consumer_left.append(True)
+            self.abort_signal = True
+        return PageStream(run, stop, max_pages)
+
+    def iter_search(self, keyword, max_num=5000, transform=False, max_pages=STREAM_QUEUE_PAGES):
+        # 逐筆產出職缺 (transform=True 時為轉換後的格式)；適合上萬筆的匯入，不必整批放在記憶體
+        for jobs, _ in self.stream_pages(keyword, max_num, max_pages):
+            yield from (self.transform_batch(jobs) if transform else jobs)
+
+    def search(self, keyword, max_num=5000, on_page=None):
+        # 同步介面：收集 stream_pages 的每一頁，on_page 在呼叫端執行緒上呼叫
+        # 回傳 (asearch 的筆數, 職缺)，與改成串流之前相同
+        stream = self.stream_pages(keyword, max_num)
+        all_jobs = []
+        for jobs, progress in stream:
+            all_jobs.extend(jobs)
+            if on_page: on_page(jobs, progress)
+        total, _ = stream.result or (0, [])
+        return total, all_jobs
+
+    def stopped(self):
+        # 自己的 abort_signal 或外部中止條件成立；外部條件成立時也設起 abort_signal，讓各處立即看到
+        if not self.abort_signal and self.stop_check and self.stop_check():
+            self.abort_signal = True
+        return self.abort_signal
+
     def search_job_transform(self, job_data):
-        job_id = str(job_data.get('jobId', ''))
-        job_url = f"https://www.1111.com.tw/job/{job_id}/" if job_id else ""
-        
-        location = ""
-        wc = job_data.get('workCity')
-        if isinstance(wc, list) and len(wc) > 0:
-            location = wc[0].get('name', '')
-        elif isinstance(wc, dict):
-            location = wc.get('name', '')
-
-        raw_date = str(job_data.get('updateAt', ''))
-        update_date = raw_date.split(" ")[0] if raw_date else ""
-        
-        salary_str = job_data.get('salary', '面議')
-        
-        job = {
-            'platform': '1111',
-            'search_range': job_data.get('search_range', '一般搜尋'), 
-            'update_date': update_date,
-            'name': job_data.get('title', ''),
-            'company_name': job_data.get('companyName', ''),
-            'salary': salary_str,
-            'job_url': job_url,
-            'location': location
-        }
-        return job
\ No newline at end of file
+        return transform_job(job_data)
+
+    def transform_batch(self, raw_jobs, use_processes=None):
+        # 整頁 (或整批) 一次轉換；超大批次會自動切塊交給行程池
+        return run_batch(transform_jobs, raw_jobs, use_processes)
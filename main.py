@@ -6,6 +6,10 @@ if __name__ == "__main__":
     
     try:
         from web_server import app
+        import chart_renderer
+        
+        # 先把繪圖行程開好 (只在主程式啟動時做，匯入 web_server 不會產生子行程)
+        chart_renderer.warm_up()
         
         # 等待0.5秒後自動打開瀏覽器
         def open_browser():
@@ -0,0 +1,58 @@
+import queue
+import threading
+
+# --- 逐頁串流的爬取結果 (有上限的佇列 = 背壓) ---
+# 爬蟲的 asyncio 引擎在背景執行緒執行，每收到一頁就透過 on_page 放進有上限的佇列；
+# 消費端跟不上、佇列滿了時 on_page 會阻塞事件迴圈，所有抓取都會暫停，記憶體只保留佇列內的幾頁。
+# 消費端提早離開 (break / close) 時呼叫 stop() 讓爬蟲中止。
+
+STREAM_QUEUE_PAGES = 8     # 佇列最多暫存幾頁
+STOP_TIMEOUT = 10          # 消費端離開後最多等背景爬取收尾幾秒
+
+_DONE = object()
+
+class PageStream():
+    def __init__(self, run, stop, max_pages=STREAM_QUEUE_PAGES):
+        # run(on_page) 執行完整爬取並回傳結果；stop() 通知爬蟲中止
+        self.run = run
+        self.stop = stop
+        self.queue = queue.Queue(maxsize=max(1, max_pages))
+        self.closed = threading.Event()
+        self.result = None         # run 的回傳值 (迭代結束後才有)
+        self.error = None
+
+    def _put(self, item):
+        # 佇列滿就等；消費端已離開時直接丟棄，讓爬蟲盡快結束
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                pass
+
+    def _worker(self):
+        try:
+            self.result = self.run(lambda jobs, progress: self._put((jobs, progress)))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(_DONE)
+
+    def __iter__(self):
+        # 產出 (該頁職缺, 進度)
+        thread = threading.Thread(target=self._worker, daemon=True)
+        thread.start()
+        finished = False
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE: break
+                yield item
+            finished = True
+        finally:
+            if not finished:
+                self.stop()
+            self.closed.set()
+            thread.join(STOP_TIMEOUT)
+        if self.error is not None:
+            raise self.error
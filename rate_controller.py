@@ -0,0 +1,102 @@
+import time
+import random
+import asyncio
+import threading
+
+# --- 各平台共用的自適應速率控制器 (Token Bucket + AIMD) ---
+# 一個平台在整個行程內只有一個實例，所有 spider (不論是 /api/search 或 /api/compare_jobs 建立的)
+# 都向同一個 bucket 取 token，所以學到的速率不會因為建立新 spider 而重來。
+
+# 各平台初始參數：起始速率 / 上下限 (req/s)、被限流後的冷卻秒數
+PLATFORM_DEFAULTS = {
+    '104':  {'rate': 4.0, 'min_rate': 0.2, 'max_rate': 15.0, 'burst': 4, 'cooldown': 20},
+    '1111': {'rate': 6.0, 'min_rate': 0.5, 'max_rate': 20.0, 'burst': 6, 'cooldown': 5},
+}
+
+class RateController():
+    def __init__(self, name, rate=4.0, min_rate=0.2, max_rate=15.0, burst=4, cooldown=5,
+                 increase_step=0.1, decrease_factor=0.5, jitter=0.2):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.cooldown = cooldown
+        self.increase_step = increase_step      # 每次 200 成功增加的速率 (加法)
+        self.decrease_factor = decrease_factor  # 遇到 429/403 時的速率倍率 (乘法)
+        self.jitter = jitter                    # 等待時間的隨機擾動，避免請求整齊同步
+
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+        # 統計
+        self.success_count = 0
+        self.throttled_count = 0
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.last_refill = now
+
+    def try_acquire(self):
+        # 拿到 token 回傳 0，否則回傳需要再等待的秒數 (不預約，醒來後重新競爭，才能反映期間的速率變化)
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            wait = (1 - self.tokens) / self.rate
+        return wait * (1 + random.uniform(0, self.jitter))
+
+    def acquire(self, should_abort=None):
+        # 同步版本：有中止條件時以 0.1 秒為單位等待，讓 abort_signal 可以即時生效
+        while True:
+            if should_abort and should_abort(): return False
+            wait = self.try_acquire()
+            if wait <= 0: return True
+            time.sleep(min(wait, 0.1) if should_abort else wait)
+
+    async def aacquire(self):
+        # asyncio 版本：等待期間不佔用執行緒，被 cancel 時立即結束
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0: return True
+            await asyncio.sleep(wait)
+
+    def record(self, status_code):
+        with self.lock:
+            if status_code == 200:
+                # 加法增加：持續成功就慢慢加速
+                self.success_count += 1
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+            elif status_code in (429, 403):
+                # 乘法減少：被限流立刻砍半，並讓整個平台冷卻一段時間
+                self.throttled_count += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.tokens = 0
+                self.blocked_until = max(self.blocked_until, time.monotonic() + self.cooldown)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'platform': self.name,
+                'rate': round(self.rate, 2),
+                'success': self.success_count,
+                'throttled': self.throttled_count,
+                'cooling_down': time.monotonic() < self.blocked_until,
+            }
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_rate_controller(platform):
+    with _controllers_lock:
+        if platform not in _controllers:
+            _controllers[platform] = RateController(platform, **PLATFORM_DEFAULTS.get(platform, {}))
+        return _controllers[platform]
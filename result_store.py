@@ -0,0 +1,96 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# --- 伺服器端搜尋結果暫存 ---
+# 搜尋完成後把結果 (DataFrame + 統計 + 圖表) 存在記憶體，回傳 result_id 給前端；
+# 之後的篩選 / 匯出 / 存檔只要帶 result_id，不必再把整包職缺 POST 回來重新解析。
+# 以 LRU 淘汰，並同時限制筆數、總記憶體與存活時間。
+
+MAX_RESULTS = 32
+MAX_BYTES = 256 * 1024 * 1024   # 所有結果合計的記憶體上限
+RESULT_TTL = 1800               # 秒，超過沒有被使用就淘汰
+
+class ResultStore():
+    def __init__(self, max_results=MAX_RESULTS, max_bytes=MAX_BYTES, ttl=RESULT_TTL):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()   # result_id -> entry dict
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _measure(self, df, charts):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        for img in (charts or {}).values():
+            size += len(img or '')
+        return size
+
+    def _drop(self, result_id):
+        entry = self.entries.pop(result_id)
+        self.total_bytes -= entry['nbytes']
+        self.evictions += 1
+
+    def _evict(self, now):
+        for result_id in [k for k, e in self.entries.items() if now - e['last_access'] > self.ttl]:
+            self._drop(result_id)
+        # 最久沒用的先淘汰，但至少保留最新的一筆
+        while len(self.entries) > 1 and (len(self.entries) > self.max_results or self.total_bytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+
+    def put(self, keyword, df, stats=None, charts=None):
+        result_id = uuid.uuid4().hex
+        now = time.time()
+        entry = {
+            'result_id': result_id,
+            'keyword': keyword,
+            'df': df,
+            'stats': stats,
+            'charts': charts,
+            'created': now,
+            'last_access': now,
+            'nbytes': self._measure(df, charts),
+        }
+        with self.lock:
+            self.entries[result_id] = entry
+            self.total_bytes += entry['nbytes']
+            self._evict(now)
+        return result_id
+
+    def get(self, result_id):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(result_id)
+            if entry is None or now - entry['last_access'] > self.ttl:
+                if entry is not None: self._drop(result_id)
+                self.misses += 1
+                return None
+            entry['last_access'] = now
+            self.entries.move_to_end(result_id)
+            self.hits += 1
+            return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                'results': len(self.entries),
+                'total_mb': round(self.total_bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_result_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
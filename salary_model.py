@@ -0,0 +1,154 @@
+import re
+import numpy as np
+import pandas as pd
+
+# --- 結構化薪資模型 ---
+# 在 search_job_transform 時就算好：薪資類型、最低、最高、換算月薪，
+# 之後篩選 / 排序 / 畫圖都直接用數字欄位，不必每次再用正則解析字串。
+
+SALARY_FIELDS = ['salary_type', 'salary_min', 'salary_max', 'salary_monthly']
+
+# 薪資類型 → 換算月薪的倍數 (時薪沿用網頁端原本的 160 小時；論件計酬、面議無法換算)
+MONTHLY_FACTOR = {
+    '月薪': 1,
+    '部分工時': 1,
+    '時薪': 160,
+    '日薪': 22,
+    '年薪': 1 / 12,
+}
+
+# 104 的 salaryHigh 用 9999999 表示「以上」
+OPEN_ENDED = 9999999
+
+# 文字判斷薪資類型的關鍵字 (面議優先，其次是明確的計薪單位，最後才是月薪)
+TYPE_KEYWORDS = [
+    ('面議', '面議'),
+    ('時薪', '時薪'),
+    ('日薪', '日薪'),
+    ('年薪', '年薪'),
+    ('論件', '論件計酬'),
+    ('承攬', '論件計酬'),
+    ('部分工時', '部分工時'),
+    ('月薪', '月薪'),
+]
+
+# 一個金額：35000、3.5萬、3萬5千、35千 (5 個群組：數字、萬、萬之後的數字、該數字的千、千)
+AMOUNT = r'(\d+(?:\.\d+)?)(?:\s*(萬)(?:\s*(\d+(?:\.\d+)?)\s*(千))?|\s*(千))?'
+AMOUNT_GROUPS = 5
+NUM_PATTERN = re.compile(AMOUNT)
+# 向量化版本一次取出前兩個金額 (與 findall 相同：單位後面可以直接接下一個金額，例如「3萬4萬」)
+TWO_NUM_PATTERN = AMOUNT + r'(?:\D*?' + AMOUNT + r')?'
+
+def amount_value(value, wan, sub, sub_qian, qian):
+    # NUM_PATTERN 一個匹配的五個群組 → 金額
+    n = float(value)
+    if wan: return n * 10000 + (float(sub) * 1000 if sub else 0)
+    if qian: return n * 1000
+    return n
+
+def amount_series(found, start):
+    # amount_value 的向量化版本：found 為 str.extract 的結果，start 為第一個群組的欄位位置
+    value, wan, sub, sub_qian, qian = (found[start + i] for i in range(AMOUNT_GROUPS))
+    n = value.astype(float)
+    sub = sub.astype(float).fillna(0) * 1000
+    return (n * 10000 + sub).where(wan.notna(), n.where(qian.isna(), n * 1000))
+
+def build_salary_fields(pay_type, low=None, high=None):
+    # 先取整數再判斷 (0.5 之類的金額視為沒有值，與向量化版本一致)
+    low = int(low) if low and int(low) > 0 else None
+    high = int(high) if high and 0 < int(high) < OPEN_ENDED else None
+    if low and high and high < low:
+        low, high = high, low
+
+    monthly = 0
+    factor = MONTHLY_FACTOR.get(pay_type)
+    if factor and (low or high):
+        base = (low + high) / 2 if (low and high) else (low or high)
+        monthly = int(round(base * factor))
+
+    return {
+        'salary_type': pay_type,
+        'salary_min': low,
+        'salary_max': high,
+        'salary_monthly': monthly,
+    }
+
+def parse_salary_text(salary_str):
+    # 給只有文字描述的來源 (1111、舊的歷史資料) 使用，每筆只在進來時解析一次
+    text = str(salary_str or '').replace(',', '')
+
+    pay_type = ''
+    for keyword, t in TYPE_KEYWORDS:
+        if keyword in text:
+            pay_type = t
+            break
+
+    nums = []
+    for groups in NUM_PATTERN.findall(text):
+        n = amount_value(*groups)
+        if n > 0: nums.append(n)
+
+    if pay_type == '面議' or not nums:
+        # 面議可能附帶「經常性薪資 4 萬以上」，保留最低值但不列入月薪統計
+        fields = build_salary_fields(pay_type or '面議', nums[0] if nums else None, None)
+        fields['salary_monthly'] = 0
+        return fields
+
+    # 沒有寫明單位時，依金額大小推測 (與原本網頁端的判斷方式一致)
+    if not pay_type:
+        avg = sum(nums[:2]) / len(nums[:2])
+        if avg < 1000: pay_type = '時薪'
+        elif avg > 300000: pay_type = '年薪'
+        else: pay_type = '月薪'
+
+    low = nums[0]
+    high = nums[1] if len(nums) >= 2 else None
+    return build_salary_fields(pay_type, low, high)
+
+def parse_salary_series(salaries):
+    # parse_salary_text 的向量化版本：整欄一次處理，結果與逐筆解析相同
+    text = salaries.fillna('').astype(str).str.replace(',', '', regex=False)
+
+    conditions = [text.str.contains(keyword, regex=False) for keyword, _ in TYPE_KEYWORDS]
+    pay_type = pd.Series(np.select(conditions, [t for _, t in TYPE_KEYWORDS], default=''), index=text.index, dtype=object)
+
+    # 一次取出每列的前兩個金額 (含「萬」、「千」單位換算)
+    found = text.str.extract(TWO_NUM_PATTERN)
+    first = amount_series(found, 0)
+    second = amount_series(found, AMOUNT_GROUPS)
+
+    negotiable = (pay_type == '面議') | first.isna()
+    pay_type = pay_type.mask(negotiable & (pay_type == ''), '面議')
+
+    # 沒有寫明單位時，依金額大小推測
+    avg = ((first + second) / 2).fillna(first)
+    inferred = pd.Series(np.select([avg < 1000, avg > 300000], ['時薪', '年薪'], default='月薪'), index=text.index)
+    pay_type = pay_type.mask(pay_type == '', inferred)
+
+    low = np.trunc(first)
+    low = low.where(low > 0)
+    high = np.trunc(second).where(~negotiable)
+    high = high.where((high > 0) & (high < OPEN_ENDED))
+    swap = low.notna() & high.notna() & (high < low)
+    low, high = low.mask(swap, high), high.mask(swap, low)
+
+    base = ((low + high) / 2).fillna(low).fillna(high)
+    factor = pay_type.map(MONTHLY_FACTOR).astype(float)
+    monthly = np.round(base * factor).fillna(0).where(~negotiable, 0).astype(int)
+
+    result = pd.DataFrame({
+        'salary_type': pay_type,
+        'salary_min': low,
+        'salary_max': high,
+        'salary_monthly': monthly,
+    }, index=text.index)
+
+    # 少數含有 0 的字串 (例如「月薪 0 元」) 需要跳過 0 往後找數字，改回逐筆解析
+    odd = (first <= 0) | (second <= 0)
+    if odd.any():
+        fixed = pd.DataFrame([parse_salary_text(x) for x in salaries[odd]], index=text.index[odd])
+        # 逐欄寫回：None 轉成 NaN，數字欄位才不會被塞進 object 陣列
+        result.loc[odd, 'salary_type'] = fixed['salary_type']
+        for col in SALARY_FIELDS[1:]:
+            result.loc[odd, col] = pd.to_numeric(fixed[col]).astype(result[col].dtype)
+    return result
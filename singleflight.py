@@ -0,0 +1,160 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 相同搜尋的請求合併 (single-flight) ---
+# 同一個關鍵字同時被多個使用者 (或多個分頁) 搜尋時只跑一次爬取：
+# 後來的請求只要要求的筆數不超過進行中的爬取，就直接掛上去共用同一份結果 (筆數較少的取前段)。
+# 每個等待者離開時計數減一，全部離開才真正中止爬蟲 (爬蟲定期呼叫 Flight.should_stop 自行中止，不改寫爬蟲的旗標)。
+# 搜尋 API 沒有篩選條件，因此合併鍵 = 正規化後的關鍵字，再依 max_num 判斷能否共用。
+
+MAX_FLIGHTS = 8    # 同時進行中的爬取上限 (執行緒數)
+
+def flight_key(keyword):
+    return ' '.join(str(keyword).split()).lower()
+
+class Flight():
+    def __init__(self, key, keyword, max_num):
+        self.key = key
+        self.keyword = keyword
+        self.max_num = max_num
+        self.events = []           # 依序發布的串流事件，後加入的等待者從頭重播
+        self.result = None         # 平台 -> 轉換後的職缺 (完成後才有)
+        self.error = None
+        self.finished = False
+        self.cancelled = False
+        self.waiters = 0
+        self.outputs = {}          # max_num -> 呼叫端算好的輸出 (相同筆數的等待者共用)
+        self.building = set()      # 正在計算輸出的 max_num (計算在鎖外進行)
+        self.progress = {}         # 平台 -> 爬蟲回報的最新進度
+        self.coverage = {}
+        self.started = time.time()
+        self.cond = threading.Condition()
+
+    def should_stop(self):
+        # 交給爬蟲的中止條件：爬蟲開始搜尋時會重設自己的 abort_signal，但不會重設這裡的狀態，
+        # 因此在爬蟲開始前 (或兩頁之間) 發生的取消也不會遺失
+        return self.cancelled
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            if event.get('progress'): self.progress[event['platform']] = event['progress']
+            self.cond.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.finished = True
+            self.cond.notify_all()
+
+    def wait(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.finished, timeout)
+
+    def follow(self, start, timeout=1.0):
+        # 回傳 (start 之後的新事件, 是否已完成)；沒有新事件時最多等 timeout 秒
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.events) > start or self.finished, timeout)
+            return self.events[start:], self.finished
+
+    def progress_snapshot(self):
+        with self.cond:
+            return {platform: dict(p) for platform, p in self.progress.items()}
+
+    def prefix(self, max_num):
+        # 每個平台取前 max_num 筆 (與單獨搜尋 max_num 筆時各平台的上限一致)
+        return {platform: jobs[:max_num] for platform, jobs in (self.result or {}).items()}
+
+    def output(self, max_num, build):
+        # build() 只會對每個 max_num 執行一次 (例如統計、圖表、result_id)
+        # 計算很慢 (畫圖、寫入結果暫存)，在鎖外執行：只標記「計算中」，相同筆數的等待者等結果，其他 publish / 等待者不受影響
+        with self.cond:
+            self.cond.wait_for(lambda: max_num not in self.building)
+            if max_num in self.outputs: return self.outputs[max_num]
+            self.building.add(max_num)
+
+        built = False
+        try:
+            output = build()
+            built = True
+        finally:
+            with self.cond:
+                self.building.discard(max_num)
+                # build() 失敗時不留結果，下一個等待者會重新計算
+                if built: self.outputs[max_num] = output
+                self.cond.notify_all()
+        return output
+
+class SingleFlight():
+    def __init__(self, max_workers=MAX_FLIGHTS):
+        self.flights = {}          # key -> [進行中的 Flight]
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search-flight')
+
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def join(self, keyword, max_num, runner):
+        # 回傳可共用的 Flight (等待者計數已加一)；沒有時用 runner(flight) 在背景啟動新的爬取
+        key = flight_key(keyword)
+        with self.lock:
+            for flight in self.flights.get(key, []):
+                with flight.cond:
+                    if not flight.finished and not flight.cancelled and flight.max_num >= max_num:
+                        flight.waiters += 1
+                        self.joined += 1
+                        return flight
+
+            flight = Flight(key, keyword, max_num)
+            flight.waiters = 1
+            self.flights.setdefault(key, []).append(flight)
+            self.started += 1
+        self.executor.submit(self._run, flight, runner)
+        return flight
+
+    def _run(self, flight, runner):
+        try:
+            flight.finish(result=runner(flight))
+        except Exception as e:
+            print(f"Search Flight Error: {flight.keyword} {e}")
+            flight.finish(error=e)
+        finally:
+            self._remove(flight)
+
+    def _remove(self, flight):
+        with self.lock:
+            flights = self.flights.get(flight.key, [])
+            if flight in flights: flights.remove(flight)
+            if not flights: self.flights.pop(flight.key, None)
+
+    def leave(self, flight):
+        # 最後一個等待者離開且爬取還沒結束 → 中止爬蟲，之後的請求不會再掛上這個 Flight
+        with flight.cond:
+            flight.waiters -= 1
+            if flight.waiters > 0 or flight.finished: return
+            flight.cancelled = True
+        with self.lock:
+            self.cancelled += 1
+        self._remove(flight)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': sum(len(v) for v in self.flights.values()),
+                'started': self.started,
+                'joined': self.joined,
+                'cancelled': self.cancelled,
+            }
+
+_searches = None
+_searches_lock = threading.Lock()
+
+def get_search_flights():
+    global _searches
+    with _searches_lock:
+        if _searches is None:
+            _searches = SingleFlight()
+        return _searches
@@ -4,12 +4,14 @@
 let currentJobsData = [];   // ★ 原始完整資料
 let filteredJobsData = [];  // ★ 目前篩選後的資料
 let currentKeyword = '';
+let currentResultId = null; // ★ 伺服器端暫存結果的 id (篩選 / 匯出 / 存檔用)
 let isComparing = false;    // 全域鎖
 
 // --- 全域變數 (歷史紀錄用) --- NEW ★
 let historyJobsData = [];      // 歷史紀錄的原始資料
 let filteredHistoryJobs = [];  // 歷史紀錄的篩選後資料
 let currentHistoryKeyword = ''; // 歷史紀錄的關鍵字
+let currentHistoryResultId = null; // 歷史紀錄在伺服器端的暫存 id
 
 // --- 分頁相關變數 ---
 let currentPage = 1; //首頁的
@@ -38,29 +40,69 @@ async function startAnalysis(e) {
     resultsArea.classList.remove('visible'); 
     currentKeyword = keyword;
 
+    // ★ 串流狀態重置
+    currentJobsData = [];
+    filteredJobsData = [];
+    currentResultId = null;
+    currentPage = 1;
+    const streamJobs = { '104': [], '1111': [] };
+    let finished = false;
+
     try {
-        const response = await fetch('/api/search', {
+        const response = await fetch('/api/search_stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ keyword: keyword, max_num: maxNum })
         });
-        const data = await response.json();
-
-        if (data.status === 'success') {
-            // ★ 資料重置
-            currentJobsData = data.jobs;   // 保存原始檔
-            filteredJobsData = data.jobs;  // 初始篩選檔 = 原始檔
-            currentPage = 1;               // 重置頁碼
-
-            // 【新增這行】自動存入伺服器紀錄，並傳入 true 表示不彈出視窗
-            console.log("正在自動備份至歷史紀錄...");
-            saveToHistoryServer(true);
-            
-            updateUI(data); 
-            resultsArea.classList.add('visible'); 
-        } else {
-            alert('搜尋失敗: ' + data.message);
+        if (!response.ok || !response.body) throw new Error('串流連線失敗');
+
+        // 逐行解析 NDJSON 事件
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let newlineIdx;
+            while ((newlineIdx = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newlineIdx).trim();
+                buffer = buffer.slice(newlineIdx + 1);
+                if (!line) continue;
+                const event = JSON.parse(line);
+
+                if (event.type === 'jobs') {
+                    streamJobs[event.platform].push(...event.jobs);
+                    // 第一批資料到達就先顯示結果區
+                    if (!resultsArea.classList.contains('visible')) resultsArea.classList.add('visible');
+                    handleStreamBatch(streamJobs, event);
+                } else if (event.type === 'progress') {
+                    updateStreamProgress(streamJobs, event);
+                } else if (event.type === 'done') {
+                    finished = true;
+                    clearTimeout(streamRenderTimer);
+                    streamRenderTimer = null;
+                    // ★ 最終資料：與非串流版本相同的順序 (先 104 再 1111)
+                    currentJobsData = streamJobs['104'].concat(streamJobs['1111']);
+                    filteredJobsData = currentJobsData;
+                    currentResultId = event.result_id || null;
+                    currentPage = 1;
+
+                    // 【新增這行】自動存入伺服器紀錄，並傳入 true 表示不彈出視窗
+                    console.log("正在自動備份至歷史紀錄...");
+                    saveToHistoryServer(true);
+
+                    updateUI({ stats: event.stats, charts: event.charts, jobs: currentJobsData });
+                    resultsArea.classList.add('visible');
+                } else if (event.type === 'error') {
+                    finished = true;
+                    alert('搜尋失敗: ' + event.message);
+                }
+            }
         }
+        if (!finished) alert('搜尋中斷，僅顯示部分結果');
     } catch (error) {
         console.error('Error:', error);
         alert('系統錯誤，請檢查後端是否執行中');
@@ -71,9 +113,41 @@ async function startAnalysis(e) {
     }
 }
 
+// 串流中：更新即時數字，並節流重繪列表 (最多每 500ms 一次)
+let streamRenderTimer = null;
+function handleStreamBatch(streamJobs, event) {
+    currentJobsData = streamJobs['104'].concat(streamJobs['1111']);
+    updateStreamProgress(streamJobs, event);
+
+    if (streamRenderTimer) return;
+    streamRenderTimer = setTimeout(() => {
+        streamRenderTimer = null;
+        applyFilters();
+    }, 500);
+}
+
+function updateStreamProgress(streamJobs, event) {
+    const count104 = streamJobs['104'].length;
+    const count1111 = streamJobs['1111'].length;
+    document.getElementById('stat-total').innerText = count104 + count1111;
+    document.getElementById('count_104').innerText = count104;
+    document.getElementById('count_1111').innerText = count1111;
+
+    const p = event.progress || {};
+    const btn = document.getElementById('btn-search');
+    if (event.platform === '1111') {
+        btn.innerText = `1111 已收 ${p.collected || 0} 筆 | 重複 ${p.duplicates || 0} | 請求 ${p.api_calls || 0}`;
+    } else {
+        btn.innerText = `104 已抓 ${p.pages || 0} 頁 (${p.collected || 0} 筆)`;
+    }
+}
+
 function updateUI(data) {
     // 更新統計數字
     document.getElementById('stat-total').innerText = data.stats.total;
+    // 跨平台重複刊登的職缺只算一次 (舊的歷史紀錄沒有這個欄位)
+    document.getElementById('stat-unique').innerText = data.stats.unique_total !== undefined
+        ? `不重複 ${data.stats.unique_total} 筆` : '已分析職缺';
     document.getElementById('stat-salary').innerText = Math.round(data.stats.avg_salary).toLocaleString();
     document.getElementById('count_104').innerText = data.stats.count_104;
     document.getElementById('count_1111').innerText = data.stats.count_1111;
@@ -188,6 +262,47 @@ function parseSalaryRange(salaryStr) {
     return { low: 0, high: 0 };
 }
 
+// ★ 取得薪資範圍：優先使用後端算好的結構化欄位，舊資料才解析文字
+function getSalaryRange(job) {
+    if (job.salary_type) {
+        const low = job.salary_min || 0;
+        const high = job.salary_max || low;
+        return { low: low, high: high };
+    }
+    return parseSalaryRange(job.salary);
+}
+
+// ★ 目前畫面上的篩選條件 (傳給後端，讓匯出結果與畫面一致)；prefix 為 '' (主搜尋) 或 'h-' (歷史紀錄)
+function getFilterParams(prefix = '') {
+    const el = id => document.getElementById(prefix + id);
+    const minInput = el('min-salary-input');
+    const maxInput = el('max-salary-input');
+    return {
+        city: el('filter-city') ? el('filter-city').value : 'all',
+        show_104: el('cb-104') ? el('cb-104').checked : true,
+        show_1111: el('cb-1111') ? el('cb-1111').checked : true,
+        salary_type: el('salary-type') ? el('salary-type').value : 'all',
+        salary_min: (minInput && minInput.value) ? parseInt(minInput.value) : 0,
+        salary_max: (maxInput && maxInput.value) ? parseInt(maxInput.value) : 0,
+        sort_by: el('sort-by') ? el('sort-by').value : ''
+    };
+}
+
+// ★ 匯出 / 存檔的請求內容：有 result_id 就只送 id 與篩選條件，否則退回送出整包資料
+async function postJobsRequest(url, dataToExport, extra, resultId, filters) {
+    const post = body => fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(Object.assign(body, extra))
+    });
+    if (resultId) {
+        const response = await post({ result_id: resultId, filters: filters });
+        // 410：伺服器端暫存已過期，改送完整資料
+        if (response.status !== 410) return response;
+    }
+    return post({ jobs: dataToExport });
+}
+
 // 核心篩選函式 (主搜尋用)
 function applyFilters() {
     const citySelect = document.getElementById('filter-city');
@@ -240,7 +355,7 @@ function checkJobFilter(job, city, s104, s1111, sType, sMin, sMax) {
     // (D) 薪資數字
     if (sType !== '面議' && sType !== '論件') {
         if (sMin > 0 || sMax > 0) {
-            const { low, high } = parseSalaryRange(job.salary);
+            const { low, high } = getSalaryRange(job);
             if (low === 0 && high === 0) return false;
             if (sMin > 0 && low < sMin) return false;
             if (sMax > 0 && high > sMax) return false;
@@ -252,8 +367,8 @@ function checkJobFilter(job, city, s104, s1111, sType, sMin, sMax) {
 // 抽離出共用的排序邏輯
 function sortJobs(jobsArray, sortBy) {
     jobsArray.sort((a, b) => {
-        const valA = parseSalaryRange(a.salary).low;
-        const valB = parseSalaryRange(b.salary).low;
+        const valA = getSalaryRange(a).low;
+        const valB = getSalaryRange(b).low;
 
         if (sortBy === 'salary_desc') return valB - valA;
         if (sortBy === 'salary_asc') return valA - valB;
@@ -348,11 +463,11 @@ function createJobCard(job) {
 // 3. 匯出功能區
 // =========================================================
 
-function exportCSV() { _exportCSV(currentJobsData, "full_jobs"); } 
-function exportFilteredCSV() { _exportCSV(filteredJobsData, "filtered_jobs"); }
+function exportCSV() { _exportCSV(currentJobsData, "full_jobs", null, currentResultId); } 
+function exportFilteredCSV() { _exportCSV(filteredJobsData, "filtered_jobs", null, currentResultId, getFilterParams()); }
 
 // 通用的 CSV 匯出邏輯 (支援歷史紀錄)
-async function _exportCSV(dataToExport, suffix, keywordOverride) {
+async function _exportCSV(dataToExport, suffix, keywordOverride, resultId, filters) {
     if (!dataToExport || dataToExport.length === 0) { alert('沒有資料可匯出'); return; }
     
     const finalKeyword = keywordOverride || currentKeyword;
@@ -361,15 +476,8 @@ async function _exportCSV(dataToExport, suffix, keywordOverride) {
     let filenameSuffix = suffix;
     
     try {
-        const response = await fetch('/api/export_csv', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ 
-                jobs: dataToExport, 
-                keyword: finalKeyword, 
-                min_salary: '' 
-            })
-        });
+        const response = await postJobsRequest('/api/export_csv', dataToExport,
+            { keyword: finalKeyword, min_salary: '' }, resultId, filters);
         
         if (response.ok) {
             const blob = await response.blob();
@@ -385,21 +493,14 @@ async function _exportCSV(dataToExport, suffix, keywordOverride) {
     } catch(e) { console.error(e); alert("匯出過程發生錯誤"); }
 }
 
-async function _downloadDB(dataToExport, suffix, keywordOverride) {
+async function _downloadDB(dataToExport, suffix, keywordOverride, resultId, filters) {
     if (!dataToExport || dataToExport.length === 0) { alert('沒有資料可匯出'); return; }
     
     const finalKeyword = keywordOverride || currentKeyword;
     
     try {
-        const response = await fetch('/api/export_db', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ 
-                jobs: dataToExport, 
-                keyword: finalKeyword, 
-                min_salary: ''
-            })
-        });
+        const response = await postJobsRequest('/api/export_db', dataToExport,
+            { keyword: finalKeyword, min_salary: '' }, resultId, filters);
 
         if (response.ok) {
             const blob = await response.blob();
@@ -420,10 +521,10 @@ async function _downloadDB(dataToExport, suffix, keywordOverride) {
 }
 
 // 主搜尋的匯出
-function exportAllCSV() { _exportCSV(currentJobsData, "full_jobs"); }
-function exportFilteredCSV() { _exportCSV(filteredJobsData, "filtered_jobs"); }
-function saveAllToDB() { _downloadDB(currentJobsData, "full_jobs"); }
-function saveFilteredToDB() { _downloadDB(filteredJobsData, "filtered_jobs"); }
+function exportAllCSV() { _exportCSV(currentJobsData, "full_jobs", null, currentResultId); }
+function exportFilteredCSV() { _exportCSV(filteredJobsData, "filtered_jobs", null, currentResultId, getFilterParams()); }
+function saveAllToDB() { _downloadDB(currentJobsData, "full_jobs", null, currentResultId); }
+function saveFilteredToDB() { _downloadDB(filteredJobsData, "filtered_jobs", null, currentResultId, getFilterParams()); }
 
 // =========================================================
 // 4. 多職缺比較功能區
@@ -554,6 +655,7 @@ async function loadHistoryItem(batchId, keyword, time) {
             historyJobsData = data.jobs;
             filteredHistoryJobs = data.jobs;
             currentHistoryKeyword = keyword;
+            currentHistoryResultId = data.result_id || null;
             currentHistoryPage = 1; // ★ 重置歷史頁碼
 
             renderHistoryView(data, keyword, time);
@@ -672,14 +774,8 @@ async function saveToHistoryServer() {
     const keyword = document.getElementById('keyword').value || currentKeyword || '未命名';
 
     try {
-        const response = await fetch('/api/save_history', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ 
-                jobs: currentJobsData, 
-                keyword: keyword 
-            })
-        });
+        const response = await postJobsRequest('/api/save_history', currentJobsData,
+            { keyword: keyword }, currentResultId, null);
         const result = await response.json();
         // 2. 移除成功/失敗的 alert：改用 console 記錄結果
         if (result.status === 'success') {
@@ -803,6 +899,7 @@ async function loadHistoryItem(batchId, keyword, time) {
             historyJobsData = data.jobs;
             filteredHistoryJobs = data.jobs;
             currentHistoryKeyword = keyword;
+            currentHistoryResultId = data.result_id || null;
 
             renderHistoryView(data, keyword, time);
         } else {
@@ -821,6 +918,7 @@ function backToHistoryList() {
     document.getElementById('history-list-view').style.display = 'block';
     historyJobsData = [];
     filteredHistoryJobs = [];
+    currentHistoryResultId = null;
 }
 
 // 渲染歷史詳細畫面
@@ -832,13 +930,15 @@ function renderHistoryView(data, keyword, time) {
     document.getElementById('h-count-104').innerText = data.stats.count_104;
     document.getElementById('h-count-1111').innerText = data.stats.count_1111;
 
-    if (data.charts.salary_dist) {
+    // 歷史圖表改由 /charts/<hash>.png 提供 (瀏覽器會快取)
+    const chartUrls = data.chart_urls || {};
+    if (chartUrls.salary_dist) {
         document.getElementById('h-chart-salary').innerHTML = 
-            `<img src="data:image/png;base64,${data.charts.salary_dist}" style="width:100%; border-radius:8px;">`;
+            `<img src="${chartUrls.salary_dist}" style="width:100%; border-radius:8px;">`;
     }
-    if (data.charts.location_pie) {
+    if (chartUrls.location_pie) {
         document.getElementById('h-chart-location').innerHTML = 
-            `<img src="data:image/png;base64,${data.charts.location_pie}" style="width:100%; border-radius:8px;">`;
+            `<img src="${chartUrls.location_pie}" style="width:100%; border-radius:8px;">`;
     }
 
     // 初始化歷史區地區選單
@@ -870,8 +970,8 @@ function toggleHistorySalaryInputs() {
 
 
 // 歷史紀錄匯出功能
-function exportHistoryCSV() { _exportCSV(filteredHistoryJobs, "history_filtered", currentHistoryKeyword); }
-function downloadHistoryDB() { _downloadDB(filteredHistoryJobs, "history_filtered", currentHistoryKeyword); }
+function exportHistoryCSV() { _exportCSV(filteredHistoryJobs, "history_filtered", currentHistoryKeyword, currentHistoryResultId, getFilterParams('h-')); }
+function downloadHistoryDB() { _downloadDB(filteredHistoryJobs, "history_filtered", currentHistoryKeyword, currentHistoryResultId, getFilterParams('h-')); }
 
 // =========================================================
 // 6. 初始化 (更新監聽事件)
@@ -0,0 +1,98 @@
+import time
+import queue
+import pytest
+import http_cache
+import history_db
+import rate_controller
+
+# 測試共用的設定：所有資料庫 / 資料湖檔案都寫到暫存目錄，爬蟲改用假的 session (不連網)
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    # 相對路徑的 http_cache.db、history_jobs.db、job_lake/ 都落在暫存目錄；全域的快取與連線池每個測試重建
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(http_cache, '_cache', None)
+    monkeypatch.setattr(history_db, '_pool', None)
+    yield tmp_path
+    # 關掉這個測試開過的歷史資料庫連線
+    pool = history_db._pool
+    while pool is not None:
+        try:
+            pool.idle.get_nowait().close()
+        except queue.Empty:
+            break
+
+@pytest.fixture(autouse=True)
+def fast_rate(monkeypatch):
+    # 速率控制器不限速，假 session 的請求不必等待 token
+    monkeypatch.setattr(rate_controller, '_controllers', {})
+    for platform in rate_controller.PLATFORM_DEFAULTS:
+        monkeypatch.setitem(rate_controller.PLATFORM_DEFAULTS, platform,
+                            {'rate': 1000.0, 'min_rate': 1.0, 'max_rate': 1000.0, 'burst': 100, 'cooldown': 0})
+
+class FakeResponse():
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+class Fake104Session():
+    # 104 搜尋 API：每頁 20 筆，職缺依頁碼編號；pages 限制實際有資料的頁數
+    headers = {}
+
+    def __init__(self, total=200, delay=0.0):
+        self.total = total
+        self.delay = delay
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls += 1
+        if self.delay: time.sleep(self.delay)
+        page = int(params['page'])
+        count = max(0, min(20, self.total - (page - 1) * 20))
+        jobs = [{
+            'jobName': f'職缺{page}-{i}', 'custName': '甲乙科技', 's10': '50',
+            'salaryLow': 40000, 'salaryHigh': 50000, 'appearDate': '20240101',
+            'link': {'job': f'https://www.104.com.tw/job/{page}-{i}'}, 'jobAddrNoDesc': '台北市大安區', 'jobAddress': '',
+        } for i in range(count)]
+        return FakeResponse(200, {'data': jobs, 'metadata': {'pagination': {'total': self.total}}})
+
+class Fake1111Session():
+    # 1111 搜尋 API (只有一般搜尋，不分區)；jobs 為依頁排列的職缺 id，可以刻意放入重複的 id
+    headers = {}
+
+    def __init__(self, total=200, delay=0.0, pages=None):
+        self.total = total
+        self.delay = delay
+        self.pages = pages
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        if self.delay: time.sleep(self.delay)
+        page = int(params['page'])
+        if self.pages is not None:
+            ids = self.pages[page - 1] if page <= len(self.pages) else []
+        else:
+            ids = range((page - 1) * 20, min(page * 20, self.total))
+        hits = [{
+            'jobId': job_id, 'title': f'職缺{job_id}', 'companyName': '甲乙科技', 'salary': '月薪 40,000元',
+            'updateAt': '2024-01-01 10:00', 'workCity': {'name': '台北市'},
+        } for job_id in ids]
+        return FakeResponse(200, {'result': {'hits': hits, 'pagination': {'totalCount': self.total}}})
+
+@pytest.fixture
+def spider_104():
+    from job_spider_104 import Job104Spider
+    spider = Job104Spider()
+    spider.session = Fake104Session()
+    return spider
+
+@pytest.fixture
+def spider_1111():
+    from job_spider_1111 import Job1111Spider
+    spider = Job1111Spider()
+    spider.session = Fake1111Session()
+    return spider
@@ -0,0 +1,60 @@
+import numpy as np
+import dedup
+from dedup import find_duplicates, lsh_candidates, minhash_signatures, tag_duplicates
+
+# 執行方式：在專案根目錄 python -m pytest
+
+def test_true_duplicates_are_merged():
+    # 公司後綴、全半形、括號標註、臺/台的差異都視為同一職缺
+    names = ['Python 工程師【急徵】', 'Python工程師', 'ＰＹＴＨＯＮ工程師(台北)', '行政助理']
+    companies = ['甲乙科技股份有限公司', '甲乙科技有限公司', '甲乙科技', '甲乙科技股份有限公司']
+    locations = ['台北市信義區', '臺北市信義區', '台北市大安區', '台北市信義區']
+    assert find_duplicates(names, companies, locations) == [0, 0, 0, 3]
+
+def test_similar_titles_are_not_merged():
+    # 同公司同縣市但職稱不同 (前端 / 後端 / 資深前端 ...) 都是不同職缺
+    names = ['前端工程師', '後端工程師', 'Java工程師', 'Python工程師', '資深前端工程師', '行政助理', '會計助理', '業務助理']
+    companies = ['甲乙科技股份有限公司'] * len(names)
+    locations = ['台北市信義區'] * len(names)
+    assert find_duplicates(names, companies, locations) == list(range(len(names)))
+
+def test_other_city_or_company_is_not_merged():
+    names = ['前端工程師'] * 3
+    companies = ['甲乙科技', '甲乙科技', '丙丁資訊']
+    locations = ['台北市信義區', '高雄市前鎮區', '台北市信義區']
+    assert find_duplicates(names, companies, locations) == [0, 1, 2]
+
+def test_same_url_is_merged_first():
+    # 網址相同就是同一筆 (即使職稱被改過)；空網址不參與
+    names = ['前端工程師', '前端工程師 (遠端)', '後端工程師', '業務助理']
+    companies = ['甲乙科技'] * 4
+    locations = ['台北市'] * 4
+    urls = ['https://example.com/job/1', 'https://example.com/job/1', None, float('nan')]
+    assert find_duplicates(names, companies, locations, urls) == [0, 0, 2, 3]
+
+def test_tag_duplicates():
+    jobs = [
+        {'name': '前端工程師', 'company_name': '甲乙科技', 'location': '台北市', 'job_url': 'a'},
+        {'name': '前端工程師', 'company_name': '甲乙科技有限公司', 'location': '台北市', 'job_url': 'b'},
+        {'name': '後端工程師', 'company_name': '甲乙科技', 'location': '台北市', 'job_url': 'c'},
+    ]
+    assert tag_duplicates(jobs) == 1
+    assert [j['dup_cluster'] for j in jobs] == [0, 0, 2]
+    assert [j['is_duplicate'] for j in jobs] == [False, True, False]
+
+def test_large_bucket_is_bounded(monkeypatch):
+    # 所有簽章都一樣 (同一個桶子)：超過 BUCKET_LIMIT 後每筆最多配對 BUCKET_WINDOW 筆，不再兩兩配對
+    monkeypatch.setattr(dedup, 'BUCKET_LIMIT', 10)
+    monkeypatch.setattr(dedup, 'BUCKET_WINDOW', 3)
+    n = 200
+    sigs = minhash_signatures([[1, 2, 3]] * n)
+    pairs = lsh_candidates(sigs, np.ones(n, dtype=bool))
+    assert len(pairs) <= n * 3
+    assert all(a < b for a, b in pairs)
+
+def test_large_bucket_still_finds_duplicates(monkeypatch):
+    # 同公司大量刊登 (共用公司字組而落在同一個桶子) 時，完全相同的職缺仍會被合併
+    monkeypatch.setattr(dedup, 'BUCKET_LIMIT', 4)
+    names = [f'職務{i:03d}專員' for i in range(100)] * 2
+    clusters = find_duplicates(names, ['甲乙科技'] * 200, ['台北市'] * 200)
+    assert clusters == list(range(100)) * 2
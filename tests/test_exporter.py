@@ -0,0 +1,138 @@
+import io
+import os
+import csv
+import sqlite3
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pytest
+import exporter
+import job_lake
+
+COLUMNS = ['platform', 'name', 'company_name', 'salary', 'job_url', 'salary_min', 'salary_monthly']
+
+def sample_df():
+    return pd.DataFrame({
+        'platform': ['104', '1111', '104'],
+        'name': ['後端工程師', '前端, "資深" 工程師', '行政\n助理'],
+        'company_name': ['甲乙科技', None, '丙丁資訊'],
+        'salary': ['月薪 40,000~50,000元', '待遇面議', '時薪 190元'],
+        'job_url': ['https://example.com/a', 'https://example.com/b', ''],
+        'salary_min': [40000.0, np.nan, 190.0],
+        'salary_monthly': np.array([45000, 40000, 33440], dtype='int64'),
+    })
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    # 暫存檔寫到測試專用的目錄，才能確認用完有被刪除
+    path = tmp_path / 'temp'
+    path.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(path))
+    return path
+
+def test_iter_df_rows_cleans_values():
+    rows = list(exporter.iter_df_rows(sample_df()))
+    assert rows[1][2] is None and rows[1][5] is None
+    assert type(rows[0][6]) is int and type(rows[0][5]) is float
+
+def test_csv_matches_pandas():
+    # 分段產生的 CSV 與 pandas 一次輸出的位元組完全相同 (BOM 只在開頭出現一次)
+    df = sample_df()
+    expected = io.BytesIO()
+    df.to_csv(expected, index=False, encoding='utf-8-sig')
+    data = b''.join(exporter.iter_csv(COLUMNS, exporter.iter_df_rows(df), chunk_rows=2))
+    assert data == expected.getvalue()
+    assert data.startswith(b'\xef\xbb\xbf') and data.count(b'\xef\xbb\xbf') == 1
+
+def test_csv_round_trip():
+    rows = list(exporter.iter_df_rows(sample_df()))
+    data = b''.join(exporter.iter_csv(COLUMNS, iter(rows), chunk_rows=1))
+    parsed = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+    assert parsed[0] == COLUMNS
+    assert parsed[1:] == [['' if v is None else str(v) for v in row] for row in rows]
+
+def test_sqlite_round_trip(temp_dir):
+    rows = list(exporter.iter_df_rows(sample_df()))
+    path = exporter.build_sqlite(COLUMNS, iter(rows), chunk_rows=2)
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('SELECT * FROM jobs').fetchall() == rows
+        types = {r[1]: r[2] for r in conn.execute('PRAGMA table_info(jobs)')}
+        assert types['salary_monthly'] == 'INTEGER' and types['name'] == 'TEXT'
+    finally:
+        conn.close()
+    with open(path, 'rb') as f:
+        expected = f.read()
+    # 分段送出的內容就是整個檔案，送完即刪除
+    assert b''.join(exporter.iter_file(path, chunk_bytes=1024)) == expected
+    assert not os.path.exists(path)
+
+def test_sqlite_file_removed_when_client_disconnects(temp_dir):
+    path = exporter.build_sqlite(COLUMNS, exporter.iter_df_rows(sample_df()))
+    stream = exporter.iter_file(path, chunk_bytes=16)
+    next(stream)
+    stream.close()
+    assert not os.path.exists(path)
+
+def test_sqlite_failure_removes_temp_file(temp_dir):
+    with pytest.raises(sqlite3.Error):
+        exporter.build_sqlite(COLUMNS, [('104', 'only two columns')])
+    assert os.listdir(temp_dir) == []
+
+def test_parquet_round_trip(temp_dir):
+    path = job_lake.build_parquet(COLUMNS, exporter.iter_df_rows(sample_df()))
+    try:
+        table = pq.read_table(path)
+    finally:
+        os.remove(path)
+    assert table.column_names == COLUMNS
+    assert str(table.schema.field('salary_min').type) == 'int64'
+    assert table.column('salary_min').to_pylist() == [40000, None, 190]
+    assert table.column('company_name').to_pylist() == ['甲乙科技', None, '丙丁資訊']
+    assert table.column('name').to_pylist() == sample_df()['name'].tolist()
+
+def test_arrow_round_trip(temp_dir):
+    path = job_lake.build_arrow(COLUMNS, exporter.iter_df_rows(sample_df()))
+    try:
+        with ipc.open_file(path) as reader:
+            table = reader.read_all()
+    finally:
+        os.remove(path)
+    assert table.column_names == COLUMNS
+    assert table.column('salary_monthly').to_pylist() == [45000, 40000, 33440]
+    assert table.column('salary').to_pylist() == sample_df()['salary'].tolist()
+
+def lake_job(platform, name, salary_monthly):
+    return {'platform': platform, 'name': name, 'salary_monthly': salary_monthly}
+
+def test_lake_append_and_trend(tmp_path):
+    lake = str(tmp_path / 'lake')
+    assert job_lake.open_lake(lake) is None
+    assert job_lake.salary_trend('python', lake_dir=lake) == []
+
+    columns = ['platform', 'name', 'salary_monthly']
+    job_lake.append_batch(1, 'python', '2024-01-01 10:00:00',
+                          [lake_job('104', 'a', 40000), lake_job('1111', 'b', 50000), lake_job('104', 'c', None)], columns, lake)
+    job_lake.append_batch(2, 'python', '2024-01-02 09:00:00', [lake_job('104', 'a', 60000)], columns, lake)
+    job_lake.append_batch(3, 'java', '2024-01-02 09:30:00', [lake_job('104', 'j', 90000)], columns, lake)
+    assert job_lake.append_batch(4, 'go', '2024-01-03', [], columns, lake) == 0
+
+    # Hive 分區：platform / crawl_date / keyword
+    assert os.path.isdir(os.path.join(lake, 'platform=104', 'crawl_date=2024-01-02', 'keyword=java'))
+    table = job_lake.open_lake(lake).to_table()
+    assert table.num_rows == 5
+    assert sorted(table.column('batch_id').to_pylist()) == [1, 1, 1, 2, 3]
+
+    assert job_lake.salary_trend('python', lake_dir=lake) == [
+        {'crawl_date': '2024-01-01', 'count': 2, 'avg_salary': 45000},
+        {'crawl_date': '2024-01-02', 'count': 1, 'avg_salary': 60000},
+    ]
+    assert job_lake.salary_trend('python', since='2024-01-02', lake_dir=lake) == [
+        {'crawl_date': '2024-01-02', 'count': 1, 'avg_salary': 60000},
+    ]
+    assert job_lake.salary_trend('python', platform='1111', lake_dir=lake) == [
+        {'crawl_date': '2024-01-01', 'count': 1, 'avg_salary': 50000},
+    ]
+    assert [r['count'] for r in job_lake.salary_trend(lake_dir=lake)] == [2, 2]
@@ -0,0 +1,147 @@
+import base64
+import sqlite3
+import pytest
+import history_db
+
+# 舊版 (改成職缺倉儲之前) 的資料表：每個批次一份完整明細，圖表以 base64 存在主表
+BASELINE_SCHEMA = [
+    '''
+    CREATE TABLE history_batches (
+        batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        keyword TEXT,
+        save_time TEXT,
+        total_count INTEGER,
+        avg_salary INTEGER,
+        count_104 INTEGER,
+        count_1111 INTEGER,
+        chart_salary TEXT,
+        chart_location TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE history_details (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id INTEGER,
+        platform TEXT,
+        name TEXT,
+        company_name TEXT,
+        location TEXT,
+        salary TEXT,
+        job_url TEXT,
+        update_date TEXT,
+        FOREIGN KEY(batch_id) REFERENCES history_batches(batch_id) ON DELETE CASCADE
+    )
+    ''',
+]
+
+PNG_X, PNG_Y, PNG_Z = b'png-x', b'png-y', b'png-z'
+
+def chart(png):
+    return base64.b64encode(png).decode()
+
+def detail(name, url, salary='月薪 40,000~50,000元', company='甲乙科技'):
+    return ('104', name, company, '台北市大安區', salary, url, '2024/01/01')
+
+def build_baseline_db():
+    conn = sqlite3.connect(history_db.DB_PATH)
+    for sql in BASELINE_SCHEMA:
+        conn.execute(sql)
+    batches = [
+        ('python', '2024-01-01 10:00:00', chart(PNG_X), chart(PNG_Y), [
+            detail('後端工程師', 'https://example.com/a'),
+            detail('前端工程師', 'https://example.com/b'),
+            detail('行政助理', ''),
+        ]),
+        # 同一職缺 (網址相同) 在較新的批次改了薪資；薪資分布圖與第一批相同
+        ('python', '2024-01-02 10:00:00', chart(PNG_X), chart(PNG_Z), [
+            detail('後端工程師', 'https://example.com/a', salary='月薪 60,000元'),
+            detail('資料工程師', 'https://example.com/d'),
+        ]),
+        ('java', '2024-01-03 10:00:00', None, None, [
+            detail('Java工程師', 'https://example.com/e', company='丙丁資訊'),
+        ]),
+    ]
+    for batch_id, (keyword, save_time, chart_salary, chart_location, rows) in enumerate(batches, 1):
+        conn.execute('''
+            INSERT INTO history_batches (keyword, save_time, total_count, avg_salary, count_104, count_1111, chart_salary, chart_location)
+            VALUES (?, ?, ?, 0, ?, 0, ?, ?)
+        ''', (keyword, save_time, len(rows), len(rows), chart_salary, chart_location))
+        conn.executemany('''
+            INSERT INTO history_details (batch_id, platform, name, company_name, location, salary, job_url, update_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(batch_id,) + row for row in rows])
+    # 舊版外鍵沒有啟用：主表已刪除的批次留下孤兒明細
+    conn.execute("INSERT INTO history_details (batch_id, platform, name, job_url) VALUES (99, '104', '孤兒職缺', 'https://example.com/orphan')")
+    conn.commit()
+    conn.close()
+
+def count(table):
+    with history_db.get_pool().read() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+def names(result):
+    return sorted(job['name'] for job in result['jobs'])
+
+@pytest.fixture
+def migrated_db():
+    build_baseline_db()
+    history_db.init_history_db()
+    if not history_db.fts_available():
+        pytest.skip('SQLite 不支援 FTS5 trigram')
+
+def test_migration_row_counts(migrated_db):
+    with history_db.get_pool().read() as conn:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'history_details' not in tables
+    # 去重後 5 個職缺 (孤兒明細不搬)，批次關聯 3 + 2 + 1
+    assert count('history_batches') == 3
+    assert count('jobs') == 5
+    assert count('batch_jobs') == 6
+    # 相同的圖表只存一份
+    assert count('chart_blobs') == 3
+
+    batch_row, jobs = history_db.load_batch(1)
+    assert batch_row['total_count'] == 3
+    assert [j['name'] for j in jobs] == ['後端工程師', '前端工程師', '行政助理']
+    # 較新批次的內容覆蓋舊的，並補上結構化薪資
+    assert jobs[0]['salary'] == '月薪 60,000元'
+    assert jobs[0]['salary_monthly'] == 60000
+    assert jobs[1]['salary_monthly'] == 45000
+
+def test_migrated_charts_are_blobs(migrated_db):
+    batch_row = history_db.get_batch(1)
+    assert batch_row['chart_salary'] is None and batch_row['chart_location'] is None
+    assert history_db.get_chart(batch_row['chart_salary_hash']) == PNG_X
+    assert history_db.get_chart(batch_row['chart_location_hash']) == PNG_Y
+    assert history_db.get_chart(history_db.get_batch(2)['chart_salary_hash']) == PNG_X
+
+def test_migration_is_idempotent(migrated_db):
+    history_db.init_history_db()
+    assert (count('jobs'), count('batch_jobs'), count('chart_blobs')) == (5, 6, 3)
+
+def test_fts_search_after_migration(migrated_db):
+    # 3 個字以上走 trigram 索引，較短的詞改用 LIKE；兩者都能查到搬移過來的職缺
+    assert names(history_db.search_jobs('工程師')) == ['Java工程師', '前端工程師', '後端工程師', '資料工程師']
+    assert names(history_db.search_jobs('丙丁資訊', field='company_name')) == ['Java工程師']
+    assert names(history_db.search_jobs('助理')) == ['行政助理']
+    result = history_db.search_jobs('後端工程師')
+    assert result['total'] == 1
+    assert [b['batch_id'] for b in result['jobs'][0]['batches']] == [2, 1]
+    assert [b['batch_id'] for b in history_db.search_jobs('工程師', keyword='java')['batches']] == [3]
+
+def test_delete_batch_removes_orphans(migrated_db):
+    x_hash = history_db.get_batch(1)['chart_salary_hash']
+    y_hash = history_db.get_batch(1)['chart_location_hash']
+    history_db.delete_batch(1)
+    # 只屬於第 1 批的職缺與圖表被清掉；第 2 批仍在用的保留
+    assert count('jobs') == 3
+    assert count('batch_jobs') == 3
+    assert history_db.get_chart(y_hash) is None
+    assert history_db.get_chart(x_hash) == PNG_X
+    assert names(history_db.search_jobs('工程師')) == ['Java工程師', '後端工程師', '資料工程師']
+    assert history_db.search_jobs('助理')['total'] == 0
+
+    history_db.delete_batch(2)
+    assert count('jobs') == 1
+    assert count('chart_blobs') == 0
+    assert names(history_db.search_jobs('工程師')) == ['Java工程師']
@@ -0,0 +1,80 @@
+import time
+import threading
+from http_cache import ResponseCache, CountCache
+
+URL = 'https://example.com/search'
+
+class SlowConnection():
+    # 包住 sqlite3 連線，commit 時先停一下 (模擬磁碟很慢)
+    def __init__(self, conn, delay):
+        self.conn = conn
+        self.delay = delay
+        self.committing = threading.Event()
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def commit(self):
+        self.committing.set()
+        time.sleep(self.delay)
+        self.conn.commit()
+
+def test_memory_and_disk_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    assert cache.get('104', URL, {'page': 1}) is None
+    cache.set('104', URL, {'page': 1, '_': 123}, 50, [{'name': 'a'}])
+    # '_' 時間戳不算在快取鍵內；取出的是複本
+    total, jobs = cache.get('104', URL, {'page': 1, '_': 456})
+    assert (total, jobs) == (50, [{'name': 'a'}])
+    jobs[0]['name'] = 'changed'
+    assert cache.get('104', URL, {'page': 1})[1] == [{'name': 'a'}]
+
+    # 重新開啟 (記憶體層是空的) 時由磁碟層取回
+    reopened = ResponseCache(str(tmp_path / 'cache.db'))
+    assert reopened.get('104', URL, {'page': 1}) == (50, [{'name': 'a'}])
+    assert reopened.stats()['disk_hits'] == 1
+    assert reopened.get('104', URL, {'page': 1}) == (50, [{'name': 'a'}])
+    assert reopened.stats()['memory_hits'] == 1
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), ttl=-1)
+    cache.set('1111', URL, {'page': 2}, 10, [])
+    assert cache.get('1111', URL, {'page': 2}) is None
+    assert cache.stats()['misses'] == 1
+
+def test_slow_disk_write_does_not_block_memory_hits(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    cache.set('104', URL, {'page': 1}, 50, [{'name': 'a'}])
+    cache.conn = SlowConnection(cache.conn, 0.5)
+    writer = threading.Thread(target=cache.set, args=('104', URL, {'page': 2}, 50, [{'name': 'b'}]))
+    writer.start()
+    assert cache.conn.committing.wait(5)
+    # commit 還在進行：記憶體命中與統計不必等
+    begin = time.time()
+    assert cache.get('104', URL, {'page': 1}) == (50, [{'name': 'a'}])
+    assert cache.get('104', URL, {'page': 2}) == (50, [{'name': 'b'}])
+    assert cache.stats()['stores'] == 2
+    assert time.time() - begin < 0.2
+    writer.join(5)
+
+def test_newer_memory_entry_is_not_replaced_by_disk_row(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    cache._remember('k', time.time() + 600, (2, []))
+    cache._remember('k', time.time() + 300, (1, []))
+    assert cache.memory['k'][1] == (2, [])
+
+def test_count_cache_serves_stale_while_refreshing():
+    cache = CountCache(ttl=0, stale_ttl=60)
+    assert cache.get('python', lambda: 10) == 10
+    refreshed = threading.Event()
+    def loader():
+        refreshed.set()
+        return 20
+    # 過期但在 stale 視窗內：先回傳舊值，背景更新
+    assert cache.get('python', loader) == 10
+    assert refreshed.wait(5)
+    deadline = time.time() + 5
+    while cache.entries['python'][0] != 20 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get('python', lambda: 30) == 20
+    assert cache.stats()['stale_hits'] == 2
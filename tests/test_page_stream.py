@@ -0,0 +1,118 @@
+import time
+import pytest
+from page_stream import PageStream
+from conftest import Fake104Session, FakeResponse
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline: return False
+        time.sleep(0.01)
+    return True
+
+def make_fetch(pages, stopped=()):
+    # 假的抓取函式：依序把每頁交給 on_page，記錄已產出的頁數；stopped 成立時提早結束
+    produced = []
+    def run(on_page):
+        for i in range(pages):
+            if stopped: break
+            on_page([f'job{i}'], {'pages': i + 1})
+            produced.append(i)
+        return len(produced), []
+    return run, produced
+
+def test_bounded_queue_blocks_producer():
+    run, produced = make_fetch(50)
+    stream = PageStream(run, lambda: None, max_pages=2)
+    it = iter(stream)
+    first = next(it)
+    assert first == (['job0'], {'pages': 1})
+    # 消費端停下來：佇列滿了之後生產端阻塞，不會把 50 頁都抓完
+    assert wait_until(lambda: len(produced) >= 3)
+    time.sleep(0.2)
+    assert len(produced) <= 4
+    rest = list(it)
+    assert len(rest) == 49
+    assert stream.result == (50, [])
+
+def test_consumer_break_calls_stop():
+    stopped = []
+    run, produced = make_fetch(1000, stopped)
+    stream = PageStream(run, lambda: stopped.append(True), max_pages=2)
+    for jobs, _ in stream:
+        break
+    # 提早離開：stop() 被呼叫，背景爬取收尾結束，不會繼續抓
+    assert stopped == [True]
+    assert stream.closed.is_set()
+    assert len(produced) < 10
+
+def test_producer_error_is_raised():
+    def run(on_page):
+        on_page(['job0'], {})
+        raise RuntimeError('blocked')
+    stream = PageStream(run, lambda: None)
+    pages = []
+    with pytest.raises(RuntimeError):
+        for jobs, _ in stream:
+            pages.append(jobs)
+    assert pages == [['job0']]
+
+def test_104_search_returns_api_total(spider_104):
+    # search() 回傳 (API 總數, 前 max_num 筆)，與改成串流之前相同
+    spider_104.session.total = 500
+    total, jobs = spider_104.search('python', 50)
+    assert total == 500
+    assert len(jobs) == 50
+    assert spider_104.session.calls == 3
+
+def test_104_search_on_page_is_called_per_page(spider_104):
+    spider_104.session.total = 100
+    seen = []
+    total, jobs = spider_104.search('python', 100, on_page=lambda jobs, progress: seen.append(len(jobs)))
+    assert total == 100
+    assert sum(seen) == len(jobs) == 100
+    assert len(seen) == 5
+
+class Gappy104Session(Fake104Session):
+    # 第 2 頁回傳空資料 (例如 API 暫時出錯)
+    def get(self, url, params=None, headers=None, timeout=None):
+        if int(params['page']) == 2:
+            self.calls += 1
+            return FakeResponse(200, {'data': [], 'metadata': {'pagination': {'total': self.total}}})
+        return super().get(url, params, headers, timeout)
+
+def test_104_empty_page_is_skipped():
+    from job_spider_104 import Job104Spider
+    spider = Job104Spider()
+    spider.session = Gappy104Session(total=100)
+    pages = [jobs for jobs, _ in spider.stream_pages('python', 100)]
+    assert len(pages) == 4
+    assert all(pages)
+
+def test_104_consumer_break_stops_search(spider_104):
+    spider_104.session.total = 2000
+    spider_104.session.delay = 0.02
+    for jobs, _ in spider_104.stream_pages('python', 2000, max_pages=1):
+        break
+    assert spider_104.abort_signal
+    assert spider_104.session.calls < 100
+
+def test_1111_duplicate_page_is_skipped(spider_1111):
+    # 第 2 頁全部與第 1 頁重複：串流不送出空的頁面，重複數記在進度裡
+    spider_1111.session.total = 60
+    spider_1111.session.pages = [list(range(20)), list(range(20)), list(range(20, 40))]
+    pages = list(spider_1111.stream_pages('python', 60))
+    assert len(pages) == 2
+    assert all(jobs for jobs, _ in pages)
+    assert sorted(j.job_id for jobs, _ in pages for j in jobs) == list(range(40))
+    assert spider_1111.duplicate_count == 20
+
+def test_1111_search_returns_collected_count(spider_1111):
+    # 1111 的 search() 回傳實際取得的筆數；max_num <= 1 時只探測總數
+    spider_1111.session.total = 200
+    count, jobs = spider_1111.search('python', 50)
+    assert count == len(jobs) == 50
+    spider_1111.session.calls = 0
+    count, jobs = spider_1111.search('java', 1)
+    assert (count, jobs) == (200, [])
+    assert spider_1111.session.calls == 1
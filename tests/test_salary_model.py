@@ -0,0 +1,70 @@
+import math
+import random
+import warnings
+import pandas as pd
+from salary_model import SALARY_FIELDS, parse_salary_text, parse_salary_series
+
+SAMPLES = [
+    '月薪 35,000~45,000元', '月薪 35000元以上', '月薪 3萬5千', '月薪 3萬5千 ~ 4萬', '月薪3.5萬~4.2萬',
+    '月薪 35千~40千', '月薪 0 元', '月薪 0~35000', '月薪 40000~0', '月薪 45000~35000',
+    '時薪 190元', '時薪 183~200元', '日薪 1500元', '年薪 80萬~120萬', '年薪 1200000元以上',
+    '待遇面議', '待遇面議 (經常性薪資4萬以上)', '面議（經常性薪資達 4 萬元或以上）',
+    '論件計酬 500元', '承攬 3萬', '部分工時 時薪 190', '部分工時 25000',
+    '35000', '150~200', '600000~900000', '', None, '依公司規定', '月薪 9999999',
+]
+
+def normalize(fields):
+    # NaN / None 都當作「沒有值」，數字統一成 int 比較
+    out = {}
+    for key in SALARY_FIELDS:
+        value = fields[key]
+        if value is None or (isinstance(value, float) and math.isnan(value)): value = None
+        elif key != 'salary_type': value = int(value)
+        out[key] = value
+    return out
+
+def assert_parity(samples):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        result = parse_salary_series(pd.Series(samples, dtype=object))
+    for i, text in enumerate(samples):
+        assert normalize(result.iloc[i].to_dict()) == normalize(parse_salary_text(text)), text
+
+def test_series_matches_scalar_parser():
+    assert_parity(SAMPLES)
+
+def test_series_matches_scalar_parser_random():
+    # 隨機組合單位、金額與分隔符號
+    rng = random.Random(6)
+    amounts = ['0', '190', '1500', '3', '3.5', '35', '35000', '35,000', '120']
+    units = ['', '萬', '千', '萬5千', '萬 2 千', '元']
+    seps = ['~', ' - ', '至', '以上', ' ']
+    types = ['', '月薪 ', '時薪 ', '日薪 ', '年薪 ', '待遇面議 ', '論件計酬 ']
+    samples = []
+    for _ in range(500):
+        text = rng.choice(types) + rng.choice(amounts) + rng.choice(units)
+        if rng.random() < 0.6:
+            text += rng.choice(seps) + rng.choice(amounts) + rng.choice(units)
+        samples.append(text)
+    assert_parity(samples)
+
+def test_series_matches_scalar_parser_noise():
+    # 亂數字元組成的字串 (數字緊接單位、小數、多個分隔符號等邊界情況)
+    rng = random.Random(7)
+    chars = list('0123456789萬千元~- 月薪時日年面議.,以上')
+    assert_parity([''.join(rng.choice(chars) for _ in range(rng.randint(0, 14))) for _ in range(3000)])
+
+def test_wan_qian_compound():
+    fields = parse_salary_text('月薪 3萬5千')
+    assert (fields['salary_min'], fields['salary_max'], fields['salary_monthly']) == (35000, None, 35000)
+    fields = parse_salary_text('月薪 3萬5千 ~ 4萬')
+    assert (fields['salary_min'], fields['salary_max'], fields['salary_monthly']) == (35000, 40000, 37500)
+
+def test_zero_fallback_keeps_numeric_columns():
+    # 含 0 的字串走逐筆解析的備援路徑，寫回後欄位型別不變
+    result = parse_salary_series(pd.Series(['月薪 0 元', '月薪 0~35000', '月薪 40000']))
+    assert result['salary_min'].dtype.kind == 'f'
+    assert result['salary_max'].dtype.kind == 'f'
+    assert result['salary_monthly'].dtype.kind == 'i'
+    assert result['salary_min'].tolist()[1:] == [35000, 40000]
+    assert math.isnan(result['salary_min'].iloc[0])
@@ -0,0 +1,161 @@
+import time
+import threading
+import pytest
+from singleflight import SingleFlight, flight_key
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline: return False
+        time.sleep(0.01)
+    return True
+
+def make_runner(release, result):
+    # 假的爬取：等 release 才完成；期間定期檢查 should_stop (與爬蟲相同的中止方式)
+    calls = []
+    def runner(flight):
+        calls.append(flight)
+        while not release.wait(0.01):
+            if flight.should_stop(): return {'stopped': True}
+        return result
+    return runner, calls
+
+def test_flight_key_normalizes_keyword():
+    assert flight_key('  Python   工程師 ') == flight_key('python 工程師')
+
+def test_joiners_share_the_running_flight():
+    searches = SingleFlight()
+    release = threading.Event()
+    result = {'104': list(range(100)), '1111': list(range(100, 180))}
+    runner, calls = make_runner(release, result)
+
+    leader = searches.join('Python', 100, runner)
+    smaller = searches.join(' python ', 50, runner)     # 筆數較少：掛上同一個 Flight
+    larger = searches.join('python', 200, runner)       # 筆數較多：另外啟動
+    assert smaller is leader
+    assert larger is not leader
+    assert searches.stats() == {'in_flight': 2, 'started': 2, 'joined': 1, 'cancelled': 0}
+
+    release.set()
+    assert leader.wait(5) and larger.wait(5)
+    # 筆數較少的等待者取各平台的前段
+    assert leader.prefix(50) == {'104': list(range(50)), '1111': list(range(100, 150))}
+    assert leader.prefix(100) == result
+    for flight in (leader, smaller, larger):
+        searches.leave(flight)
+    assert len(calls) == 2
+    assert wait_until(lambda: searches.stats()['in_flight'] == 0)
+    assert searches.stats() == {'in_flight': 0, 'started': 2, 'joined': 1, 'cancelled': 0}
+
+def test_finished_flight_is_not_joined():
+    searches = SingleFlight()
+    release = threading.Event()
+    release.set()
+    runner, calls = make_runner(release, {'104': [1]})
+    first = searches.join('java', 10, runner)
+    assert first.wait(5)
+    searches.leave(first)
+    # _run 在 finish 之後才把 Flight 移出
+    assert wait_until(lambda: searches.stats()['in_flight'] == 0)
+    second = searches.join('java', 10, runner)
+    assert second is not first
+    assert second.wait(5)
+    searches.leave(second)
+    assert len(calls) == 2
+
+def test_cancel_when_last_waiter_leaves():
+    searches = SingleFlight()
+    release = threading.Event()
+    runner, _ = make_runner(release, {'104': []})
+    flight = searches.join('go', 100, runner)
+    searches.join('go', 100, runner)
+
+    searches.leave(flight)
+    assert not flight.cancelled and not flight.should_stop()
+    searches.leave(flight)
+    # 最後一個等待者離開：爬取透過 should_stop 自行結束
+    assert flight.should_stop()
+    assert flight.wait(5)
+    assert flight.result == {'stopped': True}
+    assert searches.stats()['cancelled'] == 1
+    assert searches.stats()['in_flight'] == 0
+    # 已取消的 Flight 不會再被共用
+    again = searches.join('go', 100, runner)
+    assert again is not flight
+    release.set()
+    assert again.wait(5)
+    searches.leave(again)
+
+def test_leave_after_finish_does_not_cancel():
+    searches = SingleFlight()
+    release = threading.Event()
+    release.set()
+    runner, _ = make_runner(release, {'104': [1]})
+    flight = searches.join('rust', 10, runner)
+    assert flight.wait(5)
+    searches.leave(flight)
+    assert not flight.cancelled
+    assert searches.stats()['cancelled'] == 0
+
+def test_cancel_before_search_starts_is_not_lost(spider_104, spider_1111):
+    # 爬蟲開始搜尋時會重設 abort_signal；外部的 should_stop 不會被重設，所以取消不會遺失
+    spider_104.abort_signal = True
+    assert spider_104.search_async('python', 200, should_stop=lambda: True) == (0, [])
+    assert spider_104.session.calls == 0
+    assert spider_1111.search_async('python', 200, should_stop=lambda: True) == (0, [])
+    assert spider_1111.session.calls == 0
+
+def test_cancel_during_search(spider_104):
+    # 100 頁、每頁 0.05 秒 (同時最多 12 頁)：不取消的話至少要 0.4 秒
+    spider_104.session.total = 2000
+    spider_104.session.delay = 0.05
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+    pages = [jobs for jobs, _ in spider_104.stream_pages('python', 2000, should_stop=cancelled.is_set)]
+    assert 0 < sum(len(p) for p in pages) < 2000
+    assert spider_104.session.calls < 100
+
+def test_output_is_built_once_outside_the_lock():
+    searches = SingleFlight()
+    release = threading.Event()
+    release.set()
+    runner, _ = make_runner(release, {'104': [1, 2, 3]})
+    flight = searches.join('c++', 10, runner)
+    assert flight.wait(5)
+
+    builds = []
+    started = threading.Event()
+    def build():
+        builds.append(1)
+        started.set()
+        time.sleep(0.3)
+        return {'result_id': 'r1'}
+
+    outputs = []
+    threads = [threading.Thread(target=lambda: outputs.append(flight.output(10, build))) for _ in range(3)]
+    for t in threads: t.start()
+    assert started.wait(5)
+    # build() 執行中，其他 publish 不會被擋住
+    begin = time.time()
+    flight.publish({'platform': '104', 'type': 'progress'})
+    assert time.time() - begin < 0.1
+    for t in threads: t.join(5)
+    assert builds == [1]
+    assert outputs == [{'result_id': 'r1'}] * 3
+    searches.leave(flight)
+
+def test_failed_output_is_rebuilt():
+    searches = SingleFlight()
+    release = threading.Event()
+    release.set()
+    runner, _ = make_runner(release, {'104': [1]})
+    flight = searches.join('php', 10, runner)
+    assert flight.wait(5)
+
+    def broken():
+        raise RuntimeError('chart failed')
+    with pytest.raises(RuntimeError):
+        flight.output(10, broken)
+    assert flight.output(10, lambda: 'ok') == 'ok'
+    assert flight.output(10, lambda: 'other') == 'ok'
+    searches.leave(flight)
@@ -0,0 +1,127 @@
+from watermark import Watermark, crawl_since
+
+PAGE_SIZE = 3
+
+def job(stamp, job_id):
+    return {'stamp': stamp, 'id': job_id}
+
+def key_of(job):
+    return job['stamp'], job['id']
+
+def make_fetch(jobs, fail_pages=()):
+    # 假的抓取函式：jobs 依日期由新到舊排好，每頁 PAGE_SIZE 筆；fail_pages 的頁面回傳 (0, []) (與爬蟲抓取失敗時相同)
+    calls = []
+    def fetch(page):
+        calls.append(page)
+        if page in fail_pages: return 0, []
+        return len(jobs), jobs[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+    return fetch, calls
+
+OLD_JOBS = [job('20240105', 'e'), job('20240104', 'd'), job('20240103', 'c'),
+            job('20240102', 'b'), job('20240101', 'a')]
+
+def ids(jobs):
+    return [j['id'] for j in jobs]
+
+def test_watermark_is_new_and_advance():
+    mark = Watermark('20240103', ['c1'])
+    assert mark.is_new('20240104', 'x')
+    assert mark.is_new('20240103', 'c2')
+    assert not mark.is_new('20240103', 'c1')
+    assert not mark.is_new('20240102', 'b')
+    advanced = mark.advance([('20240103', 'c2'), ('', 'no-date'), ('20240102', 'b')])
+    assert (advanced.latest, advanced.seen_ids) == ('20240103', {'c1', 'c2'})
+    advanced = mark.advance([('20240104', 'd')])
+    assert (advanced.latest, advanced.seen_ids) == ('20240104', {'d'})
+    # advance 不改變原本的水位線
+    assert (mark.latest, mark.seen_ids) == ('20240103', {'c1'})
+
+def test_first_run_takes_everything():
+    fetch, calls = make_fetch(OLD_JOBS)
+    jobs, mark, pages = crawl_since(fetch, key_of, Watermark())
+    assert ids(jobs) == ['e', 'd', 'c', 'b', 'a']
+    assert (mark.latest, mark.seen_ids) == ('20240105', {'e'})
+    # 翻到最後一頁就停
+    assert pages == 2 and calls == [1, 2]
+
+def test_next_run_only_returns_new_jobs():
+    _, mark, _ = crawl_since(make_fetch(OLD_JOBS)[0], key_of, Watermark())
+    # 同一天又上架了 f，之後還有更新的 g
+    fetch, calls = make_fetch([job('20240106', 'g'), job('20240105', 'f')] + OLD_JOBS)
+    jobs, mark, pages = crawl_since(fetch, key_of, mark)
+    assert ids(jobs) == ['g', 'f']
+    assert calls == [1]
+    assert (mark.latest, mark.seen_ids) == ('20240106', {'g'})
+
+def test_no_new_jobs():
+    _, mark, _ = crawl_since(make_fetch(OLD_JOBS)[0], key_of, Watermark())
+    fetch, calls = make_fetch(OLD_JOBS)
+    jobs, again, pages = crawl_since(fetch, key_of, mark)
+    assert jobs == []
+    assert calls == [1]
+    assert (again.latest, again.seen_ids) == (mark.latest, mark.seen_ids)
+
+def test_shifted_job_is_returned_once():
+    # 翻頁期間有新職缺上架，前一頁的最後一筆被擠到下一頁的開頭
+    pages = [[job('20240109', 'i'), job('20240108', 'h'), job('20240107', 'g')],
+             [job('20240107', 'g'), job('20240106', 'f'), job('20240101', 'a')]]
+    jobs, _, _ = crawl_since(lambda page: (6, pages[page - 1]), key_of, Watermark('20240101', ['a']))
+    assert ids(jobs) == ['i', 'h', 'g', 'f']
+
+def test_failed_page_does_not_advance_watermark():
+    mark = Watermark('20240101', ['a'])
+    # 第 2 頁抓取失敗：已抓到的新職缺照樣回傳，但水位線不前進
+    fetch, _ = make_fetch(OLD_JOBS, fail_pages={2})
+    jobs, after_failure, _ = crawl_since(fetch, key_of, mark)
+    assert ids(jobs) == ['e', 'd', 'c']
+    assert (after_failure.latest, after_failure.seen_ids) == ('20240101', {'a'})
+    # 下次成功時第 2 頁的 b 不會被略過
+    jobs, after_success, _ = crawl_since(make_fetch(OLD_JOBS)[0], key_of, after_failure)
+    assert ids(jobs) == ['e', 'd', 'c', 'b']
+    assert after_success.latest == '20240105'
+
+def test_stopped_crawl_does_not_advance_watermark():
+    mark = Watermark('20240101', ['a'])
+    fetch, calls = make_fetch(OLD_JOBS)
+    stop = []
+    def fetch_then_stop(page):
+        stop.append(True)
+        return fetch(page)
+    jobs, after, pages = crawl_since(fetch_then_stop, key_of, mark, should_stop=lambda: bool(stop))
+    assert ids(jobs) == ['e', 'd', 'c']
+    assert calls == [1]
+    assert after.latest == '20240101'
+
+def test_max_pages_still_advances():
+    # 水位線過舊時只翻 max_pages 頁並前進，避免每次都變成完整重爬
+    fetch, calls = make_fetch(OLD_JOBS)
+    jobs, mark, pages = crawl_since(fetch, key_of, Watermark(), max_pages=1)
+    assert ids(jobs) == ['e', 'd', 'c']
+    assert pages == 1
+    assert mark.latest == '20240105'
+
+def test_104_incremental(spider_104):
+    spider_104.session.total = 60
+    jobs, mark = spider_104.search_incremental('python', None, max_num=60)
+    assert len(jobs) == 60
+    assert mark.latest == '20240101' and len(mark.seen_ids) == 60
+    # 沒有新職缺：第 1 頁最後一筆就是已知職缺，只打一次 API
+    spider_104.session.calls = 0
+    jobs, again = spider_104.search_incremental('python', mark)
+    assert jobs == []
+    assert spider_104.session.calls == 1
+    assert again.seen_ids == mark.seen_ids
+
+def test_1111_incremental(spider_1111):
+    spider_1111.session.total = 40
+    jobs, mark = spider_1111.search_incremental('python', None, max_num=40)
+    assert len(jobs) == 40
+    assert mark.latest == '2024-01-01 10:00' and len(mark.seen_ids) == 40
+    # 又上架了 2 筆 (同一時間戳、沒看過的 id)
+    spider_1111.session.total = 42
+    spider_1111.session.pages = [[100, 101] + list(range(18)), list(range(18, 40))]
+    spider_1111.session.calls = 0
+    jobs, mark = spider_1111.search_incremental('python', mark)
+    assert [j.job_id for j in jobs] == [100, 101]
+    assert spider_1111.session.calls == 1
+    assert {'100', '101'} <= mark.seen_ids
@@ -0,0 +1,51 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# --- 批次轉換的共用執行器 ---
+# 轉換是純 Python 的 dict 操作 (受 GIL 限制)，一般情況直接在呼叫端一次跑完整批最快；
+# 只有非常大的批次才切塊丟到行程池，讓多顆 CPU 真的平行處理。
+
+PROCESS_POOL_THRESHOLD = 50000  # 超過這個筆數才使用行程池
+CHUNK_SIZE = 5000               # 每個行程一次處理的筆數
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn：Flask 主行程裡有爬蟲執行緒、速率控制器 / 快取的鎖與 session 連線池，
+            # fork 時若其他執行緒正持有鎖，子行程會卡死 (與 chart_renderer 相同)
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 4, mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+def _reset_pool(e):
+    # 行程池無法使用 (例如子行程異常結束)：丟掉舊的，下次重建
+    global _process_pool
+    print(f"Transform Pool Warning: {e}")
+    with _process_pool_lock:
+        _process_pool = None
+
+def run_batch(func, items, use_processes=None):
+    # func 必須是模組層級函式 (可被 pickle)，輸入一個 list、回傳一個 list
+    if use_processes is None:
+        # 單核心機器上行程池只會多出序列化成本
+        use_processes = len(items) >= PROCESS_POOL_THRESHOLD and (os.cpu_count() or 1) > 1
+    # 已經在子行程裡 (例如繪圖 / 轉換行程) 時不再開行程池
+    if not use_processes or multiprocessing.parent_process() is not None:
+        return func(items)
+
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    try:
+        results = []
+        for part in get_process_pool().map(func, chunks):
+            results.extend(part)
+        return results
+    except (BrokenProcessPool, RuntimeError) as e:
+        # 行程池壞掉或無法啟動子行程時，退回在目前執行緒一次轉換
+        _reset_pool(e)
+        return func(items)
@@ -0,0 +1,54 @@
+# --- 增量爬取水位線 ---
+# 每個 (關鍵字, 平台) 記錄上次看過最新的時間戳，以及剛好落在該時間戳上的職缺 id。
+# 依日期由新到舊翻頁時，比水位線新 (或同一時間戳但沒看過) 的才是新職缺；翻到已知職缺就停止。
+# 時間戳只在同一平台內比較，格式沿用各平台原始欄位 (104 appearDate 'YYYYMMDD'、1111 updateAt 'YYYY-MM-DD HH:MM')。
+
+INCREMENTAL_MAX_PAGES = 50   # 單次增量最多翻的頁數，避免水位線過舊時變成完整重爬
+
+class Watermark():
+    def __init__(self, latest='', seen_ids=None):
+        self.latest = latest or ''
+        self.seen_ids = set(seen_ids or [])
+
+    def is_new(self, stamp, job_id):
+        if stamp > self.latest: return True
+        return stamp == self.latest and job_id not in self.seen_ids
+
+    def advance(self, items):
+        # items: [(時間戳, id)]；回傳新的水位線 (本身不變)
+        latest, seen = self.latest, set(self.seen_ids)
+        for stamp, job_id in items:
+            if not stamp: continue
+            if stamp > latest:
+                latest, seen = stamp, set()
+            if stamp == latest:
+                seen.add(job_id)
+        return Watermark(latest, seen)
+
+def crawl_since(fetch_page, key_of, watermark, max_pages=INCREMENTAL_MAX_PAGES, should_stop=None):
+    # fetch_page(page) -> (total, raw_jobs)，key_of(raw_job) -> (時間戳, id)
+    # 回傳 (新職缺, 新水位線, 翻了幾頁)
+    # 中途被中止或某頁抓取失敗 (回傳 (0, [])) 時水位線不前進：沒翻到的頁面裡可能還有比水位線新的職缺，
+    # 前進的話下次會直接略過它們；已抓到的新職缺照樣回傳，下次重抓時由歷史倉儲去重
+    new_jobs, observed, new_ids = [], [], set()
+    pages = 0
+    for page in range(1, max_pages + 1):
+        if should_stop and should_stop(): return new_jobs, watermark, pages
+        total, jobs = fetch_page(page)
+        pages += 1
+        if not jobs:
+            if not total: return new_jobs, watermark, pages
+            break
+
+        for job in jobs:
+            stamp, job_id = key_of(job)
+            observed.append((stamp, job_id))
+            # 翻頁期間有新職缺上架會讓後面的頁面往後移，同一筆可能出現兩次
+            if watermark.is_new(stamp, job_id) and job_id not in new_ids:
+                new_ids.add(job_id)
+                new_jobs.append(job)
+
+        # 頁面依日期由新到舊：這一頁最後一筆已是已知職缺，之後只會更舊，停止；最後一頁也停止
+        # (只看最後一筆，頁首置頂的舊職缺不會讓爬取提早結束)
+        if not watermark.is_new(*key_of(jobs[-1])) or len(observed) >= total: break
+    return new_jobs, watermark.advance(observed), pages
@@ -1,110 +1,152 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, Response
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg') # 設定後端，避免視窗跳出
-import matplotlib.pyplot as plt
-import io
-import base64
 import re
-import sqlite3
 import numpy as np
-import os
 from concurrent.futures import ThreadPoolExecutor
-import matplotlib.ticker as ticker 
-import tempfile
 from datetime import datetime
 import time
+import json
+import threading
 
 # 引用自訂爬蟲模組
 from job_spider_104 import Job104Spider
 from job_spider_1111 import Job1111Spider
+from http_cache import get_response_cache, get_count_cache
+from session_pool import session_stats
+from salary_model import SALARY_FIELDS, parse_salary_text, parse_salary_series
+import history_db
+import exporter
+import job_lake
+from result_store import get_result_store
+from crawl_jobs import get_crawl_manager
+from singleflight import get_search_flights
+from dedup import tag_duplicates, find_duplicates
+from chart_renderer import render_charts, render_chart
 
 app = Flask(__name__)
 
 # --- 全域設定 ---
-CPU_CORES = os.cpu_count() or 4
-MAX_WORKERS_TRANSFORM = CPU_CORES * 10 
 MAX_WORKERS_SEARCH = 4 
 
-COLUMN_ORDER = ['platform', 'update_date', 'name', 'company_name', 'salary', 'job_url', 'location']
-
-# 設定中文字型與負號顯示
-import platform
-if platform.system() == "Windows":
-    plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
-elif platform.system() == "Darwin": 
-    plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']
-else:
-    plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
-
-# [配色方案]
-BG_COLOR = '#161616'     
-TEXT_COLOR = '#E0E0E0'   
-BAR_COLOR = '#C6A96B'    # 金色
-
-PIE_COLORS = [
-    '#C6A96B',  # 金色，主色
-    '#F2D38C',  # 淺金/米色
-    '#A67C52',  # 棕金色
-    '#D9B382',  # 柔和金棕
-    '#8C7B6B',  # 深咖啡
-    '#E8CFA8',  # 奶油色
-    '#BFA97A',  # 暖沙色
-]
-
-def fig_to_base64(fig):
-    img = io.BytesIO()
-    # [關鍵] pad_inches=0.05 設得非常小，盡量減少黑邊
-    fig.savefig(img, format='png', bbox_inches='tight', facecolor=BG_COLOR, edgecolor='none', pad_inches=0.05)
-    img.seek(0)
-    return base64.b64encode(img.getvalue()).decode()
+COLUMN_ORDER = ['platform', 'update_date', 'name', 'company_name', 'salary', 'job_url', 'location'] + SALARY_FIELDS
 
 def parse_salary_for_web(salary_str):
-    salary_str = str(salary_str).replace(',', '')
-    if '面議' in salary_str: return 0
-    nums = re.findall(r'(\d+)', salary_str)
-    if not nums: return 0
-    nums = [int(n) for n in nums]
-    avg_salary = sum(nums) / len(nums)
-    if avg_salary < 1000: return avg_salary * 160 # 時薪轉月薪
-    if avg_salary > 5000000: return avg_salary / 12 # 年薪轉月薪
-    if avg_salary > 300000: return avg_salary 
-    return avg_salary
+    # 舊介面保留：改由結構化薪資模型換算月薪
+    return parse_salary_text(salary_str)['salary_monthly']
+
+def ensure_salary_fields(df):
+    # 爬蟲轉換時已經算好結構化薪資；只有舊資料 (或缺欄位的資料) 才補解析一次
+    if df.empty: return df
+    for col in SALARY_FIELDS:
+        if col not in df.columns: df[col] = None
+    missing = df['salary_type'].isna() | (df['salary_type'] == '')
+    if missing.any():
+        parsed = parse_salary_series(df.loc[missing, 'salary'])
+        for col in SALARY_FIELDS:
+            df[col] = df[col].astype(object)
+            df.loc[missing, col] = parsed[col]
+    df['salary_monthly'] = pd.to_numeric(df['salary_monthly'], errors='coerce').fillna(0)
+    return df
+
+def df_to_records(df):
+    # NaN 轉成 None，避免回傳不合法的 JSON
+    return df.astype(object).where(df.notna(), None).to_dict('records')
 
 def filter_dataframe_by_salary(df, min_salary):
     if df.empty or min_salary is None: return df
     try:
         min_salary = int(min_salary)
         if min_salary <= 0: return df
-        df['_temp_avg_salary'] = df['salary'].apply(parse_salary_for_web)
-        filtered_df = df[df['_temp_avg_salary'] >= min_salary].copy()
-        del filtered_df['_temp_avg_salary']
-        return filtered_df
+        df = ensure_salary_fields(df)
+        return df[df['salary_monthly'] >= min_salary].copy()
     except Exception as e:
         print(f"Filtering Error: {e}")
         return df
 
+def jobs_to_df(jobs):
+    # 前端或爬蟲送來的職缺列表 → 含結構化薪資的 DataFrame (每份結果只建一次)
+    df = ensure_salary_fields(pd.DataFrame(jobs))
+    for col in COLUMN_ORDER:
+        if col not in df.columns: df[col] = ''
+    return df
+
+def apply_job_filters(df, filters):
+    # 與前端 checkJobFilter / sortJobs 相同的篩選與排序規則，讓匯出結果與畫面一致
+    if df.empty or not filters: return df
+    mask = pd.Series(True, index=df.index)
+
+    if not filters.get('show_104', True): mask &= df['platform'] != '104'
+    if not filters.get('show_1111', True): mask &= df['platform'] != '1111'
+
+    city = filters.get('city') or 'all'
+    if city != 'all':
+        mask &= df['location'].fillna('').astype(str).str.startswith(city)
+
+    s_type = filters.get('salary_type') or 'all'
+    if s_type != 'all':
+        mask &= df['salary'].fillna('').astype(str).str.contains(s_type, regex=False)
+
+    s_min = int(filters.get('salary_min') or 0)
+    s_max = int(filters.get('salary_max') or 0)
+    if s_type not in ('面議', '論件') and (s_min > 0 or s_max > 0):
+        low = pd.to_numeric(df['salary_min'], errors='coerce').fillna(0)
+        high = pd.to_numeric(df['salary_max'], errors='coerce').fillna(0)
+        high = high.where(high > 0, low)
+        mask &= ~((low == 0) & (high == 0))
+        if s_min > 0: mask &= low >= s_min
+        if s_max > 0: mask &= high <= s_max
+
+    df = df[mask]
+    sort_by = filters.get('sort_by')
+    if sort_by in ('salary_desc', 'salary_asc'):
+        low = pd.to_numeric(df['salary_min'], errors='coerce').fillna(0)
+        df = df.loc[low.sort_values(ascending=(sort_by == 'salary_asc'), kind='stable').index]
+    elif sort_by == 'date_desc':
+        df = df.sort_values('update_date', ascending=False, kind='stable', na_position='last')
+    elif sort_by == 'company':
+        df = df.sort_values('company_name', kind='stable')
+    return df
+
+def resolve_jobs(data):
+    # 優先使用伺服器端暫存的結果 (result_id + 篩選條件)；舊用法直接 POST jobs 仍然支援
+    result_id = data.get('result_id')
+    if result_id:
+        entry = get_result_store().get(result_id)
+        if entry is None:
+            raise LookupError('搜尋結果已過期，請重新搜尋')
+        return apply_job_filters(entry['df'], data.get('filters')), entry
+    jobs = data.get('jobs', [])
+    return (jobs_to_df(jobs) if jobs else pd.DataFrame()), None
+
 def get_city(addr):
     if isinstance(addr, str) and len(addr) >= 3:
         return addr[:3]
     return "其他"
 
-def fetch_stats_by_keyword_task(keyword):
-    spider104 = Job104Spider()
-    spider1111 = Job1111Spider()
-    count104, count1111 = 0, 0
+def get_city_series(locations):
+    # get_city 的向量化版本：取前 3 個字，類別依首次出現順序排列 (與逐筆 value_counts 的同票順序一致)
+    city = locations.where(locations.str.len() >= 3).str[:3].fillna("其他")
+    return pd.Categorical(city, categories=pd.unique(city))
+
+# 比較功能只需要總數：每個平台共用一個 spider (同一個 session)，不為每個關鍵字重建
+COUNT_SPIDERS = {}
+COUNT_SPIDERS_LOCK = threading.Lock()
+
+def get_count_spider(platform):
+    with COUNT_SPIDERS_LOCK:
+        if platform not in COUNT_SPIDERS:
+            COUNT_SPIDERS[platform] = Job104Spider() if platform == '104' else Job1111Spider()
+        return COUNT_SPIDERS[platform]
+
+def fetch_count_task(platform, keyword):
+    # 先查總數快取 (過期的舊值會先回傳並在背景更新)，沒有才送出一次計數請求
+    spider = get_count_spider(platform)
     try:
-        res104 = spider104.search(keyword, max_num=1)
-        if isinstance(res104, tuple): count104 = res104[0]
-        elif isinstance(res104, list): count104 = len(res104)
-            
-        res1111 = spider1111.search(keyword, max_num=1)
-        if isinstance(res1111, tuple): count1111 = res1111[0]
-        elif isinstance(res1111, list): count1111 = len(res1111)
+        count = get_count_cache().get((platform, keyword), lambda: spider.count(keyword))
     except Exception as e:
-        print(f"Error fetching stats for {keyword}: {e}")
-    return keyword, count104, count1111
+        print(f"Error fetching {platform} count for {keyword}: {e}")
+        count = None
+    return count or 0
 
 # --- Routes ---
 
@@ -112,6 +154,10 @@ def fetch_stats_by_keyword_task(keyword):
 def index():
     return render_template('index.html')
 
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'status': 'success', 'data': get_response_cache().stats(), 'counts': get_count_cache().stats(), 'results': get_result_store().stats(), 'sessions': session_stats(), 'crawl_jobs': get_crawl_manager().stats(), 'search_flights': get_search_flights().stats()})
+
 @app.route('/api/compare_jobs', methods=['POST'])
 def compare_jobs():
     data = request.json
@@ -119,10 +165,11 @@ def compare_jobs():
     if not keywords: return jsonify({'status': 'error', 'message': '請至少輸入一個職缺關鍵字'})
 
     results_list = []
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [executor.submit(fetch_stats_by_keyword_task, kw) for kw in keywords]
-        for future in futures:
-            kw, c104, c1111 = future.result()
+    # 每個 (平台, 關鍵字) 各一個計數請求，全部同時送出
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        futures = {kw: (executor.submit(fetch_count_task, '104', kw), executor.submit(fetch_count_task, '1111', kw)) for kw in keywords}
+        for kw, (f104, f1111) in futures.items():
+            c104, c1111 = f104.result(), f1111.result()
             results_list.append({'keyword': kw, '104': c104, '1111': c1111, 'total': c104 + c1111})
 
     results_list.sort(key=lambda x: x['total'], reverse=True)
@@ -132,44 +179,58 @@ def compare_jobs():
         counts_104 = [item['104'] for item in results_list]
         counts_1111 = [item['1111'] for item in results_list]
 
-        fig, ax = plt.subplots(figsize=(12, 6))
-        fig.patch.set_facecolor(BG_COLOR)
-        ax.set_facecolor(BG_COLOR)
-        
-        x = np.arange(len(labels))
-        width = 0.35 
-
-        rects1 = ax.bar(x - width/2, counts_104, width, label='104', color='#F08B51', alpha=0.9)
-        rects2 = ax.bar(x + width/2, counts_1111, width, label='1111', color='#1C638C', alpha=0.9)
-
-        ax.set_ylabel('職缺數', color=TEXT_COLOR)
-        ax.set_title('各職缺平台數量比較', color=TEXT_COLOR, fontsize=16, pad=20)
-        ax.set_xticks(x)
-        ax.set_xticklabels(labels, color=TEXT_COLOR, fontsize=14)
-        ax.tick_params(axis='y', colors=TEXT_COLOR)
-        
-        for spine in ax.spines.values():
-            spine.set_edgecolor('#444')
-
-        legend = ax.legend(facecolor=BG_COLOR, edgecolor='#444')
-        plt.setp(legend.get_texts(), color=TEXT_COLOR)
-
-        def autolabel(rects):
-            for rect in rects:
-                height = rect.get_height()
-                ax.annotate(f'{int(height):,}', xy=(rect.get_x() + rect.get_width() / 2, height),
-                            xytext=(0, 3), textcoords="offset points",
-                            ha='center', va='bottom', color=TEXT_COLOR, fontsize=11, fontweight='bold')
-        autolabel(rects1)
-        autolabel(rects2)
-
-        chart_base64 = fig_to_base64(fig)
-        plt.close(fig)
+        # 繪圖交給 chart_renderer 的行程池，相同的比較結果不會重畫
+        chart_base64 = render_chart('compare_bar', labels, counts_104, counts_1111)
         simple_data = {item['keyword']: item['total'] for item in results_list}
         return jsonify({'status': 'success', 'chart': chart_base64, 'data': simple_data})
     else:
         return jsonify({'status': 'error', 'message': '無法取得數據'})
 
+# --- 實際爬取：同一關鍵字同時被多次搜尋時只跑一次 (見 singleflight.py)，所有搜尋路由共用 ---
+def run_search_flight(flight):
+    # 兩個平台同時搜尋；每頁轉換後發布成串流事件，最後依平台彙整成結果
+    spiders = {'104': Job104Spider(), '1111': Job1111Spider()}
+    jobs_by_platform = {'104': [], '1111': []}
+
+    def crawl(platform, spider):
+        # 逐頁串流：原始頁面轉換後就丟掉，不在爬蟲端再累積一份
+        # 所有等待者離開 (flight 取消) 時，爬蟲透過 should_stop 自行中止
+        for raw_jobs, progress in spider.stream_pages(flight.keyword, flight.max_num, should_stop=flight.should_stop):
+            jobs = spider.transform_batch(raw_jobs)
+            jobs_by_platform[platform].extend(jobs)
+            flight.publish({'type': 'jobs' if jobs else 'progress', 'platform': platform, 'jobs': jobs, 'progress': progress})
+
+    print(f"開始搜尋: {flight.keyword} (目標: {flight.max_num} 筆)")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS_SEARCH) as search_executor:
+        futures = {
+            platform: search_executor.submit(crawl, platform, spider)
+            for platform, spider in spiders.items()
+        }
+        # 每一頁都在 crawl 回傳前發布，因此 platform_done 一定排在該平台最後一批資料之後
+        for platform, f in futures.items():
+            f.add_done_callback(lambda f, p=platform: flight.publish({'type': 'platform_done', 'platform': p}))
+        for platform, f in futures.items():
+            try: f.result()
+            except Exception as e: print(f"{platform} Error: {e}")
+
+    flight.coverage = {'1111': spiders['1111'].coverage}
+    return jobs_by_platform
+
+def flight_output(flight, max_num):
+    # 取共用爬取的前 max_num 筆 (每個平台)；相同筆數的等待者共用同一份統計 / 圖表 / result_id
+    def build():
+        jobs_by_platform = flight.prefix(max_num)
+        # 與單獨搜尋相同的順序：先 104 再 1111
+        # 前段與完整結果共用同一批 dict，複製後再標記重複 (不同筆數的群組可能不同)
+        jobs_data = [dict(j) for j in jobs_by_platform.get('104', []) + jobs_by_platform.get('1111', [])]
+        if not jobs_data: return None
+        tag_duplicates(jobs_data)
+        stats, charts = analyze_jobs(jobs_data, flight.keyword)
+        # 結果留在伺服器端，之後篩選 / 匯出 / 存檔只需要 result_id
+        result_id = get_result_store().put(flight.keyword, jobs_to_df(jobs_data), stats, charts)
+        return {'result_id': result_id, 'jobs': jobs_data, 'stats': stats, 'charts': charts}
+    return flight.output(max_num, build)
+
 @app.route('/api/search', methods=['POST'])
 def search_jobs():
     data = request.json
@@ -177,183 +238,281 @@ def search_jobs():
     try: max_num = int(data.get('max_num', 20))
     except: max_num = 20
 
-    spider104 = Job104Spider()
-    spider1111 = Job1111Spider()
-    
-    raw_list_104 = []
-    raw_list_1111 = []
-
-    print(f"開始搜尋: {keyword} (目標: {max_num} 筆)")
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS_SEARCH) as search_executor:
-        f1 = search_executor.submit(spider104.search, keyword, max_num)
-        f2 = search_executor.submit(spider1111.search, keyword, max_num)
-        try:
-            res104 = f1.result()
-            raw_list_104 = res104[1] if isinstance(res104, tuple) else res104
-        except Exception as e: print(f"104 Error: {e}")
-        try:
-            res1111 = f2.result()
-            raw_list_1111 = res1111[1] if isinstance(res1111, tuple) else res1111
-        except Exception as e: print(f"1111 Error: {e}")
-
-    jobs_data = []
-    def task_104(j): return spider104.search_job_transform(j)
-    def task_1111(j): return spider1111.search_job_transform(j)
-
-    if raw_list_104 or raw_list_1111:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_TRANSFORM) as transform_executor:
-            futures = []
-            for job in raw_list_104: futures.append(transform_executor.submit(task_104, job))
-            for job in raw_list_1111: futures.append(transform_executor.submit(task_1111, job))
-            
-            for f in futures:
-                try:
-                    res = f.result()
-                    if res: jobs_data.append(res)
-                except Exception: pass
+    searches = get_search_flights()
+    flight = searches.join(keyword, max_num, run_search_flight)
+    try:
+        flight.wait()
+    finally:
+        searches.leave(flight)
 
-    if not jobs_data:
+    output = flight_output(flight, max_num)
+    if not output:
         return jsonify({'status': 'error', 'message': '未找到相關職缺'})
-    
-    # --- 修改點：直接呼叫剛剛寫好的 analyze_jobs ---
-    stats, charts = analyze_jobs(jobs_data, keyword)
 
     return jsonify({
         'status': 'success', 
-        'jobs': jobs_data, 
-        'charts': charts, 
-        'stats': stats
+        'result_id': output['result_id'],
+        'jobs': output['jobs'], 
+        'charts': output['charts'], 
+        'stats': output['stats'],
+        'coverage': flight.coverage
     })
 
+# --- 背景爬取工作：POST 建立後立刻回傳 job_id，之後輪詢進度 / 取消 / 取結果 ---
+def run_crawl_job(job):
+    searches = get_search_flights()
+    flight = searches.join(job.keyword, job.max_num, run_search_flight)
+    try:
+        while not flight.wait(0.5):
+            job.update_progress(flight.progress_snapshot())
+            if job.cancelled: return '已取消'
+        job.update_progress(flight.progress_snapshot())
+    finally:
+        searches.leave(flight)
+
+    output = flight_output(flight, job.max_num)
+    if not output: return '未找到相關職缺'
+    job.result_id = output['result_id']
+    return f"共取得 {len(output['jobs'])} 筆"
+
+@app.route('/api/crawl_jobs', methods=['POST'])
+def create_crawl_job():
+    data = request.json or {}
+    keyword = (data.get('keyword') or '').strip()
+    if not keyword: return jsonify({'status': 'error', 'message': '請輸入關鍵字'})
+    try: max_num = int(data.get('max_num', 20))
+    except: max_num = 20
+
+    job = get_crawl_manager().submit(keyword, max_num, run_crawl_job)
+    if job is None:
+        return jsonify({'status': 'error', 'message': '目前排隊的搜尋工作過多，請稍後再試'}), 429
+    return jsonify({'status': 'success', 'job': job.snapshot()}), 202
+
+@app.route('/api/crawl_jobs', methods=['GET'])
+def list_crawl_jobs():
+    return jsonify({'status': 'success', 'data': get_crawl_manager().list_jobs()})
+
+@app.route('/api/crawl_jobs/<job_id>', methods=['GET'])
+def get_crawl_job(job_id):
+    job = get_crawl_manager().get(job_id)
+    if job is None: return jsonify({'status': 'error', 'message': '找不到此搜尋工作'}), 404
+    return jsonify({'status': 'success', 'job': job.snapshot()})
+
+@app.route('/api/crawl_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_crawl_job(job_id):
+    job = get_crawl_manager().get(job_id)
+    if job is None: return jsonify({'status': 'error', 'message': '找不到此搜尋工作'}), 404
+    if not job.cancel():
+        return jsonify({'status': 'error', 'message': '搜尋工作已結束', 'job': job.snapshot()}), 409
+    return jsonify({'status': 'success', 'job': job.snapshot()})
+
+@app.route('/api/crawl_jobs/<job_id>/result', methods=['GET'])
+def get_crawl_job_result(job_id):
+    try:
+        job = get_crawl_manager().get(job_id)
+        if job is None: return jsonify({'status': 'error', 'message': '找不到此搜尋工作'}), 404
+        snapshot = job.snapshot()
+        if snapshot['status'] != 'done':
+            return jsonify({'status': 'error', 'message': '搜尋工作尚未完成', 'job': snapshot}), 409
+        if not job.result_id:
+            return jsonify({'status': 'error', 'message': snapshot['message'] or '未找到相關職缺', 'job': snapshot})
+
+        entry = get_result_store().get(job.result_id)
+        if entry is None:
+            return jsonify({'status': 'error', 'message': '搜尋結果已過期，請重新搜尋'}), 410
+        return jsonify({
+            'status': 'success',
+            'result_id': job.result_id,
+            'jobs': df_to_records(entry['df']),
+            'charts': entry['charts'],
+            'stats': entry['stats'],
+            'job': snapshot
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+# --- 串流版搜尋：每抓到一頁 (104) 或一個分區頁面 (1111) 就先送出，最後再送統計與圖表 ---
+# 回應格式為 NDJSON，每行一個事件：
+#   {"type": "start"}                              搜尋開始
+#   {"type": "jobs", "platform", "jobs", "progress"} 一批已轉換的職缺
+#   {"type": "progress", "platform", "progress"}     沒有新職缺但進度有變 (例如全部重複)
+#   {"type": "platform_done", "platform"}            單一平台結束
+#   {"type": "done", "result_id", "stats", "charts", "coverage"} 全部完成 (result_id 供篩選 / 匯出 / 存檔使用，coverage 為 1111 分區覆蓋率)
+#   {"type": "error", "message"}
+def ndjson_line(event):
+    return json.dumps(event, ensure_ascii=False) + '\n'
+
+@app.route('/api/search_stream', methods=['POST'])
+def search_jobs_stream():
+    data = request.json
+    keyword = data.get('keyword', 'Python')
+    try: max_num = int(data.get('max_num', 20))
+    except: max_num = 20
+
+    def generate():
+        print(f"開始串流搜尋: {keyword} (目標: {max_num} 筆)")
+        searches = get_search_flights()
+        flight = searches.join(keyword, max_num, run_search_flight)
+        sent = {'104': 0, '1111': 0}
+        index = 0
+        try:
+            yield ndjson_line({'type': 'start', 'keyword': keyword, 'max_num': max_num})
+            # 從頭重播共用爬取的事件 (中途加入也拿得到先前的頁面)，直到爬取結束
+            finished = False
+            while not finished:
+                events, finished = flight.follow(index)
+                index += len(events)
+                for event in events:
+                    if event['type'] == 'platform_done':
+                        yield ndjson_line(event)
+                        continue
+                    # 共用筆數較多的爬取時，每個平台只送出自己要求的前 max_num 筆
+                    platform = event['platform']
+                    jobs = event['jobs'][:max(0, max_num - sent[platform])]
+                    sent[platform] += len(jobs)
+                    progress = dict(event['progress'])
+                    if 'collected' in progress: progress['collected'] = min(progress['collected'], max_num)
+                    out = {'type': 'jobs' if jobs else 'progress', 'platform': platform, 'progress': progress}
+                    if jobs: out['jobs'] = jobs
+                    yield ndjson_line(out)
+
+            output = flight_output(flight, max_num)
+            if not output:
+                yield ndjson_line({'type': 'error', 'message': '未找到相關職缺'})
+                return
+            yield ndjson_line({'type': 'done', 'status': 'success', 'result_id': output['result_id'], 'stats': output['stats'], 'charts': output['charts'], 'coverage': flight.coverage})
+        finally:
+            # 用戶端中途斷線時 generator 會被關閉；沒有其他人在等這個爬取時會一併停止兩邊爬蟲
+            searches.leave(flight)
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
 @app.route('/api/filter_jobs', methods=['POST'])
 def filter_jobs():
     try:
         data = request.json
-        jobs = data.get('jobs', [])
         min_salary = data.get('min_salary', 0)
-        if not jobs: return jsonify({'status': 'error', 'message': '沒有資料可篩選'})
-        df = pd.DataFrame(jobs)
+        df, _ = resolve_jobs(data)
+        if df.empty: return jsonify({'status': 'error', 'message': '沒有資料可篩選'})
         filtered_df = filter_dataframe_by_salary(df, min_salary)
         return jsonify({
-            'status': 'success', 'jobs': filtered_df.to_dict('records'),
+            'status': 'success', 'jobs': df_to_records(filtered_df),
             'count': len(filtered_df),
             'message': f'篩選完成，共找到 {len(filtered_df)} 筆月薪高於 {min_salary} 的職缺'
         })
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 410
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+def export_rows(data, default_keyword):
+    # 匯出資料來源：帶 batch_id 時直接從歷史資料庫逐批讀取 (不需要上傳職缺)；否則使用暫存結果 / 上傳的職缺
+    # 回傳 (關鍵字, 資料列迭代器)；沒有資料時資料列為 None
+    min_salary = data.get('min_salary')
+    batch_id = data.get('batch_id')
+    if batch_id is not None:
+        batch_row = history_db.get_batch(batch_id)
+        if not batch_row:
+            raise LookupError('找不到該筆紀錄')
+        keyword = data.get('keyword') or batch_row['keyword']
+        return keyword, history_db.iter_batch_rows(batch_id, COLUMN_ORDER, int(min_salary or 0))
+
+    keyword = data.get('keyword', default_keyword)
+    df, _ = resolve_jobs(data)
+    if df.empty: return keyword, None
+    if min_salary: df = filter_dataframe_by_salary(df, min_salary)
+    for col in COLUMN_ORDER:
+        if col not in df.columns: df[col] = ''
+    return keyword, exporter.iter_df_rows(df[COLUMN_ORDER])
+
 @app.route('/api/export_db', methods=['POST'])
 def export_db():
     try:
         data = request.json
-        jobs = data.get('jobs', [])
-        keyword = data.get('keyword', 'jobs')
-        min_salary = data.get('min_salary') 
-        
-        if not jobs: return jsonify({'status': 'error', 'message': '沒有資料可匯出'})
-
-        # 1. 整理資料 (同原本邏輯)
-        df = pd.DataFrame(jobs)
-        if min_salary:
-            df = filter_dataframe_by_salary(df, min_salary)
-        
-        for col in COLUMN_ORDER:
-            if col not in df.columns: df[col] = ''
-        df = df[COLUMN_ORDER]
-        
-        # 2. (新功能) 建立暫存檔
-        fd, temp_path = tempfile.mkstemp(suffix='.db')
-        os.close(fd) # 關閉檔案描述符，只要路徑
-
-        # 3. (新功能) 寫入 SQLite 到暫存檔
-        conn = sqlite3.connect(temp_path)
-        df.to_sql('jobs', conn, if_exists='replace', index=False)
-        conn.close()
-        
-        # 4. (新功能) 透過 send_file 讓瀏覽器下載
-        return send_file(
-            temp_path, 
-            as_attachment=True, 
-            download_name=f"{keyword}.db", 
-            mimetype='application/x-sqlite3'
+        keyword, rows = export_rows(data, 'jobs')
+        if rows is None: return jsonify({'status': 'error', 'message': '沒有資料可匯出'})
+
+        # executemany 一次交易寫入暫存檔，邊讀邊送，送完 (或用戶端斷線) 就刪除
+        temp_path = exporter.build_sqlite(COLUMN_ORDER, rows)
+        return Response(
+            exporter.iter_file(temp_path),
+            mimetype='application/x-sqlite3',
+            headers=exporter.attachment_headers(f"{keyword}.db")
         )
 
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 410
     except Exception as e:
         print(f"DB Export Error: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# --- 欄式匯出：Parquet / Arrow IPC (資料列來源與 CSV 相同，可用 result_id 或 batch_id) ---
+COLUMNAR_FORMATS = {
+    'parquet': (job_lake.build_parquet, 'application/vnd.apache.parquet', '.parquet'),
+    'arrow': (job_lake.build_arrow, 'application/vnd.apache.arrow.file', '.arrow'),
+}
+
+@app.route('/api/export_parquet', methods=['POST'], defaults={'fmt': 'parquet'})
+@app.route('/api/export_arrow', methods=['POST'], defaults={'fmt': 'arrow'})
+def export_columnar(fmt):
+    try:
+        data = request.json
+        keyword, rows = export_rows(data, 'jobs')
+        if rows is None: return jsonify({'status': 'error', 'message': '沒有資料可匯出'})
+        build, mimetype, suffix = COLUMNAR_FORMATS[fmt]
+        temp_path = build(COLUMN_ORDER, rows)
+        return Response(exporter.iter_file(temp_path), mimetype=mimetype, headers=exporter.attachment_headers(f"{keyword}_jobs{suffix}"))
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 410
+    except Exception as e:
+        print(f"Columnar Export Error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/export_csv', methods=['POST'])
 def export_csv():
     try:
         data = request.json
-        jobs = data.get('jobs', [])
-        keyword = data.get('keyword', 'data')
         min_salary = data.get('min_salary')
-        if not jobs: return jsonify({'status': 'error', 'message': '沒有資料可匯出'})
-        df = pd.DataFrame(jobs)
-        if min_salary: df = filter_dataframe_by_salary(df, min_salary)
-        for col in COLUMN_ORDER:
-            if col not in df.columns: df[col] = ''
-        df = df[COLUMN_ORDER]
-        csv_buffer = io.BytesIO()
-        df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-        csv_buffer.seek(0)
+        keyword, rows = export_rows(data, 'data')
+        if rows is None: return jsonify({'status': 'error', 'message': '沒有資料可匯出'})
         filename = f"{keyword}_jobs" + (f"_over_{min_salary}" if min_salary else "") + ".csv"
-        return send_file(csv_buffer, mimetype='text/csv', as_attachment=True, download_name=filename)
+        # 逐段產生 CSV，整份檔案不會同時存在記憶體
+        return Response(exporter.iter_csv(COLUMN_ORDER, rows), mimetype='text/csv', headers=exporter.attachment_headers(filename))
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 410
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
-    
 
 # --- 新增：獨立的分析與繪圖函數 (讓搜尋和歷史紀錄共用) ---
 def analyze_jobs(jobs_data, keyword):
     if not jobs_data:
         return {}, {}
 
-    df = pd.DataFrame(jobs_data)
-    charts = {}
+    # 只取分析需要的欄位，其餘全部以整欄運算處理
+    df = pd.DataFrame(jobs_data, columns=['platform', 'name', 'company_name', 'location', 'job_url', 'salary', 'is_duplicate'] + SALARY_FIELDS)
+    # 跨平台重複刊登只算一次 (搜尋結果已標記過；歷史 / 篩選後的資料沒有標記時當場計算)
+    if df['is_duplicate'].isna().any():
+        clusters = np.asarray(find_duplicates(
+            df['name'].tolist(), df['company_name'].tolist(), df['location'].tolist(), df['job_url'].tolist()
+        ))
+        df['is_duplicate'] = clusters != np.arange(len(df))
+    df['is_duplicate'] = df['is_duplicate'].astype(bool)
 
     # --- 1. 薪資分佈圖 (長寬比 2:1) ---
-    # 先確保有 avg_salary 欄位
-    if 'avg_salary' not in df.columns:
-        df['avg_salary'] = df['salary'].apply(parse_salary_for_web)
+    # 直接使用結構化的換算月薪欄位
+    df = ensure_salary_fields(df)
+    unique = df[~df['is_duplicate']]
+    monthly = unique['salary_monthly'].to_numpy(dtype=float)
+    salary_valid = monthly[(monthly > 20000) & (monthly < 300000)]
     
-    salary_valid = df[(df['avg_salary'] > 20000) & (df['avg_salary'] < 300000)]['avg_salary']
-    
-    if not salary_valid.empty:
-        fig1, ax1 = plt.subplots(figsize=(10, 5))
-        fig1.patch.set_facecolor(BG_COLOR)
-        ax1.set_facecolor(BG_COLOR)
-        
-        n, bins, patches = ax1.hist(salary_valid, bins=12, color=BAR_COLOR, edgecolor=BG_COLOR, alpha=0.9)
-
-        #薪資分布區間長條圖_標題
-        ax1.set_title(f"{keyword} 薪資分佈", color=TEXT_COLOR, fontsize=16, pad=15)
-        ax1.set_ylabel("職缺數", color=TEXT_COLOR, fontsize=12)
-        
-        def salary_formatter(x, pos):
-            if x >= 10000: return f'{int(x):,}'
-            return str(int(x))
-            
-        ax1.xaxis.set_major_formatter(ticker.FuncFormatter(salary_formatter))
-        ax1.tick_params(axis='x', colors=TEXT_COLOR, labelsize=12)
-        ax1.tick_params(axis='y', colors=TEXT_COLOR, labelsize=12)
-        
-        for spine in ax1.spines.values():
-            spine.set_edgecolor('#444')
-        ax1.grid(axis='y', linestyle='--', alpha=0.2, color='white')
-        
-        for i in range(len(patches)):
-            if n[i] > 0:
-                ax1.text(patches[i].get_x() + patches[i].get_width() / 2, n[i], str(int(n[i])), 
-                         ha='center', va='bottom', color=TEXT_COLOR, fontsize=11)
-
-        plt.subplots_adjust(left=0.08, right=0.98, top=0.9, bottom=0.1)
-        charts['salary_dist'] = fig_to_base64(fig1)
-        plt.close(fig1)
+    chart_requests = {}
+    if salary_valid.size:
+        # 先用 NumPy 算好分箱，繪圖服務只負責畫出結果
+        hist_counts, hist_bins = np.histogram(salary_valid, bins=12)
+        chart_requests['salary_dist'] = ('salary_hist', (keyword, hist_counts.tolist(), hist_bins.tolist()))
 
     # --- 2. 地區分佈圖 ---
-    city_counts = df['location'].apply(get_city).value_counts()
+    city_counts = pd.Series(get_city_series(unique['location'])).value_counts()
     
     if len(city_counts) > 7:
         main = city_counts[:6]
@@ -365,94 +524,30 @@ def analyze_jobs(jobs_data, keyword):
             city_counts = main
     
     if not city_counts.empty:
-        fig2, ax2 = plt.subplots(figsize=(6, 5))
-        fig2.patch.set_facecolor(BG_COLOR)
-
-        wedges, texts, autotexts = ax2.pie(
-            city_counts, 
-            labels=city_counts.index, 
-            autopct='%1.0f%%',          # 小數點去掉
-            colors=PIE_COLORS[:len(city_counts)], 
-            startangle=90,
-            pctdistance=0.7,
-            labeldistance=1.05,         # 標籤更靠近切片
-            wedgeprops={'edgecolor': BG_COLOR, 'linewidth': 1},  # 增加切片邊界
-            textprops={'color': TEXT_COLOR, 'fontsize': 16, 'weight': 'bold'} #地區職缺圓餅圖 數字旁邊的圖標
-        )
-
-        # 自動調整文字顏色對比
-        for autotext in autotexts:
-            autotext.set_color(BG_COLOR)
-            autotext.set_weight('bold')
-            autotext.set_fontsize(15) #市場分析_地區職缺_圓餅圖數字大小
-
-        #市場分析_地區職缺圓餅圖_標題
-        ax2.set_title(f"{keyword} 地區佔比", color=TEXT_COLOR, fontsize=20, pad=40)
+        chart_requests['location_pie'] = ('location_pie', (keyword, [str(c) for c in city_counts.index], [int(v) for v in city_counts.values]))
 
-        #市場分析_地區職缺圓餅圖_圖例
-        ax2.legend(wedges, city_counts.index,
-                loc="lower center", 
-                bbox_to_anchor=(0.5, -0.45),  #圖例和圓餅圖的間距
-                ncol=4, 
-                frameon=False, 
-                labelcolor=TEXT_COLOR,
-                fontsize=16)
-
-        ax2.axis('equal')  
-        plt.subplots_adjust(left=0.02, right=0.98, top=0.92, bottom=0.1)
-
-        
-        charts['location_pie'] = fig_to_base64(fig2)
-        plt.close(fig2)
+    # 兩張圖交給繪圖行程同時繪製；相同的彙總數字直接取用記憶的結果
+    charts = render_charts(chart_requests)
 
     # --- 3. 計算統計數據 ---
+    platform_counts = df.groupby('platform').size()
     stats = {
         'total': len(df),
-        'avg_salary': int(salary_valid.mean()) if not salary_valid.empty else 0,
-        'count_104': len(df[df['platform'] == '104']),
-        'count_1111': len(df[df['platform'] == '1111'])
+        'avg_salary': int(salary_valid.mean()) if salary_valid.size else 0,
+        'count_104': int(platform_counts.get('104', 0)),
+        'count_1111': int(platform_counts.get('1111', 0)),
+        'unique_total': len(unique),
+        'duplicate_count': len(df) - len(unique)
     }
-    
-    # 確保每個 job 都有 salary_sort 供前端排序
-    for job in jobs_data: 
-        job['salary_sort'] = parse_salary_for_web(job.get('salary', ''))
 
+    # 前端排序直接使用每筆職缺本身的 salary_monthly 欄位，不再逐筆寫入 salary_sort
     return stats, charts
 
 # --- 新增：資料庫初始化函數 ---
 def init_history_db():
-    # 這裡只做基本檢查，實際建表邏輯在 save_history 內也有，雙重保險
+    # 建表、索引與舊資料搬移都在 history_db 內完成
     try:
-        with sqlite3.connect('history_jobs.db') as conn:
-            c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS history_batches (
-                    batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    keyword TEXT,
-                    save_time TEXT,
-                    total_count INTEGER,
-                    avg_salary INTEGER,
-                    count_104 INTEGER,
-                    count_1111 INTEGER,
-                    chart_salary TEXT,
-                    chart_location TEXT
-                )
-            ''')
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS history_details (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    batch_id INTEGER,
-                    platform TEXT,
-                    name TEXT,
-                    company_name TEXT,
-                    location TEXT,
-                    salary TEXT,
-                    job_url TEXT,
-                    update_date TEXT,
-                    FOREIGN KEY(batch_id) REFERENCES history_batches(batch_id) ON DELETE CASCADE
-                )
-            ''')
-            conn.commit()
+        history_db.init_history_db()
     except Exception as e:
         print(f"Init DB Warning: {e}")
 
@@ -464,16 +559,20 @@ init_history_db()
 def save_history():
     try:
         data = request.json
-        jobs = data.get('jobs', [])
-        keyword = data.get('keyword', '未命名搜尋')
+        df, entry = resolve_jobs(data)
+        keyword = data.get('keyword') or (entry['keyword'] if entry else '未命名搜尋')
         save_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        if not jobs:
+        if df.empty:
             return jsonify({'status': 'error', 'message': '沒有資料可儲存'})
+        jobs = df_to_records(df)
 
-        # 1. 直接利用現有的分析函式產生統計數據與圖表字串
+        # 1. 直接利用現有的分析函式產生統計數據與圖表字串 (整份暫存結果已經算過就直接沿用)
         try:
-            stats, charts = analyze_jobs(jobs, keyword)
+            if entry and entry['stats'] and entry['charts'] and not data.get('filters'):
+                stats, charts = entry['stats'], entry['charts']
+            else:
+                stats, charts = analyze_jobs(jobs, keyword)
             avg_salary = stats.get('avg_salary', 0)
             count_104 = stats.get('count_104', 0)
             count_1111 = stats.get('count_1111', 0)
@@ -484,59 +583,121 @@ def save_history():
             avg_salary, count_104, count_1111 = 0, 0, 0
             chart_salary, chart_location = "", ""
 
-        # 2. 寫入資料庫 (使用 with 語法確保連線安全)
-        with sqlite3.connect('history_jobs.db') as conn:
-            c = conn.cursor()
+        # 2. 寫入資料庫：主表 (Batch) + 去重後的職缺與批次關聯，同一個交易內完成
+        batch_id = history_db.insert_batch(keyword, save_time, jobs, avg_salary, count_104, count_1111, chart_salary, chart_location)
 
-            # (A) 寫入主表 (Batch)
-            c.execute('''
-                INSERT INTO history_batches (keyword, save_time, total_count, avg_salary, count_104, count_1111, chart_salary, chart_location)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (keyword, save_time, len(jobs), avg_salary, count_104, count_1111, chart_salary, chart_location))
-            
-            batch_id = c.lastrowid
-
-            # (B) 寫入明細表 (Details)
-            details_data = []
-            for j in jobs:
-                details_data.append((
-                    batch_id,
-                    j.get('platform'),
-                    j.get('name'),
-                    j.get('company_name'),
-                    j.get('location'),
-                    j.get('salary'),
-                    j.get('job_url'),
-                    j.get('update_date')
-                ))
-            
-            c.executemany('''
-                INSERT INTO history_details (batch_id, platform, name, company_name, location, salary, job_url, update_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', details_data)
-            
-            conn.commit()
+        # 3. 同一批資料附加到分區 Parquet 資料湖 (供長期分析)；失敗不影響歷史紀錄
+        try:
+            job_lake.append_batch(batch_id, keyword, save_time, jobs, COLUMN_ORDER)
+        except Exception as e:
+            print(f"Job Lake Warning: {e}")
 
         return jsonify({'status': 'success', 'message': f'成功儲存 {len(jobs)} 筆資料！'})
 
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 410
     except Exception as e:
         print(f"Save Error: {e}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+# --- 增量更新：只抓水位線之後的新職缺，合併進該關鍵字最新的歷史批次並另存一個新批次 ---
+def merge_jobs(new_jobs, old_jobs):
+    # 新職缺排在前面；同一職缺 (平台 + 去重鍵) 只保留最新的一筆
+    merged, seen = [], set()
+    for job in new_jobs + old_jobs:
+        key = (job.get('platform'), history_db.job_key(job))
+        if key in seen: continue
+        seen.add(key)
+        merged.append(job)
+    return merged
+
+@app.route('/api/refresh_keyword', methods=['POST'])
+def refresh_keyword():
+    try:
+        data = request.json
+        keyword = (data.get('keyword') or '').strip()
+        if not keyword: return jsonify({'status': 'error', 'message': '請輸入關鍵字'})
+        # 第一次追蹤 (還沒有水位線) 時完整搜尋的筆數
+        try: max_num = int(data.get('max_num', 1000))
+        except: max_num = 1000
+
+        spiders = {'104': Job104Spider(), '1111': Job1111Spider()}
+        new_jobs, watermarks, new_counts = [], {}, {}
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS_SEARCH) as executor:
+            futures = {
+                platform: executor.submit(spider.search_incremental, keyword, history_db.get_watermark(keyword, platform), max_num)
+                for platform, spider in spiders.items()
+            }
+            for platform, f in futures.items():
+                try:
+                    raw_jobs, mark = f.result()
+                except Exception as e:
+                    # 失敗的平台水位線不前進，下次會從同一點重新抓
+                    print(f"{platform} Refresh Error: {e}")
+                    continue
+                jobs = spiders[platform].transform_batch(raw_jobs)
+                new_jobs.extend(jobs)
+                new_counts[platform] = len(jobs)
+                watermarks[platform] = mark
+
+        save_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        batch_id = history_db.latest_batch_id(keyword)
+        if not new_jobs:
+            # 沒有新職缺就不另存批次，只更新水位線
+            if watermarks: history_db.save_watermarks(keyword, watermarks, save_time)
+            return jsonify({'status': 'success', 'message': '沒有新職缺', 'batch_id': batch_id, 'new_count': 0, 'new_counts': new_counts})
+
+        old_jobs = history_db.load_batch(batch_id)[1] if batch_id else []
+        merged = merge_jobs(new_jobs, old_jobs)
+        stats, charts = analyze_jobs(merged, keyword)
+        batch_id = history_db.insert_batch(
+            keyword, save_time, merged,
+            stats.get('avg_salary', 0), stats.get('count_104', 0), stats.get('count_1111', 0),
+            charts.get('salary_dist', ''), charts.get('location_pie', ''),
+            watermarks=watermarks
+        )
+        result_id = get_result_store().put(keyword, jobs_to_df(merged), stats, charts)
+
+        return jsonify({
+            'status': 'success',
+            'message': f'新增 {len(new_jobs)} 筆，合併後共 {len(merged)} 筆',
+            'batch_id': batch_id,
+            'result_id': result_id,
+            'new_count': len(new_jobs),
+            'new_counts': new_counts,
+            'jobs': merged,
+            'stats': stats,
+            'charts': charts
+        })
+    except Exception as e:
+        print(f"Refresh Error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/api/tracked_keywords', methods=['GET'])
+def tracked_keywords():
+    try:
+        rows = history_db.list_watermarks()
+        return jsonify({'status': 'success', 'data': [dict(row) for row in rows]})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+# --- 資料湖分析：依爬取日期的月薪趨勢 (?keyword=&since=YYYY-MM-DD&platform=) ---
+@app.route('/api/lake/salary_trend', methods=['GET'])
+def lake_salary_trend():
+    try:
+        trend = job_lake.salary_trend(
+            keyword=request.args.get('keyword'), since=request.args.get('since'), platform=request.args.get('platform')
+        )
+        return jsonify({'status': 'success', 'data': trend})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
 # --- 路由 2：取得歷史紀錄列表 (修正版：讀取 history_batches) ---
 @app.route('/api/get_history_list', methods=['GET'])
 def get_history_list():
     try:
-        with sqlite3.connect('history_jobs.db') as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            # 讀取主表資訊
-            c.execute('''
-                SELECT batch_id, keyword, save_time, total_count, avg_salary, count_104, count_1111 
-                FROM history_batches 
-                ORDER BY batch_id DESC
-            ''')
-            rows = c.fetchall()
+        # 讀取主表資訊
+        rows = history_db.list_batches()
 
         history_list = []
         for row in rows:
@@ -561,38 +722,17 @@ def load_history_item():
     try:
         batch_id = request.json.get('batch_id')
         
-        with sqlite3.connect('history_jobs.db') as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            
-            # 1. 先讀取主表 (包含原本存好的圖表字串)
-            c.execute('SELECT * FROM history_batches WHERE batch_id = ?', (batch_id,))
-            batch_row = c.fetchone()
-            
-            if not batch_row:
-                return jsonify({'status': 'error', 'message': '找不到該筆紀錄'})
-            
-            # 2. 讀取明細表 (職缺列表)
-            c.execute('SELECT * FROM history_details WHERE batch_id = ?', (batch_id,))
-            details_rows = c.fetchall()
-
-        jobs = []
-        for row in details_rows:
-            jobs.append({
-                'platform': row['platform'],
-                'name': row['name'],
-                'company_name': row['company_name'],
-                'location': row['location'],
-                'salary': row['salary'],
-                'job_url': row['job_url'],
-                'update_date': row['update_date']
-            })
+        # 主表 (包含圖表雜湊) 與透過關聯表取得的職缺列表 (依儲存時的順序)
+        batch_row, jobs = history_db.load_batch(batch_id)
+
+        if not batch_row:
+            return jsonify({'status': 'error', 'message': '找不到該筆紀錄'})
             
         # 準備回傳的資料
-        # 我們直接使用資料庫存好的圖表，不重新生成，速度會比較快
-        charts = {
-            'salary_dist': batch_row['chart_salary'],
-            'location_pie': batch_row['chart_location']
+        # 圖表不再內嵌在 JSON 裡，只回傳網址，由瀏覽器向 /charts/<hash>.png 取得並快取
+        chart_urls = {
+            'salary_dist': chart_url(batch_row['chart_salary_hash']),
+            'location_pie': chart_url(batch_row['chart_location_hash'])
         }
         
         stats = {
@@ -602,36 +742,79 @@ def load_history_item():
             'count_1111': batch_row['count_1111']
         }
 
+        # 歷史結果也放進暫存，讓歷史頁的匯出同樣只需要 result_id
+        result_id = get_result_store().put(batch_row['keyword'], jobs_to_df(jobs), stats)
+
         return jsonify({
             'status': 'success', 
+            'result_id': result_id,
             'jobs': jobs,
             'stats': stats,
-            'charts': charts
+            'chart_urls': chart_urls
         })
 
     except Exception as e:
         print(f"Load History Error: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
     
-def get_db_connection():
-    # 這是舊的 helper，為了相容性保留，但建議主要用 with sqlite3.connect
-    conn = sqlite3.connect('history_jobs.db') 
-    conn.row_factory = sqlite3.Row
-    return conn
+def chart_url(chart_hash):
+    return f'/charts/{chart_hash}.png' if chart_hash else ''
+
+# --- 歷史圖表：以內容雜湊定址，內容永遠不變，可以讓瀏覽器永久快取 ---
+@app.route('/charts/<chart_hash>.png', methods=['GET'])
+def get_chart(chart_hash):
+    if not re.fullmatch(r'[0-9a-f]{64}', chart_hash):
+        return jsonify({'status': 'error', 'message': '圖表不存在'}), 404
+
+    etag = f'"{chart_hash}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+
+    png = history_db.get_chart(chart_hash)
+    if png is None:
+        return jsonify({'status': 'error', 'message': '圖表不存在'}), 404
+    return Response(png, mimetype='image/png', headers=headers)
 
 # --- 路由 4：刪除歷史紀錄 (修正版：正確縮排與連線) ---
 @app.route('/api/delete_history', methods=['POST'])
 def delete_history():
     batch_id = request.json.get('batch_id')
     try:
-        with sqlite3.connect('history_jobs.db') as conn:
-            c = conn.cursor()
-            # 只要刪除主表，因設定了 ON DELETE CASCADE，明細表會自動刪除
-            # 但為了保險，我們顯式刪除兩者
-            c.execute('DELETE FROM history_details WHERE batch_id = ?', (batch_id,))
-            c.execute('DELETE FROM history_batches WHERE batch_id = ?', (batch_id,))
-            conn.commit()
+        # 關聯列經由 ON DELETE CASCADE 刪除，沒有其他批次引用的職缺一併清掉
+        history_db.delete_batch(batch_id)
             
         return jsonify({'status': 'success'})
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)})
+
+# --- 歷史職缺全文搜尋：跨所有批次，依相關度排序分頁 (?q=&field=name|company_name|location&platform=&keyword=&page=&page_size=&batch_page=&batch_page_size=) ---
+HISTORY_SEARCH_MAX_PAGE_SIZE = 100
+
+@app.route('/api/history/search', methods=['GET'])
+def history_search():
+    try:
+        if not history_db.fts_available():
+            return jsonify({'status': 'error', 'message': '目前的 SQLite 版本不支援全文搜尋 (需要 FTS5 trigram)'}), 501
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'status': 'error', 'message': '請輸入搜尋文字'}), 400
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            page_size = min(HISTORY_SEARCH_MAX_PAGE_SIZE, max(1, int(request.args.get('page_size', 20))))
+            batch_page = max(1, int(request.args.get('batch_page', 1)))
+            batch_page_size = min(HISTORY_SEARCH_MAX_PAGE_SIZE, max(1, int(request.args.get('batch_page_size', history_db.FTS_BATCH_PAGE_SIZE))))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': '分頁參數格式錯誤'}), 400
+
+        result = history_db.search_jobs(
+            query, field=request.args.get('field') or None, platform=request.args.get('platform') or None,
+            keyword=request.args.get('keyword') or None, page=page, page_size=page_size,
+            batch_page=batch_page, batch_page_size=batch_page_size
+        )
+        return jsonify({'status': 'success', 'page': page, 'page_size': page_size, 'batch_page': batch_page, **result})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"History Search Error: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
\ No newline at end of file